@@ -0,0 +1,226 @@
+import os
+import time
+import hashlib
+import argparse
+
+from IPFS_CID import varint, directory_cid, cid_to_string, SHA2_256
+from renditions import RENDITIONS, rendition_folder
+
+# Every CID written by IPFS_CID is a 36 byte CIDv1 with a sha2-256 multihash,
+# so the header has a fixed size and the root can be filled in at the end
+CID_LENGTH = 36
+
+def car_header(root):
+    """CARv1 header: varint length + dag-cbor {"roots": [root], "version": 1}"""
+    cid_bytes = b'\x00' + root  # dag-cbor links carry a leading identity multibase byte
+    header = (b'\xa2'                                   # map with 2 entries
+              + b'\x65roots' + b'\x81'                   # "roots": array of 1
+              + b'\xd8\x2a' + b'\x58' + bytes([len(cid_bytes)]) + cid_bytes  # tag 42, bytes
+              + b'\x67version' + b'\x01')                # "version": 1
+    return varint(len(header)) + header
+
+HEADER_LENGTH = len(car_header(b'\x00' * CID_LENGTH))
+
+def _read_varint_bytes(data, offset):
+    """Decode a varint from bytes, returns (value, next offset)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def read_varint(f):
+    """Read one unsigned varint from a file, None at end of file"""
+    value = 0
+    shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            if shift:
+                raise ValueError('Truncated varint')
+            return None
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+class CarWriter:
+    """Streams blocks into one or more CARv1 files of at most max_size bytes each
+
+    Blocks arrive children first, so the last block of every file has its
+    whole DAG in that file or the ones before it. That block is the file's
+    root, and only the last file names the folder's root CID: importing
+    the files in order, each one can be pinned on its own.
+    """
+
+    def __init__(self, output_prefix, max_size):
+        self.output_prefix = output_prefix
+        self.max_size = max_size
+        self.paths = []
+        self.roots = []
+        self.seen = set()
+        self.blocks = 0
+        self.file = None
+        self.file_size = 0
+
+    def _open_next(self):
+        if self.file is not None:
+            self.file.close()
+        path = f'{self.output_prefix}.car' if not self.paths else f'{self.output_prefix}-{len(self.paths)}.car'
+        self.paths.append(path)
+        self.roots.append(None)
+        self.file = open(path, 'wb')
+        # Placeholder root, overwritten in finish() once the root is known
+        header = car_header(b'\x00' * CID_LENGTH)
+        self.file.write(header)
+        self.file_size = len(header)
+
+    def write_block(self, cid, block):
+        """Append a block unless it was already written (identical chunks are stored once)"""
+        if cid in self.seen:
+            return
+        self.seen.add(cid)
+
+        section = varint(len(cid) + len(block)) + cid
+        section_size = len(section) + len(block)
+
+        # Split before this block if it would push the current file over the limit
+        if self.file is None or (self.file_size + section_size > self.max_size and self.file_size > HEADER_LENGTH):
+            self._open_next()
+
+        self.file.write(section)
+        self.file.write(block)
+        self.file_size += section_size
+        self.blocks += 1
+        self.roots[-1] = cid
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def finish(self, root):
+        """Close the last file and write the roots into the headers, the folder root into the last one"""
+        if self.file is None:
+            self._open_next()
+        self.close()
+
+        self.roots[-1] = root
+        for path, file_root in zip(self.paths, self.roots):
+            with open(path, 'r+b') as f:
+                f.write(car_header(file_root))
+
+def export_car(folder, output_prefix, max_size):
+    """Pack a folder into CAR file(s) without holding it in memory, returns (root CID, CAR paths)"""
+    writer = CarWriter(output_prefix, max_size)
+    stats = {}
+
+    start = time.perf_counter()
+    try:
+        root, _ = directory_cid(folder, stats, sink=writer.write_block)
+    except Exception:
+        writer.close()
+        raise
+    writer.finish(root)
+    elapsed = time.perf_counter() - start
+
+    car_bytes = sum(os.path.getsize(path) for path in writer.paths)
+    print(f'📦 {folder} → {len(writer.paths)} CAR file(s), {stats["files"]} files, '
+          f'{writer.blocks} blocks, {car_bytes:,} bytes in {elapsed:.2f}s')
+    for path in writer.paths:
+        print(f'   {path}')
+    print(f'   Root CID: {cid_to_string(root)}')
+
+    return cid_to_string(root), writer.paths
+
+def verify_car(path, seen=None):
+    """Re-read a CAR file and check every block against its CID, returns (root CID, blocks, bad blocks)
+
+    The block CIDs are added to seen (a set), if given.
+    """
+    bad_blocks = []
+    blocks = 0
+
+    with open(path, 'rb') as f:
+        header_length = read_varint(f)
+        header = f.read(header_length)
+        # Root is the tag 42 byte string, minus its leading multibase byte
+        root_start = header.index(b'\xd8\x2a\x58')
+        root = header[root_start + 5:root_start + 4 + header[root_start + 3]]
+
+        while True:
+            section_length = read_varint(f)
+            if section_length is None:
+                break
+            section = f.read(section_length)
+            if len(section) != section_length:
+                bad_blocks.append(f'truncated section after block {blocks}')
+                break
+
+            # CIDv1: version, codec, multihash code, digest length, digest
+            _, offset = _read_varint_bytes(section, 0)
+            _, offset = _read_varint_bytes(section, offset)
+            hash_code, offset = _read_varint_bytes(section, offset)
+            digest_length, offset = _read_varint_bytes(section, offset)
+            cid = section[:offset + digest_length]
+            digest, block = section[offset:offset + digest_length], section[offset + digest_length:]
+
+            blocks += 1
+            if hash_code != SHA2_256 or hashlib.sha256(block).digest() != digest:
+                bad_blocks.append(cid_to_string(cid))
+            elif seen is not None:
+                seen.add(cid)
+
+    if seen is not None and root not in seen:
+        bad_blocks.append(f'root {cid_to_string(root)} is not in this file or the ones before it')
+    return cid_to_string(root), blocks, bad_blocks
+
+def verify_cars(paths):
+    """Verify a set of CAR files in import order and print the result, returns False if any is broken"""
+    all_ok = True
+    seen = set()
+    for path in paths:
+        root, blocks, bad_blocks = verify_car(path, seen)
+        if bad_blocks:
+            all_ok = False
+            print(f'❌ {path}: {len(bad_blocks)} of {blocks} blocks do not match their CID')
+            for bad_block in bad_blocks[:10]:
+                print(f'   - {bad_block}')
+        else:
+            print(f'✅ {path}: {blocks} blocks verified (root {root})')
+    return all_ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export Shuffled images and metadata as CARv1 files for bulk upload')
+    parser.add_argument('--metadata-folder', default='./Shuffled/Metadata',
+                        help='metadata folder to pack (default: ./Shuffled/Metadata, use ./Shuffled/NoJson for extensionless files)')
+    # Outside Shuffled, so uploading a Shuffled folder never picks the CAR files up
+    parser.add_argument('--output', default='./CAR', help='output folder (default: ./CAR)')
+    parser.add_argument('--max-size-mb', type=int, default=1024, help='split CAR files at this size in MB (default: 1024)')
+    parser.add_argument('--verify', action='store_true', help='re-read the written CAR files and check every block hash')
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    max_size = args.max_size_mb * 1024 * 1024
+
+    written = []
+    folders = [('images', './Shuffled/Images'), ('metadata', args.metadata_folder)]
+    # Renditions only if they were made
+    folders += [(name, rendition_folder(name, './Shuffled')) for name in RENDITIONS
+                if os.path.isdir(rendition_folder(name, './Shuffled'))]
+    for name, folder in folders:
+        if not os.path.isdir(folder):
+            print(f'⚠️ Folder not found, skipping: {folder}')
+            continue
+        root, paths = export_car(folder, os.path.join(args.output, name), max_size)
+        written.extend(paths)
+        print(f'🔗 {name} CID: {root}\n')
+
+    if args.verify and written:
+        print('🔍 Verifying CAR files...')
+        if not verify_cars(written):
+            raise SystemExit(1)
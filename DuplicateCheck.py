@@ -0,0 +1,330 @@
+from PIL import Image
+import os
+import json
+import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from file_io import write_file_atomic
+from instrumentation import StageStats, ProgressLine
+from batch_combine_images import iter_source_files
+
+try:
+    import numpy as np  # optional, "pip install numpy", hashes whole batches at once
+except ImportError:
+    np = None
+
+# Stored with every hash, a file hashed by the other code path is hashed again
+HASH_BACKEND = 'numpy' if np is not None else 'python'
+
+# Hashes of every character file, reused while a file's (mtime, size) stays the same
+INDEX_PATH = './IMAGES/.hash-index.json'
+# Bumped whenever the hashing changes, so old indexes are rebuilt instead of compared
+INDEX_VERSION = 2
+
+HASH_TYPES = ('ahash', 'dhash', 'phash')
+HASH_SIZE = 8          # every hash is 8x8 = 64 bits
+PHASH_SIZE = 32        # pHash takes the DCT of a 32x32 thumbnail
+DEFAULT_THRESHOLD = 8  # max differing bits for two characters to count as near-duplicates
+# DCT values are compared in units of 1e-9, so coefficients that only differ by
+# summation order (many tie near zero) fall on the same side of the median
+PHASH_SCALE = 1e9
+BATCH_SIZE = 256
+
+# Transparent areas are flattened onto this gray so the hash sees the character, not
+# whatever color the art program left behind invisible pixels
+BACKGROUND = (128, 128, 128, 255)
+
+def _dct_matrix():
+    """First HASH_SIZE rows of the orthonormal DCT-II matrix for PHASH_SIZE samples"""
+    return [[math.sqrt((1 if k == 0 else 2) / PHASH_SIZE) * math.cos(math.pi * (2 * n + 1) * k / (2 * PHASH_SIZE))
+             for n in range(PHASH_SIZE)] for k in range(HASH_SIZE)]
+
+_DCT = _dct_matrix()
+
+def load_thumbnails(path):
+    """Decode a character and shrink it to the grayscale pixels the three hashes need
+
+    Returns (8x8, 9x8, 32x32) pixel bytes.
+    """
+    with Image.open(path) as img:
+        # JPEGs decode straight at a fraction of the size
+        img.draft('RGB', (PHASH_SIZE * 4, PHASH_SIZE * 4))
+        img = img.convert('RGBA')
+    img = Image.alpha_composite(Image.new('RGBA', img.size, BACKGROUND), img).convert('L')
+    # One cheap reduce() first, then the small resizes come from the same thumbnail
+    img = img.resize((PHASH_SIZE * 4, PHASH_SIZE * 4), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    return (img.resize((HASH_SIZE, HASH_SIZE), Image.Resampling.LANCZOS).tobytes(),
+            img.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS).tobytes(),
+            img.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.LANCZOS).tobytes())
+
+def load_thumbnails_chunk(paths):
+    """load_thumbnails for a chunk of files in a worker process, errors are returned per file"""
+    results = []
+    for path in paths:
+        try:
+            results.append((path, load_thumbnails(path), None))
+        except Exception as e:
+            results.append((path, None, str(e)))
+    return results
+
+def _bits_to_hex(bits):
+    return f'{int("".join("1" if bit else "0" for bit in bits), 2):016x}'
+
+def hash_thumbnails(thumbnails):
+    """aHash, dHash and pHash of a list of load_thumbnails() results, as 16-digit hex strings
+
+    aHash: 8x8 pixels above their mean. dHash: each pixel brighter than its
+    left neighbour in a 9x8 thumbnail. pHash: the 8x8 lowest DCT frequencies
+    of a 32x32 thumbnail above their median. With numpy the whole list is
+    hashed with a few array operations.
+    """
+    if not thumbnails:
+        return []
+
+    if np is not None:
+        small = np.array([np.frombuffer(t[0], np.uint8) for t in thumbnails], dtype=np.float64)
+        wide = np.array([np.frombuffer(t[1], np.uint8) for t in thumbnails], dtype=np.float64)
+        large = np.array([np.frombuffer(t[2], np.uint8) for t in thumbnails], dtype=np.float64)
+
+        ahash = small > small.mean(axis=1, keepdims=True)
+        wide = wide.reshape(-1, HASH_SIZE, HASH_SIZE + 1)
+        dhash = (wide[:, :, 1:] > wide[:, :, :-1]).reshape(-1, HASH_SIZE * HASH_SIZE)
+        dct = np.array(_DCT)
+        frequencies = (dct @ large.reshape(-1, PHASH_SIZE, PHASH_SIZE) @ dct.T).reshape(-1, HASH_SIZE * HASH_SIZE)
+        frequencies = np.rint(frequencies * PHASH_SCALE)
+        phash = frequencies > np.median(frequencies, axis=1, keepdims=True)
+
+        return [{'ahash': _bits_to_hex(a), 'dhash': _bits_to_hex(d), 'phash': _bits_to_hex(p)}
+                for a, d, p in zip(ahash, dhash, phash)]
+
+    hashes = []
+    for small, wide, large in thumbnails:
+        mean = sum(small) / len(small)
+        row = HASH_SIZE + 1
+        dhash = [wide[y * row + x + 1] > wide[y * row + x] for y in range(HASH_SIZE) for x in range(HASH_SIZE)]
+        # Rows of the DCT first, then columns, keeping only the low frequencies
+        rows = [[sum(c * large[y * PHASH_SIZE + n] for n, c in enumerate(coefficients)) for coefficients in _DCT]
+                for y in range(PHASH_SIZE)]
+        frequencies = [round(sum(c * rows[n][u] for n, c in enumerate(coefficients)) * PHASH_SCALE)
+                       for coefficients in _DCT for u in range(HASH_SIZE)]
+        median = sorted(frequencies)[len(frequencies) // 2 - 1:len(frequencies) // 2 + 1]
+        median = sum(median) / 2
+        hashes.append({'ahash': _bits_to_hex(value > mean for value in small),
+                       'dhash': _bits_to_hex(dhash),
+                       'phash': _bits_to_hex(value > median for value in frequencies)})
+    return hashes
+
+def hamming(first, second):
+    return bin(first ^ second).count('1')
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes for Hamming-radius search
+
+    Each child hangs off its parent under its exact distance to it, so by
+    the triangle inequality a search only visits children whose edge is
+    within radius of the query's distance to the parent, instead of
+    comparing against every hash.
+    """
+
+    def __init__(self):
+        self.root = None  # [hash, items, {distance: child}]
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Every (distance, item) within radius of value"""
+        found = []
+        pending = [self.root] if self.root is not None else []
+        while pending:
+            node = pending.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((distance, item) for item in node[1])
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    pending.append(child)
+        return found
+
+def load_hash_index(index_path):
+    """Load {relative path: {signature, ahash, dhash, phash}} from the last run, empty if stale or unreadable"""
+    if not os.path.exists(index_path):
+        return {}
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'⚠️ Ignoring unreadable hash index {index_path}: {e}')
+        return {}
+    return index.get('files', {}) if index.get('version') == INDEX_VERSION else {}
+
+def save_hash_index(index_path, files):
+    write_file_atomic(index_path, json.dumps({'version': INDEX_VERSION, 'files': files}, indent=4, sort_keys=True))
+
+def update_hash_index(images_folder, index_path, workers=None, stats=None, all_formats=False):
+    """Hash new and changed character files, drop deleted ones, returns the up-to-date index
+
+    Files are decoded in worker processes and hashed BATCH_SIZE at a time.
+    """
+    stats = stats or StageStats('DuplicateCheck')
+    previous = load_hash_index(index_path)
+    files = {}
+    changed = []
+
+    with stats.stage('scan'):
+        for entry in sorted(os.scandir(images_folder), key=lambda entry: entry.name):
+            if not entry.is_dir():
+                continue
+            for path in iter_source_files(entry.path, all_formats):
+                relative_path = os.path.relpath(path, images_folder).replace(os.sep, '/')
+                stat = os.stat(path)
+                signature = [stat.st_mtime_ns, stat.st_size, HASH_BACKEND]
+                cached = previous.get(relative_path)
+                if cached and cached['signature'] == signature:
+                    files[relative_path] = cached
+                else:
+                    changed.append((relative_path, path, signature))
+
+    print(f'📋 {len(files) + len(changed)} character files, {len(changed)} new or changed since the last check')
+
+    if changed:
+        progress = ProgressLine('Hashing', len(changed))
+        by_path = {path: (relative_path, signature) for relative_path, path, signature in changed}
+        paths = [path for _, path, _ in changed]
+        chunks = [paths[index:index + BATCH_SIZE] for index in range(0, len(paths), BATCH_SIZE)]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunk_size = max(1, BATCH_SIZE // (workers or os.cpu_count() or 1))
+            for chunk in chunks:
+                # Decoding is the expensive part, spread each batch over the workers
+                parts = [chunk[index:index + chunk_size] for index in range(0, len(chunk), chunk_size)]
+                start = time.perf_counter()
+                results = [result for part in executor.map(load_thumbnails_chunk, parts) for result in part]
+                stats.record('decode', time.perf_counter() - start, len(chunk))
+
+                loaded = [(path, thumbnails) for path, thumbnails, error in results if error is None]
+                for path, _, error in results:
+                    if error is not None:
+                        print(f'\n❌ Could not read {path}: {error}')
+
+                start = time.perf_counter()
+                hashes = hash_thumbnails([thumbnails for _, thumbnails in loaded])
+                stats.record('hash', time.perf_counter() - start, len(loaded))
+                for (path, _), file_hashes in zip(loaded, hashes):
+                    relative_path, signature = by_path[path]
+                    files[relative_path] = dict(file_hashes, signature=signature)
+                    stats.bytes_read += signature[1]
+                progress.advance(len(chunk))
+        progress.close()
+
+    if changed or len(files) != len(previous):
+        save_hash_index(index_path, files)
+    return files
+
+def find_duplicate_clusters(files, hash_type='phash', threshold=DEFAULT_THRESHOLD):
+    """Group files whose hashes are within threshold bits of each other
+
+    Returns a list of clusters, each a sorted list of relative paths, with
+    the largest clusters first. Near-duplicate pairs are found with a
+    BK-tree search per file and chained together (union-find), so A~B and
+    B~C end up in one cluster.
+    """
+    tree = BKTree()
+    for relative_path in sorted(files):
+        tree.add(int(files[relative_path][hash_type], 16), relative_path)
+
+    parent = {relative_path: relative_path for relative_path in files}
+
+    def root(relative_path):
+        while parent[relative_path] != relative_path:
+            parent[relative_path] = parent[parent[relative_path]]
+            relative_path = parent[relative_path]
+        return relative_path
+
+    distances = {}
+    for relative_path in files:
+        for distance, other in tree.search(int(files[relative_path][hash_type], 16), threshold):
+            if other != relative_path:
+                parent[root(other)] = root(relative_path)
+                pair = tuple(sorted((relative_path, other)))
+                distances[pair] = distance
+
+    clusters = {}
+    for relative_path in files:
+        clusters.setdefault(root(relative_path), []).append(relative_path)
+    clusters = [sorted(members) for members in clusters.values() if len(members) > 1]
+    clusters.sort(key=lambda members: (-len(members), members[0]))
+    return clusters, distances
+
+def check_duplicates(images_folder='./IMAGES', index_path=INDEX_PATH, hash_type='phash', threshold=DEFAULT_THRESHOLD,
+                     workers=None, report_path=None, trace_path=None, all_formats=False):
+    """Hash every character, report clusters of near-identical ones, returns the clusters"""
+    stats = StageStats('DuplicateCheck')
+    print(f'🔍 Checking {images_folder} for near-duplicate characters ({hash_type}, up to {threshold} bits apart)')
+    if np is None:
+        print('   (numpy not installed, hashing in pure Python)')
+
+    files = update_hash_index(images_folder, index_path, workers, stats, all_formats)
+    with stats.stage('search'):
+        clusters, distances = find_duplicate_clusters(files, hash_type, threshold)
+
+    if not clusters:
+        print(f'✅ No near-duplicates among {len(files)} characters')
+    else:
+        print(f'\n⚠️ {len(clusters)} group(s) of near-duplicate characters:')
+        for number, members in enumerate(clusters, 1):
+            folders = sorted({member.split('/')[0] for member in members})
+            note = ' (across rarity folders!)' if len(folders) > 1 else ''
+            print(f'\n   Group {number}{note}:')
+            for member in members:
+                closest = min((distance for pair, distance in distances.items() if member in pair), default=None)
+                print(f'      {member}  (closest match: {closest} bits)')
+
+    if report_path:
+        report = [
+            {
+                'files': members,
+                'folders': sorted({member.split('/')[0] for member in members}),
+                'pairs': [{'files': list(pair), 'distance': distance}
+                          for pair, distance in sorted(distances.items()) if pair[0] in members]
+            }
+            for members in clusters
+        ]
+        write_file_atomic(report_path, json.dumps(report, indent=4))
+        print(f'\n📝 Report written to {report_path}')
+
+    stats.print_summary()
+    if trace_path:
+        stats.write_trace(trace_path)
+    return clusters
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find near-identical characters in the IMAGES folders before rendering')
+    parser.add_argument('--hash', choices=HASH_TYPES, default='phash',
+                        help='hash to compare: phash is the most robust, dhash/ahash are stricter about layout (default: phash)')
+    parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD,
+                        help=f'max differing bits out of 64 to count as a near-duplicate (default: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--workers', type=int, default=None, help='decoding processes (default: all CPU cores)')
+    parser.add_argument('--all-formats', action='store_true',
+                        help='also check .jpg/.jpeg/.webp art, like batch_combine_images.py --all-formats')
+    parser.add_argument('--report', help='also write the groups to this JSON file')
+    parser.add_argument('--trace', help='save per-stage timings to this file (.json or .csv)')
+    args = parser.parse_args()
+
+    check_duplicates(hash_type=args.hash, threshold=args.threshold, workers=args.workers,
+                     report_path=args.report, trace_path=args.trace, all_formats=args.all_formats)
@@ -0,0 +1,206 @@
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from OrderShuffle import load_permutation, shuffle_metadata
+from IPFS_FIX import rewrite_image_url
+from IPFS_CID import compute_folder_cid
+from renditions import RENDITIONS, rendition_folder, rendition_fields
+from metadata_bundle import open_bundle, find_bundle, remove_other_bundles
+from directory_index import index_folder, forget, format_ranges
+from file_io import write_file_atomic
+
+def finalize_chunk(pairs, cid, source_metadata_folder, output_metadata_folder, output_nojson_folder,
+                   rendition_cids=None, sources=None):
+    """Finalize a chunk of (old number, new number) pairs, returns (success count, error messages, warnings)
+
+    rendition_cids ({rendition name: CID}) re-points preview/thumbnail URLs too.
+    sources ({old number: JSON text}) replaces reading source_metadata_folder,
+    for metadata kept in a bundle.
+    """
+    success_count = 0
+    errors = []
+    warnings = []
+
+    for old_number, new_number in pairs:
+        try:
+            # The only read of this token's metadata
+            if sources is not None:
+                metadata = json.loads(sources[old_number])
+            else:
+                with open(os.path.join(source_metadata_folder, f'{old_number}.json'), 'r') as f:
+                    metadata = json.load(f)
+
+            # Shuffle rename (OrderShuffle)
+            shuffle_metadata(metadata, old_number, new_number)
+
+            # CID rewrite (IPFS_FIX)
+            if 'image' not in metadata:
+                warnings.append(f'No image field in {old_number}.json')
+            else:
+                new_image_url = rewrite_image_url(metadata['image'], cid)
+                if new_image_url is None:
+                    warnings.append(f'Not an IPFS URL in {old_number}.json: {metadata["image"]}')
+                else:
+                    metadata['image'] = new_image_url
+
+            for name, field in rendition_fields(metadata):
+                if rendition_cids and name in rendition_cids:
+                    new_url = rewrite_image_url(metadata[field], rendition_cids[name])
+                    if new_url is not None:
+                        metadata[field] = new_url
+
+            # Same bytes for the .json file and the extensionless copy (JsonRemover)
+            data = json.dumps(metadata, indent=4)
+            write_file_atomic(os.path.join(output_metadata_folder, f'{new_number}.json'), data)
+            write_file_atomic(os.path.join(output_nojson_folder, f'{new_number}'), data)
+
+            success_count += 1
+
+        except Exception as e:
+            errors.append(f'{old_number} → {new_number}: {e}')
+
+    return success_count, errors, warnings
+
+def remove_stale_tokens(folder, extension, tokens):
+    """Delete the token files of a folder that are not in tokens, returns the removed token numbers"""
+    index = index_folder(folder, extension)
+    stale = [token for token in index.tokens if token not in tokens]
+    for token in stale:
+        os.remove(index.path(token))
+    forget(folder)
+    return stale
+
+def finalize_metadata(cid, workers=None, rendition_cids=None):
+    """Shuffle, re-point and strip extensions of all metadata in a single pass over Final/Metadata
+
+    Only the saved permutation is needed from OrderShuffle.py, so it can
+    run with the metadata left out and Final/Metadata is read just once.
+    Files of token numbers the permutation no longer has are removed.
+    """
+
+    source_metadata_folder = './Final/Metadata'
+    output_metadata_folder = './Shuffled/Metadata'
+    output_nojson_folder = './Shuffled/NoJson'
+    permutation_path = './Shuffled/permutation.json'
+
+    # Metadata rendered with batch_combine_images --metadata-bundle
+    source_bundle_path = find_bundle('./Final')
+    if source_bundle_path:
+        source_metadata_folder = source_bundle_path
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    print('🏁 Starting metadata finalization...')
+    print(f'Permutation: {permutation_path}')
+    print(f'Source metadata: {source_metadata_folder}')
+    print(f'Output metadata: {output_metadata_folder}')
+    print(f'Output without extension: {output_nojson_folder}')
+    print(f'CID: {cid}')
+    for name, rendition_cid in (rendition_cids or {}).items():
+        print(f'{name.capitalize()} CID: {rendition_cid}')
+    print(f'Workers: {workers}')
+
+    if not os.path.exists(permutation_path):
+        print(f'❌ Permutation file not found: {permutation_path} (run OrderShuffle.py first)')
+        return
+
+    try:
+        mapping = load_permutation(permutation_path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f'❌ Could not load permutation: {e}')
+        return
+
+    os.makedirs(output_metadata_folder, exist_ok=True)
+    os.makedirs(output_nojson_folder, exist_ok=True)
+    # The files written here are the shuffled metadata from now on
+    for stale_bundle in remove_other_bundles('./Shuffled'):
+        print(f'🗑️ Removed {stale_bundle}, metadata now goes to {output_metadata_folder}')
+
+    pairs = list(mapping.items())
+    print(f'Found {len(pairs)} tokens to finalize')
+
+    if not pairs:
+        return
+
+    # Big chunks keep the per-task overhead low, several per worker keep them all busy
+    chunk_size = max(1, len(pairs) // (workers * 4))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    folders = (source_metadata_folder, output_metadata_folder, output_nojson_folder)
+
+    # One read of the bundle, each worker gets the texts of its own chunk
+    texts = None
+    if source_bundle_path:
+        with open_bundle(source_bundle_path) as bundle:
+            texts = dict(bundle.texts())
+
+    def chunk_sources(chunk):
+        if texts is None:
+            return None
+        return {old_number: texts[old_number] for old_number, _ in chunk if old_number in texts}
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(finalize_chunk, chunk, cid, *folders, rendition_cids, chunk_sources(chunk))
+                       for chunk in chunks]
+            results = [future.result() for future in futures]
+    else:
+        results = [finalize_chunk(chunk, cid, *folders, rendition_cids, chunk_sources(chunk)) for chunk in chunks]
+
+    success_count = sum(result[0] for result in results)
+    errors = [error for result in results for error in result[1]]
+    warnings = [warning for result in results for warning in result[2]]
+
+    for warning in warnings[:10]:
+        print(f'⚠️ {warning}')
+    if len(warnings) > 10:
+        print(f'⚠️ ... and {len(warnings) - 10} more warnings')
+
+    for error in errors:
+        print(f'❌ Error finalizing {error}')
+
+    # Leftovers of a bigger earlier collection would be uploaded with this one
+    tokens = {str(new_number) for new_number in mapping.values()}
+    for folder, extension in ((output_metadata_folder, '.json'), (output_nojson_folder, '')):
+        stale = remove_stale_tokens(folder, extension, tokens)
+        if stale:
+            print(f'🗑️ Removed {len(stale)} stale files from {folder}: {format_ranges(stale)}')
+
+    print(f'\n🎉 Metadata finalization complete!')
+    print(f'Successfully finalized: {success_count} tokens ({success_count * 2} files)')
+    print(f'Errors: {len(errors)} tokens')
+    print(f'Warnings: {len(warnings)} tokens')
+
+if __name__ == '__main__':
+    print('Metadata Finalizer')
+    print('==================')
+    print()
+    print('Replaces running the metadata part of OrderShuffle.py, IPFS_FIX.py and JsonRemover.py one after another.')
+    print('Run OrderShuffle.py first so Shuffled/Images and Shuffled/permutation.json exist,')
+    print('answering "no" to shuffling the metadata: this script reads Final/Metadata itself.')
+    print()
+
+    cid = input('Enter the IPFS CID of your uploaded images (leave empty to compute it offline from Shuffled/Images): ').strip()
+
+    if not cid:
+        if not os.path.isdir('./Shuffled/Images'):
+            print('❌ Shuffled/Images not found. Exiting.')
+        else:
+            cid = compute_folder_cid('./Shuffled/Images')
+            print(f'CID computed offline: {cid}')
+
+    # Renditions shuffled by OrderShuffle.py get their CIDs computed offline
+    rendition_cids = {}
+    if cid:
+        for name in RENDITIONS:
+            folder = rendition_folder(name, './Shuffled')
+            if os.path.isdir(folder) and os.listdir(folder):
+                rendition_cids[name] = compute_folder_cid(folder)
+                print(f'{name.capitalize()} CID computed offline: {rendition_cids[name]}')
+
+        confirm = input('\n⚠️ This will overwrite Shuffled/Metadata and Shuffled/NoJson. Continue? (yes/no): ')
+        if confirm.lower() == 'yes':
+            finalize_metadata(cid, rendition_cids=rendition_cids)
+        else:
+            print('Operation cancelled.')
@@ -0,0 +1,360 @@
+import os
+import io
+import json
+import time
+import asyncio
+import argparse
+import threading
+from urllib.parse import quote, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from PIL import Image
+
+from file_io import write_file_atomic
+from instrumentation import StageStats, ProgressLine
+from OrderShuffle import load_permutation
+from IPFS_CID import compute_folder_cid
+from IPFS_FIX import parse_ipfs_url
+from renditions import RENDITIONS, rendition_folder, rendition_fields
+from directory_index import index_folder, number_sort_key, format_ranges
+from batch_combine_images import CANVAS_SIZE, METADATA_NAME, get_folder_mapping
+
+# Requests in flight at once, one keep-alive connection each
+DEFAULT_CONCURRENCY = 64
+# How many problems to print, the report has all of them
+MAX_PRINTED = 20
+
+CONTENT_TYPES = {'.png': 'image/png', '.webp': 'image/webp', '.json': 'application/json', '': 'application/json'}
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    """Answers /ipfs/<CID>/<filename> from the folder that CID was computed for, 404 for anything else"""
+
+    # Keep-alive, so the crawler doesn't pay for a new connection per file, and
+    # no Nagle delay between the headers and the body on a kept-alive connection
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def resolve(self):
+        parts = self.path.split('?', 1)[0].split('/')
+        if len(parts) != 4 or parts[0] or parts[1] != 'ipfs':
+            return None
+        folder = self.server.routes.get(parts[2])
+        filename = unquote(parts[3])
+        if folder is None or not filename or filename.startswith('.') or '/' in filename or '\\' in filename:
+            return None
+        path = os.path.join(folder, filename)
+        return path if os.path.isfile(path) else None
+
+    def respond(self, send_body):
+        path = self.resolve()
+        if path is None:
+            self.send_error(404)
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream'))
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def log_message(self, format, *args):
+        # A line per request would bury the report
+        pass
+
+class Gateway(ThreadingHTTPServer):
+    """Local stand-in for an IPFS gateway, routes is {CID: folder}"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, routes):
+        super().__init__(address, GatewayHandler)
+        self.routes = routes
+
+def start_gateway(routes, host='127.0.0.1', port=0):
+    """Serve the routes from a background thread, returns the server (port 0 picks a free one, see server_address)"""
+    server = Gateway((host, port), routes)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def gateway_routes(root='./Shuffled', images_cid=None, metadata_cid=None):
+    """({CID: folder}, metadata CID) for Images, NoJson and the renditions of root
+
+    CIDs not given are computed offline (IPFS_CID.py), so they are the
+    ones the folders will get when they are uploaded.
+    """
+    images_folder = os.path.join(root, 'Images')
+    nojson_folder = os.path.join(root, 'NoJson')
+    metadata_cid = metadata_cid or compute_folder_cid(nojson_folder)
+    routes = {images_cid or compute_folder_cid(images_folder): images_folder, metadata_cid: nojson_folder}
+    for name in RENDITIONS:
+        folder = rendition_folder(name, root)
+        if index_folder(folder, RENDITIONS[name]['extension']):
+            routes[compute_folder_cid(folder)] = folder
+    return routes, metadata_cid
+
+class GatewayClient:
+    """One keep-alive HTTP/1.1 connection to the gateway, reopened whenever the server closes it"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        """(status, body) of a GET, retried once on a fresh connection if a kept-alive one went stale"""
+        for attempt in range(2):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self.writer.write(f'GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n'.encode('ascii'))
+                await self.writer.drain()
+                status_line = await self.reader.readline()
+                if not status_line:
+                    raise ConnectionResetError('gateway closed the connection')
+                status = int(status_line.split()[1])
+                headers = {}
+                while True:
+                    line = await self.reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await self.reader.readexactly(int(headers.get('content-length', 0)))
+                if headers.get('connection', '').lower() == 'close':
+                    await self.close()
+                return status, body
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt:
+                    raise
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.reader = self.writer = None
+
+async def check_token(fetch, metadata_cid, token, rarities):
+    """Resolve one token like an indexer would, returns its problems
+
+    The metadata has to resolve and parse, carry the token's name and a
+    known rarity that matches its RARITY attribute, and its image and
+    rendition URLs have to resolve to images of the right size.
+    """
+    status, body = await fetch('metadata', f'/ipfs/{metadata_cid}/{token}')
+    if status != 200:
+        return [f'{token}: metadata returned HTTP {status}']
+    try:
+        metadata = json.loads(body)
+    except ValueError as e:
+        return [f'{token}: metadata is not valid JSON ({e})']
+
+    problems = []
+    if metadata.get('name') != METADATA_NAME.format(token_id=token):
+        problems.append(f'{token}: name is {metadata.get("name")!r}')
+
+    rarity = metadata.get('properties', {}).get('RARITY')
+    attribute_rarities = [attribute.get('value') for attribute in metadata.get('attributes', [])
+                          if attribute.get('trait_type') == 'RARITY']
+    if rarity not in rarities:
+        problems.append(f'{token}: unknown rarity {rarity!r}')
+    if attribute_rarities != [rarity]:
+        problems.append(f'{token}: RARITY attributes {attribute_rarities} do not match properties.RARITY {rarity!r}')
+
+    if 'image' not in metadata:
+        problems.append(f'{token}: no image field')
+    urls = [('image', 'image', '.png', CANVAS_SIZE)] if 'image' in metadata else []
+    urls += [(name, field, RENDITIONS[name]['extension'], RENDITIONS[name]['size'])
+             for name, field in rendition_fields(metadata)]
+
+    for kind, field, extension, size in urls:
+        parsed = parse_ipfs_url(metadata[field])
+        if parsed is None:
+            problems.append(f'{token}: {field} is not an IPFS URL: {metadata[field]}')
+            continue
+        cid, filename = parsed
+        if filename != f'{token}{extension}':
+            problems.append(f'{token}: {field} points at {filename}')
+        status, body = await fetch(kind, f'/ipfs/{cid}/{quote(filename)}')
+        if status != 200:
+            problems.append(f'{token}: {field} {metadata[field]} returned HTTP {status}')
+            continue
+        try:
+            # Only the header is decoded
+            with Image.open(io.BytesIO(body)) as img:
+                dimensions = img.size
+        except OSError as e:
+            problems.append(f'{token}: {field} is not a readable image ({e})')
+            continue
+        if dimensions != (size, size):
+            problems.append(f'{token}: {field} is {dimensions[0]}x{dimensions[1]}, expected {size}x{size}')
+
+    return problems
+
+async def crawl(host, port, metadata_cid, tokens, concurrency=DEFAULT_CONCURRENCY, rarities=None):
+    """Check every token through the gateway with concurrency connections, returns (problems, latencies, bytes)
+
+    latencies is {request kind: [seconds, ...]}, kinds being 'metadata',
+    'image' and the rendition names.
+    """
+    if rarities is None:
+        rarities = {mapping['rarity'] for mapping in get_folder_mapping().values()}
+    problems = []
+    latencies = {}
+    received = [0]
+    pending = iter(tokens)
+    progress = ProgressLine('Crawling', len(tokens))
+
+    async def worker():
+        client = GatewayClient(host, port)
+
+        async def fetch(kind, path):
+            start = time.perf_counter()
+            status, body = await client.get(path)
+            latencies.setdefault(kind, []).append(time.perf_counter() - start)
+            received[0] += len(body)
+            return status, body
+
+        try:
+            # Every worker takes the next token from the shared iterator
+            for token in pending:
+                try:
+                    problems.extend(await check_token(fetch, metadata_cid, token, rarities))
+                except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+                    problems.append(f'{token}: request failed ({e})')
+                progress.advance()
+        finally:
+            await client.close()
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(tokens))))))
+    progress.close()
+    return problems, latencies, received[0]
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def crawl_tokens(root='./Shuffled'):
+    """Token IDs an indexer would ask for: 0 to n-1 from the permutation, or whatever NoJson holds"""
+    try:
+        return [str(number) for number in sorted(load_permutation(os.path.join(root, 'permutation.json')).values())]
+    except (OSError, ValueError, KeyError):
+        return index_folder(os.path.join(root, 'NoJson'), '').tokens
+
+def check_gateway(concurrency=DEFAULT_CONCURRENCY, images_cid=None, metadata_cid=None, port=0,
+                  report_path=None, trace_path=None):
+    """Serve Shuffled from a local gateway and resolve every token through it, returns the problems"""
+    root = './Shuffled'
+    stats = StageStats('GatewayCheck')
+
+    if not index_folder(os.path.join(root, 'NoJson'), ''):
+        print('❌ Shuffled/NoJson is empty, run JsonRemover.py (option 3) or FinalizeMetadata.py first')
+        return None
+
+    with stats.stage('cids'):
+        routes, metadata_cid = gateway_routes(root, images_cid, metadata_cid)
+    server = start_gateway(routes, port=port)
+    host, port = server.server_address[:2]
+    print(f'🌐 Local gateway on http://{host}:{port}')
+    for cid, folder in routes.items():
+        print(f'   /ipfs/{cid}/ → {folder}')
+
+    tokens = crawl_tokens(root)
+    print(f'🕷️ Resolving {len(tokens)} tokens with {concurrency} connections...')
+    start = time.perf_counter()
+    try:
+        problems, latencies, received = asyncio.run(crawl(host, port, metadata_cid, tokens, concurrency))
+    finally:
+        server.shutdown()
+        server.server_close()
+    elapsed = time.perf_counter() - start
+    stats.bytes_read += received
+
+    requests = sum(len(values) for values in latencies.values())
+    print(f'\n📈 {len(tokens) / elapsed:.0f} tokens/s, {requests / elapsed:.0f} requests/s, '
+          f'{received / 1e6 / elapsed:.1f} MB/s over {elapsed:.2f}s')
+    print(f'   {"request":<12} {"count":>8} {"p50":>9} {"p90":>9} {"p99":>9} {"max":>9}')
+    latency_report = {}
+    for kind in sorted(latencies, key=lambda kind: (kind != 'metadata', kind != 'image', kind)):
+        values = sorted(latencies[kind])
+        stats.record(kind, sum(values), len(values))
+        latency_report[kind] = {'count': len(values), 'p50': percentile(values, 0.5), 'p90': percentile(values, 0.9),
+                                'p99': percentile(values, 0.99), 'max': values[-1]}
+        print(f'   {kind:<12} {len(values):>8} ' +
+              ' '.join(f'{latency_report[kind][key] * 1000:>7.2f}ms' for key in ('p50', 'p90', 'p99', 'max')))
+
+    if problems:
+        problems.sort(key=lambda problem: number_sort_key(problem.split(':', 1)[0]))
+        failed = {problem.split(':', 1)[0] for problem in problems}
+        print(f'\n❌ {len(problems)} problem(s) in {len(failed)} tokens ({format_ranges(failed)}):')
+        for problem in problems[:MAX_PRINTED]:
+            print(f'   {problem}')
+        if len(problems) > MAX_PRINTED:
+            print(f'   ... and {len(problems) - MAX_PRINTED} more' + (f' in {report_path}' if report_path else ''))
+    else:
+        print(f'\n✅ All {len(tokens)} tokens resolve, every image has the right size and rarity')
+
+    if report_path:
+        report = {
+            'routes': routes,
+            'tokens': len(tokens),
+            'seconds': elapsed,
+            'latencies': latency_report,
+            'problems': problems
+        }
+        write_file_atomic(report_path, json.dumps(report, indent=4))
+        print(f'📝 Report written to {report_path}')
+
+    stats.print_summary()
+    if trace_path:
+        stats.write_trace(trace_path)
+    return problems
+
+def serve(port, images_cid=None, metadata_cid=None):
+    """Only run the gateway, e.g. to point a marketplace-style indexer or a browser at it"""
+    routes, _ = gateway_routes('./Shuffled', images_cid, metadata_cid)
+    server = Gateway(('127.0.0.1', port), routes)
+    print(f'🌐 Local gateway on http://127.0.0.1:{server.server_address[1]} (Ctrl+C to stop)')
+    for cid, folder in routes.items():
+        print(f'   /ipfs/{cid}/ → {folder}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\n👋 Gateway stopped')
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resolve every token of Shuffled through a local IPFS gateway stand-in '
+                                                 'before pinning, like a marketplace indexer would')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'requests in flight at once (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--images-cid', help='CID of Shuffled/Images (default: computed offline)')
+    parser.add_argument('--metadata-cid', help='CID of Shuffled/NoJson (default: computed offline)')
+    parser.add_argument('--port', type=int, default=0, help='gateway port (default: any free port, 8080 with --serve)')
+    parser.add_argument('--serve', action='store_true', help='only run the gateway until Ctrl+C, no crawl')
+    parser.add_argument('--report', help='also write latencies and problems to this JSON file')
+    parser.add_argument('--trace', help='save per-stage timings to this file (.json or .csv)')
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port or 8080, args.images_cid, args.metadata_cid)
+    else:
+        problems = check_gateway(concurrency=max(1, args.concurrency), images_cid=args.images_cid,
+                                 metadata_cid=args.metadata_cid, port=args.port,
+                                 report_path=args.report, trace_path=args.trace)
+        if problems is None or problems:
+            raise SystemExit(1)
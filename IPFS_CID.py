@@ -0,0 +1,298 @@
+import os
+import time
+import base64
+import hashlib
+import argparse
+
+# Settings matching "ipfs add -r --cid-version=1" with kubo defaults:
+# size-262144 chunker, raw leaves, balanced DAG with up to 174 links per node,
+# and directories sharded into a HAMT once their links pass 256KiB
+CHUNK_SIZE = 262144
+MAX_LINKS = 174
+HAMT_SHARDING_SIZE = 256 * 1024
+HAMT_FANOUT = 256
+
+# Multicodec / multihash codes
+CODEC_RAW = 0x55
+CODEC_DAG_PB = 0x70
+SHA2_256 = 0x12
+MURMUR3_X64_64 = 0x22
+
+# UnixFS Data.Type values
+UNIXFS_DIRECTORY = 1
+UNIXFS_FILE = 2
+UNIXFS_HAMT_SHARD = 5
+
+MASK_64 = (1 << 64) - 1
+
+def varint(value):
+    """Unsigned LEB128 varint (protobuf and multiformats)"""
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _pb_bytes(field, data):
+    return varint(field << 3 | 2) + varint(len(data)) + data
+
+def _pb_uint(field, value):
+    return varint(field << 3) + varint(value)
+
+def make_cid(codec, data):
+    """Binary CIDv1 of a block: version, codec, sha2-256 multihash"""
+    return varint(1) + varint(codec) + bytes([SHA2_256, 32]) + hashlib.sha256(data).digest()
+
+def cid_to_string(cid):
+    """Base32 multibase form of a binary CID (the usual "bafy..." string)"""
+    return 'b' + base64.b32encode(cid).decode('ascii').lower().rstrip('=')
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+def is_cid(value):
+    """True for a CIDv0 ("Qm...") or a base32 CIDv1 ("bafy...") string, False for placeholders and typos"""
+    if not isinstance(value, str):
+        return False
+    if value.startswith('Qm'):
+        # base58btc sha2-256 multihash, always 46 characters
+        return len(value) == 46 and all(char in BASE58_ALPHABET for char in value)
+    if not value.startswith('b') or value != value.lower():
+        return False
+    try:
+        cid = base64.b32decode(value[1:].upper() + '=' * (-len(value[1:]) % 8))
+    except ValueError:
+        return False
+    # version 1, a codec, then a multihash whose digest has the length it declares
+    fields = []
+    position = 0
+    while len(fields) < 4 and position < len(cid):
+        value = shift = 0
+        while position < len(cid):
+            byte = cid[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        fields.append(value)
+    return len(fields) == 4 and fields[0] == 1 and len(cid) - position == fields[3] > 0
+
+def encode_dag_pb(links, data):
+    """Encode a dag-pb node, links is a list of (name, cid, tsize)"""
+    out = bytearray()
+    for name, cid, tsize in links:
+        link = _pb_bytes(1, cid) + _pb_bytes(2, name.encode('utf-8')) + _pb_uint(3, tsize)
+        out += _pb_bytes(2, link)
+    out += _pb_bytes(1, data)
+    return bytes(out)
+
+def _dag_pb_block(links, data, sink=None):
+    """Build a dag-pb block, returns (cid, cumulative size)"""
+    block = encode_dag_pb(links, data)
+    cid = make_cid(CODEC_DAG_PB, block)
+    if sink is not None:
+        sink(cid, block)
+    return cid, len(block) + sum(tsize for _, _, tsize in links)
+
+def murmur3_x64_64(data):
+    """First 64 bits of MurmurHash3 x64 128 (seed 0) as 8 big-endian bytes, the HAMT hash"""
+    c1 = 0x87c37b91114253d5
+    c2 = 0x4cf5ad432745937f
+
+    def rotl(x, r):
+        return ((x << r) | (x >> (64 - r))) & MASK_64
+
+    def fmix(k):
+        k ^= k >> 33
+        k = (k * 0xff51afd7ed558ccd) & MASK_64
+        k ^= k >> 33
+        k = (k * 0xc4ceb9fe1a85ec53) & MASK_64
+        k ^= k >> 33
+        return k
+
+    length = len(data)
+    h1 = h2 = 0
+    block_end = length - length % 16
+
+    for i in range(0, block_end, 16):
+        k1 = int.from_bytes(data[i:i + 8], 'little')
+        k2 = int.from_bytes(data[i + 8:i + 16], 'little')
+
+        k1 = (rotl((k1 * c1) & MASK_64, 31) * c2) & MASK_64
+        h1 ^= k1
+        h1 = (rotl(h1, 27) + h2) & MASK_64
+        h1 = (h1 * 5 + 0x52dce729) & MASK_64
+
+        k2 = (rotl((k2 * c2) & MASK_64, 33) * c1) & MASK_64
+        h2 ^= k2
+        h2 = (rotl(h2, 31) + h1) & MASK_64
+        h2 = (h2 * 5 + 0x38495ab5) & MASK_64
+
+    tail = data[block_end:]
+    if len(tail) > 8:
+        k2 = int.from_bytes(tail[8:], 'little')
+        h2 ^= (rotl((k2 * c2) & MASK_64, 33) * c1) & MASK_64
+    if tail:
+        k1 = int.from_bytes(tail[:8], 'little')
+        h1 ^= (rotl((k1 * c1) & MASK_64, 31) * c2) & MASK_64
+
+    h1 ^= length
+    h2 ^= length
+    h1 = (h1 + h2) & MASK_64
+    h2 = (h2 + h1) & MASK_64
+    h1 = fmix(h1)
+    h2 = fmix(h2)
+    h1 = (h1 + h2) & MASK_64
+
+    return h1.to_bytes(8, 'big')
+
+def _file_node(children, sink=None):
+    """UnixFS file node over children given as (cid, cumulative size, file size)"""
+    data = _pb_uint(1, UNIXFS_FILE) + _pb_uint(3, sum(size for _, _, size in children))
+    for _, _, size in children:
+        data += _pb_uint(4, size)
+
+    cid, tsize = _dag_pb_block([('', cid, tsize) for cid, tsize, _ in children], data, sink)
+    return cid, tsize, sum(size for _, _, size in children)
+
+def _balanced_tree(leaves, depth, sink=None):
+    """Balanced layout: full subtrees of MAX_LINKS ** (depth - 1) leaves, filled left to right"""
+    if depth == 1:
+        return _file_node(leaves, sink)
+
+    span = MAX_LINKS ** (depth - 1)
+    return _file_node([_balanced_tree(leaves[i:i + span], depth - 1, sink) for i in range(0, len(leaves), span)], sink)
+
+def file_cid(path, chunk_size=CHUNK_SIZE, sink=None):
+    """CID of a file, read in chunks, returns (cid, cumulative size, file size)
+
+    If sink is given it is called with (cid, block) for every block as it is built.
+    """
+    leaves = []
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            # Short reads are only expected at the end of the file
+            while chunk and len(chunk) < chunk_size:
+                more = f.read(chunk_size - len(chunk))
+                if not more:
+                    break
+                chunk += more
+            if not chunk and leaves:
+                break
+            cid = make_cid(CODEC_RAW, chunk)
+            if sink is not None:
+                sink(cid, chunk)
+            leaves.append((cid, len(chunk), len(chunk)))
+            if len(chunk) < chunk_size:
+                break
+
+    # A single chunk is its own raw block
+    if len(leaves) == 1:
+        return leaves[0]
+
+    depth = 1
+    while MAX_LINKS ** depth < len(leaves):
+        depth += 1
+    return _balanced_tree(leaves, depth, sink)
+
+def _hamt_shard(entries, depth=0, sink=None):
+    """HAMT shard node over entries given as (name, cid, cumulative size, hash)"""
+    slots = {}
+    for entry in entries:
+        # Fanout 256 uses one byte of the hash per level
+        slots.setdefault(entry[3][depth], []).append(entry)
+
+    links = []
+    bitfield = 0
+    for index in sorted(slots):
+        bitfield |= 1 << index
+        slot = slots[index]
+        prefix = f'{index:02X}'
+        if len(slot) == 1:
+            name, cid, tsize, _ = slot[0]
+            links.append((prefix + name, cid, tsize))
+        else:
+            cid, tsize = _hamt_shard(slot, depth + 1, sink)
+            links.append((prefix, cid, tsize))
+
+    data = (_pb_uint(1, UNIXFS_HAMT_SHARD)
+            + _pb_bytes(2, bitfield.to_bytes((bitfield.bit_length() + 7) // 8, 'big'))
+            + _pb_uint(5, MURMUR3_X64_64)
+            + _pb_uint(6, HAMT_FANOUT))
+    return _dag_pb_block(links, data, sink)
+
+def directory_node(entries, sink=None):
+    """UnixFS directory over (name, cid, cumulative size) entries, returns (cid, cumulative size)"""
+    # Same size estimate kubo uses to decide when a directory gets sharded
+    estimated_size = sum(len(name.encode('utf-8')) + len(cid) for name, cid, _ in entries)
+
+    if estimated_size >= HAMT_SHARDING_SIZE:
+        return _hamt_shard([(name, cid, tsize, murmur3_x64_64(name.encode('utf-8'))) for name, cid, tsize in entries], sink=sink)
+
+    entries = sorted(entries, key=lambda entry: entry[0].encode('utf-8'))
+    return _dag_pb_block(entries, _pb_uint(1, UNIXFS_DIRECTORY), sink)
+
+def directory_cid(folder, stats=None, sink=None):
+    """CID of a folder as "ipfs add -r --cid-version=1" would produce it (hidden files skipped)
+
+    If a stats dict is given, 'files' and 'bytes' are added to it. If sink is
+    given it is called with (cid, block) for every block of the DAG.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault('files', 0)
+    stats.setdefault('bytes', 0)
+
+    entries = []
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir():
+                cid, tsize = directory_cid(entry.path, stats, sink)
+            else:
+                cid, tsize, size = file_cid(entry.path, sink=sink)
+                stats['files'] += 1
+                stats['bytes'] += size
+            entries.append((entry.name, cid, tsize))
+
+    return directory_node(entries, sink)
+
+def compute_folder_cid(folder='./Shuffled/Images'):
+    """Return the CID string of a folder, printing what was hashed and how fast"""
+    stats = {}
+    start = time.perf_counter()
+    cid, _ = directory_cid(folder, stats)
+    elapsed = time.perf_counter() - start
+
+    megabytes = stats['bytes'] / (1024 * 1024)
+    print(f'📦 {folder}: {stats["files"]} files, {megabytes:.1f} MB hashed in {elapsed:.2f}s '
+          f'({megabytes / elapsed if elapsed else 0:.1f} MB/s)')
+    return cid_to_string(cid)
+
+def benchmark_hashing(size_mb=256):
+    """Hashing throughput of the chunk → raw block → CID path on in-memory data"""
+    data = os.urandom(CHUNK_SIZE) * (size_mb * 1024 * 1024 // CHUNK_SIZE)
+
+    start = time.perf_counter()
+    for i in range(0, len(data), CHUNK_SIZE):
+        make_cid(CODEC_RAW, data[i:i + CHUNK_SIZE])
+    elapsed = time.perf_counter() - start
+
+    print(f'⏱️ Raw leaf hashing: {size_mb} MB in {elapsed:.2f}s ({size_mb / elapsed:.1f} MB/s)')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute the IPFS CID of a folder offline (same as "ipfs add -r --cid-version=1")')
+    parser.add_argument('folder', nargs='?', default='./Shuffled/Images', help='folder to hash (default: ./Shuffled/Images)')
+    parser.add_argument('--benchmark', action='store_true', help='also report in-memory hashing throughput')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        print(f'❌ Folder not found: {args.folder}')
+    else:
+        print(f'CID: {compute_folder_cid(args.folder)}')
+
+    if args.benchmark:
+        benchmark_hashing()
@@ -1,150 +1,466 @@
 import os
+import re
 import json
-import glob
-
-
-def update_ipfs_cid():
-    """Update IPFS CID in all JSON metadata files"""
-
-    # ⚠️ CHANGE THIS TO YOUR NEW IPFS CID ⚠️ (there is another place you also need to change below)
-    NEW_CID = "bafybeicsminwcuv2wptbwsgxpdbe5zpd3xgoh6ozdq5gvxrvf2m67tido4"  # Replace with your actual CID
-
-    # Define paths
-    metadata_folder = "./Shuffled/Metadata"
-
-    print("🚀 Starting IPFS CID update...")
-    print(f"Metadata folder: {metadata_folder}")
-    print(f"New CID: {NEW_CID}")
-
-    # Check if metadata folder exists
-    if not os.path.exists(metadata_folder):
-        print(f"❌ Metadata folder not found: {metadata_folder}")
-        return
-
-    # Get all JSON files in metadata folder
-    json_files = glob.glob(os.path.join(metadata_folder, "*.json"))
-
-    if not json_files:
-        print(f"⚠️ No JSON files found in {metadata_folder}")
-        return
-
-    print(f"Found {len(json_files)} JSON files to update")
-
-    success_count = 0
-    error_count = 0
-
-    # Process each JSON file
-    for json_file_path in json_files:
-        filename = os.path.basename(json_file_path)
-
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from file_io import write_file_atomic
+from instrumentation import StageStats, ProgressLine, trace_path_from_argv
+from renditions import RENDITIONS, PENDING_CID, rendition_folder
+from IPFS_CID import compute_folder_cid
+from directory_index import index_folder, format_ranges, number_sort_key
+from metadata_bundle import open_bundle, find_bundle
+
+
+# ⚠️ CHANGE THIS TO YOUR NEW IPFS CID ⚠️ (or enter it when the script asks)
+NEW_CID = "bafybeicsminwcuv2wptbwsgxpdbe5zpd3xgoh6ozdq5gvxrvf2m67tido4"  # Replace with your actual CID
+
+# Only if you made renditions: the CID of each uploaded Shuffled/Previews, Shuffled/Thumbnails folder
+# (or enter them when the script asks, leaving them empty computes them offline)
+NEW_RENDITION_CIDS = {}  # e.g. {"preview": "bafy...", "thumbnail": "bafy..."}
+
+# How the rewritten URLs look, {cid} and {filename} are filled in per token
+URL_TEMPLATES = {
+    "ipfs.io": "https://ipfs.io/ipfs/{cid}/{filename}",
+    "ipfs": "ipfs://{cid}/{filename}",
+    "dweb.link": "https://{cid}.ipfs.dweb.link/{filename}",
+    "pinata": "https://gateway.pinata.cloud/ipfs/{cid}/{filename}",
+}
+DEFAULT_URL_TEMPLATE = URL_TEMPLATES["ipfs.io"]
+
+# https://<cid>.ipfs.<gateway>/<filename>
+SUBDOMAIN_URL = re.compile(r"https?://([^./]+)\.ipfs\.[^/]+/(.+)")
+
+# Rewriting is mostly waiting on file I/O, so threads beyond the core count still help
+DEFAULT_THREADS = min(32, (os.cpu_count() or 1) * 4)
+CHUNK_SIZE = 256
+
+
+def parse_ipfs_url(url):
+    """Split an IPFS URL into (CID, filename), or None if it is not one
+
+    Understands ipfs://<cid>/<filename>, path-style gateways
+    (https://<gateway>/ipfs/<cid>/<filename>) and subdomain gateways
+    (https://<cid>.ipfs.<gateway>/<filename>).
+    """
+    if url.startswith("ipfs://"):
+        rest = url[len("ipfs://"):]
+        if rest.startswith("ipfs/"):
+            rest = rest[len("ipfs/"):]
+    elif "/ipfs/" in url:
+        rest = url.split("/ipfs/", 1)[1]
+    else:
+        match = SUBDOMAIN_URL.match(url)
+        return match.groups() if match else None
+
+    cid, _, filename = rest.partition("/")
+    return (cid, filename) if cid and filename else None
+
+
+def rewrite_image_url(current_image_url, cid, url_template=DEFAULT_URL_TEMPLATE):
+    """Return the image URL pointed at a new CID, or None if it is not an IPFS URL"""
+    parsed = parse_ipfs_url(current_image_url)
+    if parsed is None:
+        return None
+    return url_template.format(cid=cid, filename=parsed[1])
+
+
+def rewrite_targets(cid, rendition_cids=None):
+    """{metadata field: CID} for the image and every rendition with a CID"""
+    targets = {"image": cid}
+    for name, rendition_cid in (rendition_cids or {}).items():
+        targets[RENDITIONS[name]["field"]] = rendition_cid
+    return targets
+
+
+_field_patterns = {}
+
+
+def _field_pattern(field):
+    """Matches "field": "<string value>" in raw JSON bytes"""
+    pattern = _field_patterns.get(field)
+    if pattern is None:
+        pattern = _field_patterns[field] = re.compile(
+            rb'"' + re.escape(field.encode("utf-8")) + rb'"\s*:\s*"((?:[^"\\]|\\.)*)"'
+        )
+    return pattern
+
+
+def _rewrite_parsed(data, targets, url_template):
+    """rewrite_metadata_bytes the slow way: load, change the top-level fields, dump"""
+    metadata = json.loads(data)
+    warnings = []
+    changed = False
+    for field, cid in targets.items():
+        if field not in metadata:
+            if field == "image":
+                warnings.append("No image field")
+            continue
+        new_url = rewrite_image_url(metadata[field], cid, url_template)
+        if new_url is None:
+            warnings.append(f"Not an IPFS URL: {metadata[field]}")
+        elif new_url != metadata[field]:
+            metadata[field] = new_url
+            changed = True
+    return (json.dumps(metadata, indent=4).encode("utf-8") if changed else None), warnings
+
+
+def rewrite_metadata_bytes(data, targets, url_template=DEFAULT_URL_TEMPLATE):
+    """Point the URL fields of one metadata file at new CIDs, returns (new bytes or None if up to date, warnings)
+
+    Only the URL strings are replaced in the raw bytes, so a file that
+    already points at the targets is recognized without parsing it and
+    everything else in a changed file stays byte-for-byte the same. Files
+    where a field name shows up more than once (e.g. nested objects) are
+    parsed and re-dumped instead.
+    """
+    changes = []
+    warnings = []
+    for field, cid in targets.items():
+        matches = list(_field_pattern(field).finditer(data))
+        if len(matches) > 1:
+            return _rewrite_parsed(data, targets, url_template)
+        if not matches:
+            if field == "image":
+                warnings.append("No image field")
+            continue
+
+        match = matches[0]
+        url = json.loads(b'"' + match.group(1) + b'"')
+        new_url = rewrite_image_url(url, cid, url_template)
+        if new_url is None:
+            warnings.append(f"Not an IPFS URL: {url}")
+        elif new_url != url:
+            changes.append((match.start(1), match.end(1), json.dumps(new_url)[1:-1].encode("utf-8")))
+
+    if not changes:
+        return None, warnings
+    for start, end, value in sorted(changes, reverse=True):
+        data = data[:start] + value + data[end:]
+    return data, warnings
+
+
+def rewrite_files(paths, targets, url_template, dry_run=False):
+    """Rewrite a chunk of metadata files, only writing the ones that change
+
+    Returns a dict of counts, messages, bytes and seconds per stage, which
+    the caller adds up (StageStats is not shared between threads), and the
+    tokens whose metadata still has a PENDING_CID URL afterwards.
+    """
+    result = {"updated": 0, "skipped": 0, "errors": [], "warnings": [], "changes": [], "pending": [],
+              "bytes_read": 0, "bytes_written": 0, "stages": {"read": 0.0, "rewrite": 0.0, "write": 0.0}}
+
+    for path in paths:
+        filename = os.path.basename(path)
         try:
-            # Load JSON file
-            with open(json_file_path, "r") as f:
-                metadata = json.load(f)
-
-            # Check if image field exists
-            if "image" not in metadata:
-                print(f"⚠️ No image field in {filename}")
+            start = time.perf_counter()
+            with open(path, "rb") as f:
+                data = f.read()
+            read_done = time.perf_counter()
+            new_data, warnings = rewrite_metadata_bytes(data, targets, url_template)
+            rewrite_done = time.perf_counter()
+            result["stages"]["read"] += read_done - start
+            result["stages"]["rewrite"] += rewrite_done - read_done
+            result["bytes_read"] += len(data)
+            result["warnings"].extend(f"{filename}: {warning}" for warning in warnings)
+            if PENDING_CID.encode("utf-8") in (new_data or data):
+                result["pending"].append(os.path.splitext(filename)[0])
+
+            if new_data is None:
+                result["skipped"] += 1
                 continue
 
-            # Extract the current image URL
-            current_image_url = metadata["image"]
+            if dry_run:
+                result["changes"].append((filename, data, new_data))
+            else:
+                write_file_atomic(path, new_data)
+                result["stages"]["write"] += time.perf_counter() - rewrite_done
+                result["bytes_written"] += len(new_data)
+            result["updated"] += 1
 
-            # Check if it's an IPFS URL
-            if "ipfs.io/ipfs/" not in current_image_url:
-                print(f"⚠️ Not an IPFS URL in {filename}: {current_image_url}")
-                continue
-
-            # Extract the filename part (e.g., "0.png", "1.png", etc.)
-            # Split by '/' and get the last part
-            url_parts = current_image_url.split("/")
-            image_filename = url_parts[-1]  # Gets "0.png", "1.png", etc.
+        except (OSError, ValueError) as e:
+            result["errors"].append(f"{filename}: {e}")
 
-            # Create new URL with new CID
-            new_image_url = f"https://ipfs.io/ipfs/{NEW_CID}/{image_filename}"
+    return result
 
-            # Update the metadata
-            old_url = metadata["image"]
-            metadata["image"] = new_image_url
 
-            # Save the updated JSON file
-            with open(json_file_path, "w") as f:
-                json.dump(metadata, f, indent=4)
+def rewrite_bundle(bundle, targets, url_template, token_ids=None, dry_run=False):
+    """rewrite_files for a metadata bundle: every changed token is saved in one bulk write
 
-            print(f"✅ Updated {filename}: {image_filename}")
-            success_count += 1
+    Returns the same dict of counts as rewrite_files.
+    """
+    result = {"updated": 0, "skipped": 0, "errors": [], "warnings": [], "changes": [], "pending": [],
+              "bytes_read": 0, "bytes_written": 0, "stages": {"read": 0.0, "rewrite": 0.0, "write": 0.0}}
 
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON decode error in {filename}: {e}")
-            error_count += 1
-        except Exception as e:
-            print(f"❌ Error processing {filename}: {e}")
-            error_count += 1
-
-    print(f"\n🎉 IPFS CID update complete!")
-    print(f"Successfully updated: {success_count} files")
-    print(f"Errors: {error_count} files")
-    print(f"Total processed: {len(json_files)} files")
+    start = time.perf_counter()
+    texts = dict(bundle.texts())
+    read_done = time.perf_counter()
+    result["stages"]["read"] = read_done - start
 
-    if success_count > 0:
-        print(f"\n✅ All image URLs now use CID: {NEW_CID}")
+    if token_ids is not None:
+        missing = [token_id for token_id in token_ids if token_id not in texts]
+        if missing:
+            print(f"⚠️ {len(missing)} selected tokens are not in {bundle.path}: {format_ranges(missing)}")
+        selected = [token_id for token_id in token_ids if token_id in texts]
+    else:
+        selected = list(texts)
 
+    changed = []
+    for token_id in selected:
+        data = texts[token_id].encode("utf-8")
+        result["bytes_read"] += len(data)
+        try:
+            new_data, warnings = rewrite_metadata_bytes(data, targets, url_template)
+        except ValueError as e:
+            result["errors"].append(f"{token_id}: {e}")
+            continue
+        result["warnings"].extend(f"{token_id}: {warning}" for warning in warnings)
+        if PENDING_CID.encode("utf-8") in (new_data or data):
+            result["pending"].append(token_id)
+        if new_data is None:
+            result["skipped"] += 1
+            continue
+        if dry_run:
+            result["changes"].append((token_id, data, new_data))
+        else:
+            changed.append((token_id, new_data.decode("utf-8")))
+            result["bytes_written"] += len(new_data)
+        result["updated"] += 1
+    rewrite_done = time.perf_counter()
+    result["stages"]["rewrite"] = rewrite_done - read_done
+
+    if changed:
+        bundle.put_many(changed)
+        result["stages"]["write"] = time.perf_counter() - rewrite_done
+    return result
+
+
+def parse_token_ids(value):
+    """Turn "1,5,10-20" into ["1", "5", "10", ..., "20"], an empty string means all tokens (None)"""
+    if not value.strip():
+        return None
+    token_ids = []
+    for part in value.split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = part.split("-", 1)
+            token_ids.extend(str(number) for number in range(int(first), int(last) + 1))
+        elif part:
+            token_ids.append(str(int(part)))
+    return token_ids
+
+
+def metadata_files(folder, extension, token_ids=None):
+    """Paths of the metadata files in a folder in token order, or only those of token_ids"""
+    index = index_folder(folder, extension)
+    if token_ids is None:
+        return index.paths()
+    missing = [token_id for token_id in token_ids if token_id not in index]
+    if missing:
+        print(f"⚠️ {len(missing)} selected tokens have no file in {folder}: {format_ranges(missing)}")
+    return [index.path(token_id) for token_id in token_ids if token_id in index]
+
+
+def update_ipfs_cid(trace_path=None, cid=None, rendition_cids=None, url_template=DEFAULT_URL_TEMPLATE,
+                    token_ids=None, include_nojson=False, threads=DEFAULT_THREADS, dry_run=False):
+    """Update IPFS CID in all JSON metadata files
+
+    Files already pointing at the CIDs through url_template are left
+    untouched, changed ones are replaced atomically by a pool of threads.
+    A metadata bundle in Shuffled (see metadata_bundle.py) takes the place
+    of Shuffled/Metadata and is patched in a single write. token_ids
+    limits the update to those tokens, include_nojson also updates the
+    extensionless copies in Shuffled/NoJson. With dry_run nothing is
+    written and the planned changes are returned. totals["pending"] lists
+    the tokens still pointing at a PENDING_CID rendition afterwards.
+    """
+    cid = cid or NEW_CID
+    if rendition_cids is None:
+        rendition_cids = NEW_RENDITION_CIDS
+    targets = rewrite_targets(cid, rendition_cids)
 
-def preview_changes():
-    """Preview what changes will be made without actually updating files"""
+    # Define paths
+    bundle_path = find_bundle("./Shuffled")
+    folders = [] if bundle_path else [("./Shuffled/Metadata", ".json")]
+    if include_nojson:
+        folders.append(("./Shuffled/NoJson", ""))
+
+    print("🚀 Starting IPFS CID update..." if not dry_run else "👀 PREVIEW MODE - No files will be changed")
+    if bundle_path:
+        print(f"Metadata bundle: {bundle_path}")
+    if folders:
+        print(f"Metadata folder(s): {', '.join(folder for folder, _ in folders)}")
+    print(f"New CID: {cid}")
+    for name, rendition_cid in rendition_cids.items():
+        print(f"New {name} CID: {rendition_cid}")
+    print(f"URL template: {url_template}")
+    if token_ids is not None:
+        print(f"Only tokens: {len(token_ids)} selected")
+
+    paths = []
+    for folder, extension in folders:
+        # Check if metadata folder exists
+        if not os.path.exists(folder):
+            print(f"❌ Metadata folder not found: {folder}")
+            return None
+        paths.extend(metadata_files(folder, extension, token_ids))
+
+    bundle_size = 0
+    if bundle_path:
+        with open_bundle(bundle_path) as bundle:
+            bundle_size = len(bundle) if token_ids is None else sum(token_id in bundle for token_id in token_ids)
+
+    if not paths and not bundle_size:
+        print("⚠️ No metadata files found")
+        return None
+
+    print(f"Found {len(paths) + bundle_size} {'tokens' if bundle_path else 'files'} to check")
+
+    instrumentation = StageStats("update_ipfs_cid")
+    progress = ProgressLine("Updating", len(paths) + bundle_size)
+    chunks = [paths[i:i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)]
+    totals = {"updated": 0, "skipped": 0, "errors": [], "warnings": [], "changes": [], "pending": []}
+
+    def collect(result):
+        for key in ("updated", "skipped"):
+            totals[key] += result[key]
+        for key in ("errors", "warnings", "changes", "pending"):
+            totals[key].extend(result[key])
+        for stage, seconds in result["stages"].items():
+            if seconds:
+                instrumentation.record(stage, seconds, result["updated"] if stage == "write" else
+                                       result["updated"] + result["skipped"])
+        instrumentation.bytes_read += result["bytes_read"]
+        instrumentation.bytes_written += result["bytes_written"]
+        progress.advance(result["updated"] + result["skipped"] + len(result["errors"]))
+
+    if bundle_path:
+        with open_bundle(bundle_path) as bundle:
+            collect(rewrite_bundle(bundle, targets, url_template, token_ids, dry_run))
+
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        for result in executor.map(lambda chunk: rewrite_files(chunk, targets, url_template, dry_run), chunks):
+            collect(result)
+
+    progress.close()
+
+    for warning in totals["warnings"][:10]:
+        print(f"⚠️ {warning}")
+    if len(totals["warnings"]) > 10:
+        print(f"⚠️ ... and {len(totals['warnings']) - 10} more warnings")
+    for error in totals["errors"]:
+        print(f"❌ Error processing {error}")
+    # The same token can be in Shuffled/Metadata and Shuffled/NoJson
+    totals["pending"] = sorted(set(totals["pending"]), key=number_sort_key)
+    if totals["pending"]:
+        print(f"⚠️ {len(totals['pending'])} tokens {'would' if dry_run else 'still'} have {PENDING_CID} URLs, "
+              f"enter the CID of every rendition folder: {format_ranges(totals['pending'])}")
+
+    if dry_run:
+        print(f"\n{totals['updated']} files would change, {totals['skipped']} are already up to date")
+        return totals
 
-    # ⚠️ CHANGE THIS TO YOUR NEW IPFS CID ⚠️
-    NEW_CID = "bafybeicsminwcuv2wptbwsgxpdbe5zpd3xgoh6ozdq5gvxrvf2m67tido4"  # Replace with your actual CID
+    print(f"\n🎉 IPFS CID update complete!")
+    print(f"Successfully updated: {totals['updated']} files")
+    print(f"Already up to date: {totals['skipped']} files")
+    print(f"Errors: {len(totals['errors'])} files")
+    print(f"Total processed: {len(paths) + bundle_size} files")
 
-    metadata_folder = "./Shuffled/Metadata"
+    if totals["updated"] + totals["skipped"] > 0 and not totals["pending"]:
+        print(f"\n✅ All image URLs now use CID: {cid}")
 
-    print("👀 PREVIEW MODE - No files will be changed")
-    print(f"New CID: {NEW_CID}")
+    instrumentation.print_summary()
+    if trace_path:
+        instrumentation.write_trace(trace_path)
+    return totals
 
-    # Get first few JSON files for preview
-    json_files = glob.glob(os.path.join(metadata_folder, "*.json"))[
-        :5
-    ]  # Show first 5 files
 
-    for json_file_path in json_files:
-        filename = os.path.basename(json_file_path)
+def preview_changes(**options):
+    """Preview what changes will be made without actually updating files"""
+    totals = update_ipfs_cid(dry_run=True, **options)
+    if not totals:
+        return
 
-        try:
-            with open(json_file_path, "r") as f:
-                metadata = json.load(f)
+    # Show the changed URLs of the first 5 files
+    for filename, old_data, new_data in totals["changes"][:5]:
+        print(f"\n📄 {filename}:")
+        for field in ["image"] + [spec["field"] for spec in RENDITIONS.values()]:
+            old_match = _field_pattern(field).search(old_data)
+            new_match = _field_pattern(field).search(new_data)
+            if old_match and new_match and old_match.group(1) != new_match.group(1):
+                print(f"  OLD {field}: {old_match.group(1).decode('utf-8')}")
+                print(f"  NEW {field}: {new_match.group(1).decode('utf-8')}")
+
+
+def ask_options():
+    """Ask for the CID, rendition CIDs, URL style, tokens and folders to update"""
+    cid = input(f"\nEnter the new CID (leave empty to use NEW_CID from this script: {NEW_CID}): ").strip() or NEW_CID
+
+    # Every rendition folder needs its CID too, or its URLs keep PENDING_CID
+    rendition_cids = {}
+    for name in RENDITIONS:
+        folder = rendition_folder(name, "./Shuffled")
+        if not os.path.isdir(folder) or not os.listdir(folder):
+            continue
+        default = NEW_RENDITION_CIDS.get(name)
+        rendition_cids[name] = input(
+            f"Enter the {name} CID (leave empty to "
+            f"{'use NEW_RENDITION_CIDS from this script: ' + default if default else 'compute it offline from ' + folder}): "
+        ).strip() or default
+        if not rendition_cids[name]:
+            rendition_cids[name] = compute_folder_cid(folder)
+            print(f"{name.capitalize()} CID computed offline: {rendition_cids[name]}")
+
+    print("\nURL style:")
+    names = list(URL_TEMPLATES)
+    for number, name in enumerate(names, 1):
+        print(f"{number}. {URL_TEMPLATES[name]}")
+    print(f"{len(names) + 1}. Custom template with {{cid}} and {{filename}}")
+    choice = input("Enter choice (leave empty for 1): ").strip() or "1"
+    if choice == str(len(names) + 1):
+        url_template = input("Template: ").strip()
+        if "{cid}" not in url_template or "{filename}" not in url_template:
+            raise ValueError("The template needs both {cid} and {filename}")
+    else:
+        url_template = URL_TEMPLATES[names[int(choice) - 1]]
 
-            if "image" in metadata:
-                current_url = metadata["image"]
-                url_parts = current_url.split("/")
-                image_filename = url_parts[-1]
-                new_url = f"https://ipfs.io/ipfs/{NEW_CID}/{image_filename}"
+    token_ids = parse_token_ids(input("\nToken IDs to update, e.g. 1,5,10-20 (leave empty for all): "))
 
-                print(f"\n📄 {filename}:")
-                print(f"  OLD: {current_url}")
-                print(f"  NEW: {new_url}")
+    include_nojson = False
+    if index_folder("./Shuffled/NoJson", ""):
+        include_nojson = input("Also update the copies in Shuffled/NoJson? (yes/no): ").lower() == "yes"
 
-        except Exception as e:
-            print(f"❌ Error reading {filename}: {e}")
+    return {"cid": cid, "rendition_cids": rendition_cids, "url_template": url_template, "token_ids": token_ids,
+            "include_nojson": include_nojson}
 
 
 if __name__ == "__main__":
     print("IPFS CID Updater")
     print("================")
     print()
-    print("⚠️ IMPORTANT: Update the NEW_CID variable in this script before running!")
+    print("⚠️ IMPORTANT: Set NEW_CID in this script or enter your CID below!")
     print()
 
     choice = input(
-        "Choose option:\n1. Preview changes (recommended first)\n2. Update all files\n\nEnter choice (1 or 2): "
+        "Choose option:\n1. Preview changes (recommended first)\n2. Update files\n\nEnter choice (1 or 2): "
     )
 
-    if choice == "1":
-        preview_changes()
-    elif choice == "2":
-        confirm = input("\n⚠️ This will modify all JSON files. Are you sure? (yes/no): ")
-        if confirm.lower() == "yes":
-            update_ipfs_cid()
-        else:
-            print("Operation cancelled.")
+    if choice in ("1", "2"):
+        try:
+            options = ask_options()
+        except (ValueError, IndexError) as e:
+            print(f"❌ Invalid input: {e}")
+            options = None
+
+        if options and choice == "1":
+            preview_changes(**options)
+        elif options:
+            confirm = input("\n⚠️ This will modify the metadata files. Are you sure? (yes/no): ")
+            if confirm.lower() == "yes":
+                totals = update_ipfs_cid(trace_path_from_argv(), **options)
+                if totals and totals["pending"]:
+                    raise SystemExit(1)
+            else:
+                print("Operation cancelled.")
     else:
         print("Invalid choice. Exiting.")
@@ -1,14 +1,34 @@
 import os
 import shutil
-import glob
 
-def remove_json_extensions():
-    """Copy JSON files from Shuffled/Metadata to Shuffled/NoJson and remove .json extensions"""
+from instrumentation import StageStats, ProgressLine, trace_path_from_argv
+from VerifyCollection import verify_collection
+from directory_index import index_folder, forget, format_ranges
+from metadata_bundle import open_bundle, find_bundle, export_bundle
+
+def remove_json_extensions(trace_path=None):
+    """Copy JSON files from Shuffled/Metadata to Shuffled/NoJson and remove .json extensions
+
+    If the shuffled metadata is a bundle, both folders are written from it
+    instead, the per-file form only exists for the upload.
+    """
     
     # Define paths
     source_folder = "./Shuffled/Metadata"
     destination_folder = "./Shuffled/NoJson"
     
+    bundle_path = find_bundle("./Shuffled")
+    if bundle_path:
+        print(f"📦 Writing {source_folder} and {destination_folder} from {bundle_path}...")
+        instrumentation = StageStats('remove_json_extensions')
+        with instrumentation.stage("export"), open_bundle(bundle_path) as bundle:
+            count = export_bundle(bundle, source_folder, destination_folder)
+        print(f"\n🎉 Wrote {count} metadata files to each folder")
+        instrumentation.print_summary()
+        if trace_path:
+            instrumentation.write_trace(trace_path)
+        return
+    
     print("🗂️ Starting JSON extension removal...")
     print(f"Source folder: {source_folder}")
     print(f"Destination folder: {destination_folder}")
@@ -22,8 +42,8 @@ def remove_json_extensions():
     os.makedirs(destination_folder, exist_ok=True)
     print(f"✅ Created/verified destination folder: {destination_folder}")
     
-    # Get all JSON files from source folder
-    json_files = glob.glob(os.path.join(source_folder, "*.json"))
+    # Get all JSON files from source folder, in token order
+    json_files = index_folder(source_folder, ".json").paths()
     
     if not json_files:
         print(f"⚠️ No JSON files found in {source_folder}")
@@ -33,6 +53,8 @@ def remove_json_extensions():
     
     success_count = 0
     error_count = 0
+    instrumentation = StageStats('remove_json_extensions')
+    progress = ProgressLine('Copying', len(json_files))
     
     # Process each JSON file
     for json_file_path in json_files:
@@ -47,14 +69,22 @@ def remove_json_extensions():
             destination_path = os.path.join(destination_folder, filename_without_extension)
             
             # Copy file to destination without extension
-            shutil.copy2(json_file_path, destination_path)
+            with instrumentation.stage("copy"):
+                shutil.copy2(json_file_path, destination_path)
+            file_size = os.path.getsize(destination_path)
+            instrumentation.bytes_read += file_size
+            instrumentation.bytes_written += file_size
             
-            print(f"✅ {original_filename} → {filename_without_extension}")
             success_count += 1
             
         except Exception as e:
-            print(f"❌ Error processing {os.path.basename(json_file_path)}: {e}")
+            print(f"\n❌ Error processing {os.path.basename(json_file_path)}: {e}")
             error_count += 1
+        
+        progress.advance()
+    
+    progress.close()
+    forget(destination_folder)
     
     print(f"\n🎉 JSON extension removal complete!")
     print(f"Successfully processed: {success_count} files")
@@ -64,6 +94,10 @@ def remove_json_extensions():
     if success_count > 0:
         print(f"\n✅ Files copied to: {destination_folder}")
         print("📝 Files now have no extension (e.g., '0', '1', '2', etc.)")
+    
+    instrumentation.print_summary()
+    if trace_path:
+        instrumentation.write_trace(trace_path)
 
 def preview_operation():
     """Preview what files will be copied and renamed"""
@@ -76,7 +110,8 @@ def preview_operation():
     print(f"Destination: {destination_folder}")
     
     # Get sample of JSON files
-    json_files = glob.glob(os.path.join(source_folder, "*.json"))
+    source_index = index_folder(source_folder, ".json")
+    json_files = source_index.paths()
     
     if not json_files:
         print(f"⚠️ No JSON files found in {source_folder}")
@@ -99,6 +134,11 @@ def preview_operation():
         print(f"... and {len(json_files) - 10} more files")
     
     print(f"\nTotal files to process: {len(json_files)}")
+    
+    # Extensionless copies left over from an earlier shuffle would be uploaded too
+    stale = index_folder(destination_folder, "").missing_from(source_index)
+    if stale:
+        print(f"⚠️ {len(stale)} files in {destination_folder} have no JSON file anymore: {format_ranges(stale)}")
 
 def clear_destination():
     """Clear the NoJson folder before running"""
@@ -106,7 +146,7 @@ def clear_destination():
     destination_folder = "./Shuffled/NoJson"
     
     if os.path.exists(destination_folder):
-        files = glob.glob(os.path.join(destination_folder, "*"))
+        files = index_folder(destination_folder, "").all_paths()
         if files:
             print(f"🧹 Clearing {len(files)} files from {destination_folder}")
             for file in files:
@@ -115,58 +155,13 @@ def clear_destination():
                     print(f"🗑️ Removed: {os.path.basename(file)}")
                 except Exception as e:
                     print(f"⚠️ Could not remove {file}: {e}")
+            forget(destination_folder)
             print("✅ Folder cleared")
         else:
             print(f"📁 {destination_folder} is already empty")
     else:
         print(f"📁 {destination_folder} does not exist (will be created when needed)")
 
-def verify_files():
-    """Verify that files were copied correctly"""
-    
-    source_folder = "./Shuffled/Metadata"
-    destination_folder = "./Shuffled/NoJson"
-    
-    print("🔍 Verifying copied files...")
-    
-    if not os.path.exists(destination_folder):
-        print(f"❌ Destination folder not found: {destination_folder}")
-        return
-    
-    # Get source and destination files
-    source_files = glob.glob(os.path.join(source_folder, "*.json"))
-    destination_files = glob.glob(os.path.join(destination_folder, "*"))
-    
-    print(f"Source files: {len(source_files)}")
-    print(f"Destination files: {len(destination_files)}")
-    
-    if len(source_files) == len(destination_files):
-        print("✅ File count matches!")
-    else:
-        print("⚠️ File count mismatch!")
-    
-    # Check a few sample files
-    sample_count = min(5, len(source_files))
-    print(f"\nVerifying first {sample_count} files:")
-    
-    for i in range(sample_count):
-        source_path = source_files[i]
-        source_name = os.path.basename(source_path)
-        expected_dest_name = os.path.splitext(source_name)[0]
-        expected_dest_path = os.path.join(destination_folder, expected_dest_name)
-        
-        if os.path.exists(expected_dest_path):
-            # Compare file sizes
-            source_size = os.path.getsize(source_path)
-            dest_size = os.path.getsize(expected_dest_path)
-            
-            if source_size == dest_size:
-                print(f"✅ {source_name} → {expected_dest_name} (size: {source_size} bytes)")
-            else:
-                print(f"⚠️ {source_name} → {expected_dest_name} (size mismatch: {source_size} vs {dest_size})")
-        else:
-            print(f"❌ Missing: {expected_dest_name}")
-
 if __name__ == "__main__":
     print("JSON Extension Remover")
     print("=====================")
@@ -177,7 +172,7 @@ if __name__ == "__main__":
         "1. Preview operation (recommended first)\n"
         "2. Clear destination folder\n"
         "3. Remove extensions and copy files\n"
-        "4. Verify copied files\n"
+        "4. Verify copied files (hashes Final and Shuffled, see VerifyCollection.py)\n"
         "\nEnter choice (1, 2, 3, or 4): "
     )
     
@@ -190,10 +185,10 @@ if __name__ == "__main__":
             f"\n⚠️ This will copy all JSON files to Shuffled/NoJson without extensions. Continue? (yes/no): "
         )
         if confirm.lower() == "yes":
-            remove_json_extensions()
+            remove_json_extensions(trace_path_from_argv())
         else:
             print("Operation cancelled.")
     elif choice == "4":
-        verify_files()
+        verify_collection(trace_path=trace_path_from_argv())
     else:
         print("Invalid choice. Exiting.")
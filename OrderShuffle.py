@@ -1,23 +1,157 @@
 import os
 import json
-import glob
 import shutil
 import random
+import hashlib
 
-def shuffle_files():
-    """Randomly shuffle and rename all images and metadata files"""
+from instrumentation import StageStats, ProgressLine, trace_path_from_argv
+from renditions import RENDITIONS, rendition_folder, rendition_path, rendition_fields
+from directory_index import number_sort_key, format_ranges, index_folder, forget, report_unpaired
+from metadata_bundle import open_bundle, find_bundle, remove_other_bundles
+
+# Ways to place a shuffled image, tried in this order by 'auto'
+LINK_METHODS = ('reflink', 'hardlink', 'copy')
+
+# Linux FICLONE ioctl: share the data blocks on btrfs/XFS/etc. (copy-on-write)
+FICLONE = 0x40049409
+
+def reflink_file(source_path, destination_path):
+    """Create a copy-on-write clone of a file (Linux reflink filesystems only)"""
+    import fcntl  # not available on Windows
+    
+    with open(source_path, 'rb') as source, open(destination_path, 'wb') as destination:
+        try:
+            fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+        except OSError:
+            destination.close()
+            os.remove(destination_path)
+            raise
+
+def place_file(source_path, destination_path, methods):
+    """Place a file with the first method that works, returns the method used
+
+    Methods that fail are removed from the list so later files skip them.
+    """
+    if os.path.lexists(destination_path):
+        os.remove(destination_path)
+    
+    while methods:
+        method = methods[0]
+        try:
+            if method == 'reflink':
+                reflink_file(source_path, destination_path)
+            elif method == 'hardlink':
+                os.link(source_path, destination_path)
+            else:
+                shutil.copy2(source_path, destination_path)
+            return method
+        except (OSError, ImportError):
+            if method == 'copy':
+                raise
+            methods.pop(0)
+    
+    raise OSError(f'No placement method left for {source_path}')
+
+def shuffled_order(count, seed=None):
+    """New numbers for tokens 0 to count-1 in order, the same list for the same seed"""
+    new_order = list(range(count))
+    random.Random(seed).shuffle(new_order)
+    return new_order
+
+def save_permutation(permutation_path, mapping, seed=None):
+    """Write the old → new number map plus a SHA-256 commitment of it, returns the hash"""
+    permutation = {
+        'seed': seed,
+        'count': len(mapping),
+        'mapping': {old: mapping[old] for old in sorted(mapping, key=number_sort_key)}
+    }
+    data = json.dumps(permutation, indent=4).encode('utf-8')
+    commitment = hashlib.sha256(data).hexdigest()
+    
+    with open(permutation_path, 'wb') as f:
+        f.write(data)
+    with open(permutation_path + '.sha256', 'w') as f:
+        f.write(f'{commitment}  {os.path.basename(permutation_path)}\n')
+    
+    return commitment
+
+def load_permutation(permutation_path):
+    """Load a saved permutation, checking it against its commitment hash if present"""
+    with open(permutation_path, 'rb') as f:
+        data = f.read()
+    
+    commitment_path = permutation_path + '.sha256'
+    if os.path.exists(commitment_path):
+        with open(commitment_path, 'r') as f:
+            expected = f.read().split()[0]
+        if hashlib.sha256(data).hexdigest() != expected:
+            raise ValueError(f'{permutation_path} does not match its commitment hash')
+    
+    return json.loads(data)['mapping']
+
+def shuffle_metadata(metadata, old_number, new_number):
+    """Point a token's metadata at its new number (name, image URL and rendition URLs)"""
+    # Imported here, batch_combine_images imports this module at load time
+    from batch_combine_images import METADATA_NAME
+    metadata['name'] = METADATA_NAME.format(token_id=new_number)
+    
+    # Update image URL if it exists and contains a number
+    if 'image' in metadata:
+        old_image_url = metadata['image']
+        # Replace the old number with new number in the URL
+        # Find the last occurrence of the old number followed by .png
+        if f'/{old_number}.png' in old_image_url:
+            metadata['image'] = old_image_url.replace(f'/{old_number}.png', f'/{new_number}.png')
+    
+    # Previews/thumbnails follow the same renumbering
+    for name, field in rendition_fields(metadata):
+        extension = RENDITIONS[name]['extension']
+        if f'/{old_number}{extension}' in metadata[field]:
+            metadata[field] = metadata[field].replace(f'/{old_number}{extension}', f'/{new_number}{extension}')
+    
+    return metadata
+
+def shuffle_files(link_mode='copy', seed=None, trace_path=None, metadata=True):
+    """Randomly shuffle and rename all images and metadata files
+
+    link_mode decides how images land in Shuffled/Images: 'copy', 'hardlink',
+    'reflink' or 'auto' (reflink, then hardlink, then copy). With a seed the
+    same collection always gets the same order. The order is saved to
+    Shuffled/permutation.json so it can be audited and re-applied.
+    Renditions found in Final/ (previews, thumbnails) are shuffled into the
+    matching Shuffled/ folders the same way as the images.
+    If Final holds a metadata bundle (batch_combine_images --metadata-bundle)
+    the shuffled metadata goes into a bundle of the same format in Shuffled,
+    written in one go, instead of Shuffled/Metadata.
+    With metadata=False only the images are placed and the permutation
+    saved, FinalizeMetadata.py then writes the metadata in its single pass.
+    Per-stage timings go to trace_path (.json or .csv) if given.
+    """
     
     # Define paths
     source_images_folder = "./Final/Images"
     source_metadata_folder = "./Final/Metadata"
     output_images_folder = "./Shuffled/Images"
     output_metadata_folder = "./Shuffled/Metadata"
+    permutation_path = "./Shuffled/permutation.json"
+    
+    # One bundle file instead of a metadata folder, if batch_combine_images wrote one
+    source_bundle_path = find_bundle('./Final')
+    if source_bundle_path:
+        source_metadata_folder = source_bundle_path
+        output_metadata_folder = os.path.join('./Shuffled', os.path.basename(source_bundle_path))
     
     print('🔀 Starting file shuffling...')
     print(f'Source images: {source_images_folder}')
     print(f'Source metadata: {source_metadata_folder}')
     print(f'Output images: {output_images_folder}')
-    print(f'Output metadata: {output_metadata_folder}')
+    print(f'Output metadata: {output_metadata_folder}' if metadata else 'Output metadata: left to FinalizeMetadata.py')
+    print(f'Image placement: {link_mode}')
+    
+    # Renditions written by batch_combine_images --renditions
+    renditions = [name for name in RENDITIONS if os.path.isdir(rendition_folder(name, './Final'))]
+    if renditions:
+        print(f'Renditions: {", ".join(renditions)}')
     
     # Check if source folders exist
     if not os.path.exists(source_images_folder):
@@ -30,45 +164,42 @@ def shuffle_files():
     
     # Create output folders if they don't exist
     os.makedirs(output_images_folder, exist_ok=True)
-    os.makedirs(output_metadata_folder, exist_ok=True)
+    if metadata and not source_bundle_path:
+        os.makedirs(output_metadata_folder, exist_ok=True)
+    for name in renditions:
+        os.makedirs(rendition_folder(name, './Shuffled'), exist_ok=True)
     
-    # Get all PNG files from source images folder
-    image_files = glob.glob(os.path.join(source_images_folder, '*.png'))
+    # One directory scan per folder instead of a stat per image
+    images = index_folder(source_images_folder, '.png')
     
-    if not image_files:
+    if not images:
         print(f'⚠️ No PNG files found in {source_images_folder}')
         return
     
-    print(f'Found {len(image_files)} image files to shuffle')
-    
-    # Extract file numbers and create pairs
-    file_pairs = []
-    missing_metadata = []
-    
-    for image_path in image_files:
-        # Get filename without extension (e.g., "0" from "0.png")
-        image_filename = os.path.basename(image_path)
-        file_number = os.path.splitext(image_filename)[0]
-        
-        # Check if corresponding metadata file exists
-        metadata_filename = f'{file_number}.json'
-        metadata_path = os.path.join(source_metadata_folder, metadata_filename)
-        
-        if os.path.exists(metadata_path):
-            file_pairs.append({
-                'number': file_number,
-                'image_path': image_path,
-                'metadata_path': metadata_path
-            })
-        else:
-            missing_metadata.append(file_number)
-    
-    if missing_metadata:
-        print(f'⚠️ Warning: {len(missing_metadata)} image files have no corresponding metadata:')
-        for num in missing_metadata[:10]:  # Show first 10
-            print(f'   - {num}.png (missing {num}.json)')
-        if len(missing_metadata) > 10:
-            print(f'   ... and {len(missing_metadata) - 10} more')
+    print(f'Found {len(images)} image files to shuffle')
+    source_metadata = None
+    if source_bundle_path:
+        # Read the whole bundle once, the loop takes every token from memory
+        with open_bundle(source_bundle_path) as bundle:
+            report_unpaired(images, bundle, 'images', 'metadata')
+            source_metadata = dict(bundle.texts())
+        metadata_index = source_metadata
+    else:
+        metadata_index = index_folder(source_metadata_folder, '.json')
+        report_unpaired(images, metadata_index, 'images', 'metadata')
+    gaps = images.gaps()
+    if gaps:
+        print(f'⚠️ {len(gaps)} token numbers have no image: {format_ranges(gaps)}')
+    
+    # Numeric order, so the same seed always gives the same result
+    file_pairs = [
+        {
+            'number': number,
+            'image_path': images.path(number),
+            'metadata_path': metadata_index.path(number) if source_metadata is None else None
+        }
+        for number in images.tokens if number in metadata_index
+    ]
     
     print(f'Found {len(file_pairs)} complete image-metadata pairs')
     
@@ -76,15 +207,36 @@ def shuffle_files():
         print('❌ No complete pairs found. Cannot proceed.')
         return
     
+    rendition_indexes = {name: index_folder(rendition_folder(name, './Final'), RENDITIONS[name]['extension'])
+                         for name in renditions}
+    for name, rendition_index in rendition_indexes.items():
+        missing = images.missing_from(rendition_index)
+        if missing:
+            print(f'⚠️ {len(missing)} images have no {name}: {format_ranges(missing)}')
+    
     # Create shuffled order (0 to n-1)
-    new_order = list(range(len(file_pairs)))
-    random.shuffle(new_order)
+    new_order = shuffled_order(len(file_pairs), seed)
+    
+    # Save the permutation before touching any files
+    mapping = {pair['number']: new_order[index] for index, pair in enumerate(file_pairs)}
+    commitment = save_permutation(permutation_path, mapping, seed)
+    print(f'🔒 Permutation saved to {permutation_path} (sha256: {commitment})')
     
     print('🔀 Shuffling files...')
     
     success_count = 0
     error_count = 0
     
+    # Methods still worth trying, falling back to a plain copy
+    if link_mode == 'auto':
+        link_methods = list(LINK_METHODS)
+    else:
+        link_methods = [link_mode] if link_mode == 'copy' else [link_mode, 'copy']
+    methods_used = {}
+    shuffled_metadata = []
+    instrumentation = StageStats('shuffle_files')
+    progress = ProgressLine('Shuffling', len(file_pairs))
+    
     # Process each pair in the new shuffled order
     for new_index, old_pair in enumerate(file_pairs):
         try:
@@ -99,88 +251,225 @@ def shuffle_files():
             new_image_path = os.path.join(output_images_folder, new_image_filename)
             new_metadata_path = os.path.join(output_metadata_folder, new_metadata_filename)
             
-            # Copy image file
-            shutil.copy2(old_pair['image_path'], new_image_path)
-            
-            # Load, update, and save metadata file
-            with open(old_pair['metadata_path'], 'r') as f:
-                metadata = json.load(f)
+            # Copy (or link) image file
+            with instrumentation.stage('place_image'):
+                method = place_file(old_pair['image_path'], new_image_path, link_methods)
+            methods_used[method] = methods_used.get(method, 0) + 1
+            if method == 'copy':
+                image_size = os.path.getsize(new_image_path)
+                instrumentation.bytes_read += image_size
+                instrumentation.bytes_written += image_size
             
-            # Update metadata to reflect new number
-            old_number = old_pair['number']
-            metadata['name'] = f"HERO OF AFRICA #{shuffled_position}"
+            # Same placement for every rendition of the image
+            for name, rendition_index in rendition_indexes.items():
+                if old_pair['number'] not in rendition_index:
+                    continue
+                with instrumentation.stage(f'place_{name}'):
+                    place_file(rendition_index.path(old_pair['number']),
+                               rendition_path(name, './Shuffled', shuffled_position), link_methods)
             
-            # Update image URL if it exists and contains a number
-            if 'image' in metadata:
-                old_image_url = metadata['image']
-                # Replace the old number with new number in the URL
-                # Find the last occurrence of the old number followed by .png
-                if f'/{old_number}.png' in old_image_url:
-                    metadata['image'] = old_image_url.replace(f'/{old_number}.png', f'/{shuffled_position}.png')
+            if not metadata:
+                success_count += 1
+                progress.advance()
+                continue
             
-            # Save updated metadata
-            with open(new_metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=4)
+            # Load, update, and save metadata file
+            with instrumentation.stage('metadata'):
+                old_number = old_pair['number']
+                if source_metadata is not None:
+                    raw_metadata = source_metadata[old_number]
+                else:
+                    with open(old_pair['metadata_path'], 'r') as f:
+                        raw_metadata = f.read()
+                metadata = json.loads(raw_metadata)
+                
+                # Update metadata to reflect new number
+                shuffle_metadata(metadata, old_number, shuffled_position)
+                
+                # Save updated metadata, bundles are written once after the loop
+                if source_metadata is not None:
+                    shuffled_metadata.append((shuffled_position, metadata))
+                    new_metadata = ''
+                else:
+                    new_metadata = json.dumps(metadata, indent=4)
+                    with open(new_metadata_path, 'w') as f:
+                        f.write(new_metadata)
+            instrumentation.bytes_read += len(raw_metadata)
+            instrumentation.bytes_written += len(new_metadata)
             
-            print(f'✅ {old_number} → {shuffled_position}')
             success_count += 1
             
         except Exception as e:
-            print(f'❌ Error processing pair {old_pair["number"]}: {e}')
+            print(f'\n❌ Error processing pair {old_pair["number"]}: {e}')
             error_count += 1
+        
+        progress.advance()
+    
+    progress.close()
+    
+    if metadata and source_bundle_path:
+        with instrumentation.stage('write_bundle'):
+            shuffled_metadata.sort(key=lambda item: item[0])
+            with open_bundle(output_metadata_folder) as bundle:
+                bundle.replace_all(shuffled_metadata)
+        instrumentation.bytes_written += os.path.getsize(output_metadata_folder)
+    # Only one place may hold the shuffled metadata
+    if metadata:
+        for stale_bundle in remove_other_bundles('./Shuffled', keep=output_metadata_folder if source_bundle_path else None):
+            print(f'🗑️ Removed {stale_bundle}, metadata now goes to {output_metadata_folder}')
+    for folder in [output_images_folder, output_metadata_folder] + [rendition_folder(name, './Shuffled') for name in renditions]:
+        forget(folder)
     
     print(f'\n🎉 Shuffling complete!')
     print(f'Successfully shuffled: {success_count} pairs')
     print(f'Errors: {error_count} pairs')
-    print(f'Total files processed: {success_count * 2} files')  # images + metadata
+    print(f'Total files processed: {success_count * (2 if metadata else 1)} files')  # images + metadata
+    
+    if methods_used:
+        print('Images placed by: ' + ', '.join(f'{method} ({count})' for method, count in methods_used.items()))
+        if link_mode != 'copy' and 'copy' in methods_used:
+            print(f'⚠️ {link_mode} was not available for every file, fell back to copying')
+    
+    instrumentation.print_summary()
+    if trace_path:
+        instrumentation.write_trace(trace_path)
     
     if success_count > 0:
         print(f'\n✅ Shuffled files saved to:')
         print(f'   Images: {output_images_folder}')
-        print(f'   Metadata: {output_metadata_folder}')
+        if metadata:
+            print(f'   Metadata: {output_metadata_folder}')
+        else:
+            print('   Metadata: not written, run FinalizeMetadata.py next')
+        for name in renditions:
+            print(f'   {name.capitalize()}: {rendition_folder(name, "./Shuffled")}')
 
-def preview_shuffle():
-    """Preview what the shuffle will look like without actually moving files"""
+def reapply_permutation():
+    """Rebuild Shuffled/Metadata from Final/Metadata using the saved permutation (images are not touched)"""
+    
+    source_metadata_folder = "./Final/Metadata"
+    output_metadata_folder = "./Shuffled/Metadata"
+    permutation_path = "./Shuffled/permutation.json"
+    
+    # Bundle in, bundle of the same format out
+    source_bundle_path = find_bundle('./Final')
+    if source_bundle_path:
+        source_metadata_folder = source_bundle_path
+        output_metadata_folder = os.path.join('./Shuffled', os.path.basename(source_bundle_path))
+    
+    print('🔁 Re-applying saved permutation...')
+    print(f'Permutation: {permutation_path}')
+    print(f'Source metadata: {source_metadata_folder}')
+    print(f'Output metadata: {output_metadata_folder}')
+    
+    if not os.path.exists(permutation_path):
+        print(f'❌ Permutation file not found: {permutation_path}')
+        return
+    
+    try:
+        mapping = load_permutation(permutation_path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f'❌ Could not load permutation: {e}')
+        return
+    
+    source_metadata = None
+    if source_bundle_path:
+        with open_bundle(source_bundle_path) as bundle:
+            source_metadata = dict(bundle.texts())
+    else:
+        os.makedirs(output_metadata_folder, exist_ok=True)
+    
+    success_count = 0
+    error_count = 0
+    shuffled_metadata = []
+    
+    for old_number, new_number in mapping.items():
+        try:
+            if source_metadata is not None:
+                metadata = json.loads(source_metadata[old_number])
+            else:
+                with open(os.path.join(source_metadata_folder, f'{old_number}.json'), 'r') as f:
+                    metadata = json.load(f)
+            
+            shuffle_metadata(metadata, old_number, new_number)
+            
+            if source_metadata is not None:
+                shuffled_metadata.append((new_number, metadata))
+            else:
+                with open(os.path.join(output_metadata_folder, f'{new_number}.json'), 'w') as f:
+                    json.dump(metadata, f, indent=4)
+            
+            success_count += 1
+            
+        except Exception as e:
+            print(f'❌ Error re-applying {old_number} → {new_number}: {e}')
+            error_count += 1
+    
+    if source_bundle_path:
+        shuffled_metadata.sort(key=lambda item: item[0])
+        with open_bundle(output_metadata_folder) as bundle:
+            bundle.replace_all(shuffled_metadata)
+    for stale_bundle in remove_other_bundles('./Shuffled', keep=output_metadata_folder if source_bundle_path else None):
+        print(f'🗑️ Removed {stale_bundle}, metadata now goes to {output_metadata_folder}')
+    forget(output_metadata_folder)
+    
+    print(f'\n🎉 Permutation re-applied!')
+    print(f'Metadata files rewritten: {success_count}')
+    print(f'Errors: {error_count}')
+
+def preview_shuffle(seed=None):
+    """Preview what the shuffle will look like without actually moving files
+
+    With the seed that shuffle_files will get, this is the order it applies.
+    """
     
     source_images_folder = "./Final/Images"
     source_metadata_folder = "./Final/Metadata"
     
     print('👀 PREVIEW MODE - No files will be moved')
     
-    # Get sample of files
-    image_files = glob.glob(os.path.join(source_images_folder, '*.png'))
+    images = index_folder(source_images_folder, '.png')
     
-    if not image_files:
+    if not images:
         print(f'⚠️ No PNG files found in {source_images_folder}')
         return
     
-    # Take first 10 files for preview
-    sample_files = image_files[:10]
-    file_numbers = [os.path.splitext(os.path.basename(f))[0] for f in sample_files]
+    source_bundle_path = find_bundle('./Final')
+    if source_bundle_path:
+        with open_bundle(source_bundle_path) as bundle:
+            report_unpaired(images, bundle, 'images', 'metadata')
+            metadata_tokens = set(bundle.tokens)
+    else:
+        metadata_index = index_folder(source_metadata_folder, '.json')
+        report_unpaired(images, metadata_index, 'images', 'metadata')
+        metadata_tokens = set(metadata_index.tokens)
     
-    # Create a sample shuffle
-    shuffled_numbers = file_numbers.copy()
-    random.shuffle(shuffled_numbers)
+    # Only complete pairs are shuffled, numbered and ordered the way shuffle_files does it
+    paired = [number for number in images.tokens if number in metadata_tokens]
+    file_numbers = paired[:10]
+    new_order = shuffled_order(len(paired), seed)
     
     print(f'\nSample shuffle (first 10 files):')
     print('Original → Shuffled')
     print('==================')
     
-    for i, (original, shuffled) in enumerate(zip(file_numbers, shuffled_numbers)):
-        print(f'{original}.png → {i}.png')
-        print(f'{original}.json → {i}.json')
+    for original, shuffled in zip(file_numbers, new_order):
+        print(f'{original}.png → {shuffled}.png')
+        print(f'{original}.json → {shuffled}.json')
         print()
     
-    print(f'Total files to shuffle: {len(image_files)}')
+    print(f'Total pairs to shuffle: {len(paired)}')
 
 def clear_shuffled_folders():
     """Clear the shuffled folders before running"""
     
     folders_to_clear = ["./Shuffled/Images", "./Shuffled/Metadata"]
+    folders_to_clear += [rendition_folder(name, "./Shuffled") for name in RENDITIONS
+                         if os.path.isdir(rendition_folder(name, "./Shuffled"))]
     
     for folder in folders_to_clear:
         if os.path.exists(folder):
-            files = glob.glob(os.path.join(folder, '*'))
+            files = index_folder(folder, '').all_paths()
             if files:
                 print(f'🧹 Clearing {len(files)} files from {folder}')
                 for file in files:
@@ -188,27 +477,41 @@ def clear_shuffled_folders():
                         os.remove(file)
                     except Exception as e:
                         print(f'⚠️ Could not remove {file}: {e}')
+                forget(folder)
             else:
                 print(f'📁 {folder} is already empty')
         else:
             print(f'📁 {folder} does not exist (will be created)')
+    
+    for bundle_path in remove_other_bundles("./Shuffled"):
+        print(f'🧹 Removed {bundle_path}')
 
 if __name__ == '__main__':
     print('File Order Shuffler')
     print('===================')
     print()
     
-    choice = input('Choose option:\n1. Preview shuffle (recommended first)\n2. Clear shuffled folders\n3. Shuffle files\n\nEnter choice (1, 2, or 3): ')
+    choice = input('Choose option:\n1. Preview shuffle (recommended first)\n2. Clear shuffled folders\n3. Shuffle files\n4. Re-apply saved permutation to metadata\n\nEnter choice (1, 2, 3, or 4): ')
     
     if choice == '1':
-        preview_shuffle()
+        seed = input('Shuffle seed (leave empty for a random order): ').strip() or None
+        preview_shuffle(seed)
     elif choice == '2':
         clear_shuffled_folders()
     elif choice == '3':
         confirm = input('\n⚠️ This will copy and rename all files to Shuffled folders. Continue? (yes/no): ')
         if confirm.lower() == 'yes':
-            shuffle_files()
+            link_mode = input('Image placement - copy, hardlink, reflink or auto (saves disk space) [copy]: ').strip().lower() or 'copy'
+            seed = input('Shuffle seed (leave empty for a random order): ').strip() or None
+            # FinalizeMetadata.py reads Final/Metadata itself, shuffling it here too would be a wasted pass
+            metadata = input('Shuffle the metadata too? Answer no if you run FinalizeMetadata.py next (yes/no) [yes]: ').strip().lower() != 'no'
+            if link_mode not in LINK_METHODS + ('auto',):
+                print('Invalid placement. Exiting.')
+            else:
+                shuffle_files(link_mode, seed, trace_path_from_argv(), metadata)
         else:
             print('Operation cancelled.')
+    elif choice == '4':
+        reapply_permutation()
     else:
         print('Invalid choice. Exiting.')
@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from file_io import write_file_atomic
+from instrumentation import StageStats, ProgressLine
+from OrderShuffle import load_permutation, shuffle_metadata
+from IPFS_CID import compute_folder_cid, is_cid
+from IPFS_FIX import parse_ipfs_url
+from renditions import RENDITIONS, PENDING_CID, rendition_fields
+from directory_index import index_folder, format_ranges
+from metadata_bundle import open_bundle, find_bundle
+
+MANIFEST_PATH = './Shuffled/integrity-manifest.json'
+# How many mismatches to print, the manifest has all of them
+MAX_PRINTED = 20
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """(size, SHA-256) of a file, read in chunks so big files don't sit in memory"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+def url_parts(url):
+    """(CID, filename) of an IPFS URL on any gateway, (None, filename) for anything else"""
+    return parse_ipfs_url(url) or (None, url.split('/')[-1])
+
+def verify_chunk(pairs, root, check_nojson, sources=None, shuffled=None):
+    """Check a chunk of (old number, new number) pairs, returns (manifest entries, mismatches, CIDs seen, stage seconds)
+
+    For every token: the shuffled image and renditions have the bytes of the
+    Final ones, the shuffled metadata is the Final metadata renumbered (URLs
+    compared by filename, their CIDs are collected instead), and the NoJson
+    copy has the bytes of the .json file (if check_nojson).
+    Metadata kept in bundles comes in as JSON text instead of files:
+    sources by old number for Final, shuffled by new number for Shuffled.
+    """
+    entries = {}
+    mismatches = []
+    cids = {}
+    stages = {'hash': 0.0, 'metadata': 0.0}
+
+    def record(relative_path):
+        """Hash a file into the manifest, returns its digest or None if missing"""
+        path = os.path.join(root, relative_path)
+        start = time.perf_counter()
+        try:
+            size, digest = hash_file(path)
+        except FileNotFoundError:
+            mismatches.append(f'Missing {relative_path}')
+            return None
+        finally:
+            stages['hash'] += time.perf_counter() - start
+        entries[relative_path] = {'size': size, 'sha256': digest}
+        return digest
+
+    def same_bytes(source, destination):
+        # Hardlinked copies are the same file, no need to read them twice
+        try:
+            if os.path.samefile(os.path.join(root, source), os.path.join(root, destination)):
+                if record(source):
+                    entries[destination] = entries[source]
+                return
+        except OSError:
+            pass
+        source_digest, destination_digest = record(source), record(destination)
+        if source_digest and destination_digest and source_digest != destination_digest:
+            mismatches.append(f'{destination} is not a copy of {source}')
+
+    for old_number, new_number in pairs:
+        same_bytes(f'Final/Images/{old_number}.png', f'Shuffled/Images/{new_number}.png')
+
+        for name, spec in RENDITIONS.items():
+            if os.path.isdir(os.path.join(root, 'Final', spec['folder'])):
+                same_bytes(f'Final/{spec["folder"]}/{old_number}{spec["extension"]}',
+                           f'Shuffled/{spec["folder"]}/{new_number}{spec["extension"]}')
+
+        if shuffled is not None:
+            metadata_path = f'Shuffled bundle token {new_number}'
+            metadata_digest = metadata_path if new_number in shuffled else None
+            if metadata_digest is None:
+                mismatches.append(f'Missing {metadata_path}')
+        else:
+            metadata_path = f'Shuffled/Metadata/{new_number}.json'
+            metadata_digest = record(metadata_path)
+        if sources is None:
+            record(f'Final/Metadata/{old_number}.json')
+        if check_nojson and shuffled is None:
+            nojson_digest = record(f'Shuffled/NoJson/{new_number}')
+            if metadata_digest and nojson_digest and metadata_digest != nojson_digest:
+                mismatches.append(f'Shuffled/NoJson/{new_number} differs from {metadata_path}')
+
+        if metadata_digest is None:
+            continue
+        start = time.perf_counter()
+        try:
+            if sources is not None:
+                expected = shuffle_metadata(json.loads(sources[old_number]), old_number, new_number)
+            else:
+                with open(os.path.join(root, 'Final', 'Metadata', f'{old_number}.json'), 'r') as f:
+                    expected = shuffle_metadata(json.load(f), old_number, new_number)
+            if shuffled is not None:
+                metadata = json.loads(shuffled[new_number])
+            else:
+                with open(os.path.join(root, metadata_path), 'r') as f:
+                    metadata = json.load(f)
+        except (OSError, ValueError, KeyError) as e:
+            mismatches.append(f'Unreadable metadata for {old_number} → {new_number}: {e}')
+            stages['metadata'] += time.perf_counter() - start
+            continue
+
+        # URLs may have been re-pointed at the uploaded CIDs, they must still name this token's files
+        url_fields = ['image'] + [field for _, field in rendition_fields(expected)]
+        for field in url_fields:
+            if field not in expected:
+                continue
+            if field not in metadata:
+                mismatches.append(f'{metadata_path}: "{field}" is missing')
+                continue
+            cid, filename = url_parts(metadata[field])
+            if filename != url_parts(expected[field])[1]:
+                mismatches.append(f'{metadata_path}: "{field}" points at {filename}, expected {url_parts(expected[field])[1]}')
+            cids.setdefault(field, Counter())[cid] += 1
+
+        for key in sorted(set(expected) | set(metadata)):
+            if key not in url_fields and expected.get(key) != metadata.get(key):
+                mismatches.append(f'{metadata_path}: "{key}" differs from Final/Metadata/{old_number}.json')
+        stages['metadata'] += time.perf_counter() - start
+
+    return entries, mismatches, cids, stages
+
+def verify_collection(workers=None, manifest_path=MANIFEST_PATH, cid=None, check_cid=False, trace_path=None):
+    """Hash every artifact in Final and Shuffled, cross-check them and write a manifest, returns the mismatches
+
+    Besides the per-token checks in verify_chunk, the permutation has to
+    be a one-to-one map from Final/Images onto Shuffled/Images, and every
+    shuffled metadata file has to point at one and the same CID (cid if
+    given, or the CID of Shuffled/Images computed offline with check_cid).
+    Metadata bundles are read once and hashed as a whole, a Shuffled bundle
+    only stands in for Shuffled/Metadata until it has been exported.
+    """
+    root = '.'
+    permutation_path = './Shuffled/permutation.json'
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    stats = StageStats('VerifyCollection')
+    print('🔍 Verifying Final and Shuffled...')
+
+    try:
+        mapping = load_permutation(permutation_path)
+    except FileNotFoundError:
+        print(f'❌ Permutation file not found: {permutation_path} (run OrderShuffle.py first)')
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        print(f'❌ Could not load permutation: {e}')
+        return None
+
+    if not os.path.isdir('./Final/Images'):
+        print('❌ Final/Images not found, there is nothing to check Shuffled against '
+              '(after batch_combine_images.py --shuffle, run GatewayCheck.py instead)')
+        return None
+
+    # New numbers are ints in the JSON, file names are strings
+    mapping = {str(old_number): str(new_number) for old_number, new_number in mapping.items()}
+    mismatches = []
+
+    # The permutation against the folders it shuffled
+    with stats.stage('permutation'):
+        new_numbers = Counter(mapping.values())
+        for number, count in new_numbers.items():
+            if count > 1:
+                mismatches.append(f'Permutation maps {count} tokens onto {number}')
+        # One scan per folder, tokens outside the permutation reported in bulk
+        nojson = index_folder('./Shuffled/NoJson', '')
+        for index, numbers in ((index_folder('./Final/Images', '.png'), mapping),
+                               (index_folder('./Shuffled/Images', '.png'), new_numbers),
+                               (index_folder('./Shuffled/Metadata', '.json'), new_numbers),
+                               (nojson, new_numbers)):
+            extra = [token for token in index.tokens if token not in numbers]
+            if extra:
+                mismatches.append(f'{len(extra)} files in {index.folder} are not in the permutation: '
+                                  f'{format_ranges(extra)}')
+
+    # Bundles instead of metadata folders (batch_combine_images --metadata-bundle)
+    bundle_texts = {}
+    bundle_entries = {}
+    with stats.stage('bundles'):
+        for folder in ('Final', 'Shuffled'):
+            bundle_path = find_bundle(os.path.join(root, folder))
+            if bundle_path is None or (folder == 'Shuffled' and index_folder('./Shuffled/Metadata', '.json')):
+                continue
+            size, digest = hash_file(bundle_path)
+            bundle_entries[os.path.relpath(bundle_path, root)] = {'size': size, 'sha256': digest}
+            stats.bytes_read += size
+            with open_bundle(bundle_path) as bundle:
+                bundle_texts[folder] = dict(bundle.texts())
+            print(f'📦 {folder} metadata from {bundle_path}')
+
+    def chunk_texts(folder, numbers):
+        if folder not in bundle_texts:
+            return None
+        return {number: bundle_texts[folder][number] for number in numbers if number in bundle_texts[folder]}
+
+    pairs = list(mapping.items())
+    print(f'Checking {len(pairs)} tokens with {workers} workers')
+
+    # Big chunks keep the per-task overhead low, several per worker keep them all busy
+    chunk_size = max(1, len(pairs) // (workers * 4))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    entries = dict(bundle_entries)
+    cids = {}
+    progress = ProgressLine('Verifying', len(pairs))
+
+    def collect(chunk, result):
+        chunk_entries, chunk_mismatches, chunk_cids, stages = result
+        entries.update(chunk_entries)
+        mismatches.extend(chunk_mismatches)
+        for field, counter in chunk_cids.items():
+            cids.setdefault(field, Counter()).update(counter)
+        stats.record('hash', stages['hash'], len(chunk_entries))
+        stats.record('metadata', stages['metadata'], len(chunk))
+        stats.bytes_read += sum(entry['size'] for entry in chunk_entries.values())
+        progress.advance(len(chunk))
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(verify_chunk, chunk, root, len(nojson) > 0,
+                                       chunk_texts('Final', [old for old, _ in chunk]),
+                                       chunk_texts('Shuffled', [new for _, new in chunk])): chunk
+                       for chunk in chunks}
+            for future in as_completed(futures):
+                collect(futures[future], future.result())
+    else:
+        for chunk in chunks:
+            collect(chunk, verify_chunk(chunk, root, len(nojson) > 0,
+                                        chunk_texts('Final', [old for old, _ in chunk]),
+                                        chunk_texts('Shuffled', [new for _, new in chunk])))
+    progress.close()
+
+    # Every token must point at the same uploaded folder
+    with stats.stage('cid'):
+        expected_cids = {'image': cid} if cid else {}
+        if check_cid and os.path.isdir('./Shuffled/Images'):
+            expected_cids['image'] = compute_folder_cid('./Shuffled/Images')
+        for field, counter in sorted(cids.items()):
+            # A placeholder or a mangled CID resolves nowhere, even if every token agrees on it
+            for value, count in sorted(counter.items(), key=lambda item: str(item[0])):
+                if value is None:
+                    mismatches.append(f'"{field}" URLs of {count} tokens are not IPFS URLs')
+                elif value == PENDING_CID:
+                    mismatches.append(f'"{field}" URLs of {count} tokens still point at the {PENDING_CID} placeholder')
+                elif not is_cid(value):
+                    mismatches.append(f'"{field}" URLs of {count} tokens point at {value}, which is not a CID')
+            if len(counter) > 1:
+                listed = ', '.join(f'{value} ({count})' for value, count in counter.most_common(5))
+                mismatches.append(f'"{field}" URLs point at {len(counter)} different CIDs: {listed}')
+            elif field in expected_cids and expected_cids[field] not in counter:
+                mismatches.append(f'"{field}" URLs point at {next(iter(counter))}, expected {expected_cids[field]}')
+
+    manifest = {
+        'permutation_sha256': hash_file(permutation_path)[1],
+        'tokens': len(pairs),
+        'cids': {field: sorted(value for value in counter if value) for field, counter in sorted(cids.items())},
+        'mismatches': mismatches,
+        'files': {path: entries[path] for path in sorted(entries)}
+    }
+    write_file_atomic(manifest_path, json.dumps(manifest, indent=4))
+    stats.bytes_written += os.path.getsize(manifest_path)
+
+    if mismatches:
+        print(f'\n❌ {len(mismatches)} mismatch(es):')
+        for mismatch in mismatches[:MAX_PRINTED]:
+            print(f'   {mismatch}')
+        if len(mismatches) > MAX_PRINTED:
+            print(f'   ... and {len(mismatches) - MAX_PRINTED} more in {manifest_path}')
+    else:
+        print(f'\n✅ All {len(pairs)} tokens verified, {len(entries)} files hashed')
+    print(f'📝 Manifest written to {manifest_path}')
+
+    stats.print_summary()
+    if trace_path:
+        stats.write_trace(trace_path)
+    return mismatches
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Hash and cross-check Final, Shuffled and NoJson after shuffling')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes (default: CPU count)')
+    parser.add_argument('--cid', help='CID every image URL should point at')
+    parser.add_argument('--check-cid', action='store_true',
+                        help='compute the CID of Shuffled/Images offline and check the image URLs against it')
+    parser.add_argument('--manifest', default=MANIFEST_PATH, help=f'where to write the manifest (default: {MANIFEST_PATH})')
+    parser.add_argument('--trace', help='save per-stage timings to this file (.json or .csv)')
+    args = parser.parse_args()
+
+    verify_collection(workers=max(1, args.workers), manifest_path=args.manifest, cid=args.cid,
+                      check_cid=args.check_cid, trace_path=args.trace)
@@ -2,6 +2,23 @@ from PIL import Image, ImageDraw, ImageFont
 import os
 import glob
 import json
+import csv
+import argparse
+import hashlib
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from file_io import write_file_atomic
+from png_encoding import PNG_PROFILES, DEFAULT_PNG_PROFILE, save_png, optimize_images
+from instrumentation import StageStats, ProgressLine
+from stream_pipeline import run_stages
+from glyph_atlas import GlyphAtlas
+from tile_composite import OverlayPlan
+from renditions import RENDITIONS, RENDITION_URL, parse_renditions, rendition_folder, rendition_path, rendition_url, save_renditions
+from metadata_bundle import open_bundle, remove_other_bundles
+from OrderShuffle import shuffled_order, save_permutation, load_permutation
 
 def get_rarity_text(rarity_level):
     """Get the appropriate text for each rarity level"""
@@ -39,89 +56,308 @@ def get_folder_mapping():
         }
     }
 
-def combine_single_image(character_path, border_path, output_path, font_path, texts):
-    """Combine a single character image with border and text"""
+# Card geometry
+CANVAS_SIZE = 1024
+CHARACTER_SIZE = 850
+
+# Character art picked up from the rarity folders. By default only .png files are
+# used, since adding formats would renumber the tokens of an existing collection.
+# --all-formats also picks up .jpg/.jpeg/.webp, in upper or lower case.
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# Fast resize: JPEGs are decoded at no less than DRAFT_MARGIN x the target
+# size, then reduce() shrinks by whole factors until the last LANCZOS pass
+# is at most REDUCING_GAP x the target
+DRAFT_MARGIN = 2
+REDUCING_GAP = 2.0
+
+# (font size, vertical center) for each of the three texts from get_rarity_text()
+TEXT_LAYOUT = ((34, 97), (17, 857), (25, 915))
+
+# Per-token line at the bottom of every card, set TOKEN_TEXT to None for cards without it
+# Names listed in TOKEN_NAMES_CSV (token_id,name rows) use TOKEN_TEXT_WITH_NAME instead
+# Only drawn with --token-text: cards rendered to Final/ get their published number from
+# OrderShuffle.py later, so a number stamped here would be the wrong one after shuffling
+TOKEN_TEXT = "#{token_id}"
+TOKEN_TEXT_WITH_NAME = "{name} #{token_id}"
+TOKEN_TEXT_LAYOUT = (22, 967)
+TOKEN_NAMES_CSV = './TokenNames.csv'
+
+# Metadata values filled into Template.json for every token
+METADATA_NAME = "HERO OF AFRICA #{token_id}"
+METADATA_IMAGE_URL = "https://ipfs.io/ipfs/bafybeiehwh5dv3wnrn3te7h4sx7gmuzymsi5pzhmfapovyxb2laj2qxche/{token_id}.png"
+
+# Last 12 bytes of every complete PNG (empty IEND chunk)
+PNG_IEND_CHUNK = b'\x00\x00\x00\x00IEND\xaeB`\x82'
+
+# Pre-rendered border + text layers, one per rarity (see get_rarity_overlay)
+_overlay_cache = {}
+_overlay_lock = threading.Lock()  # the streaming mode composites on several threads
+
+# What every card of a rarity shares once its overlay is laid on (see get_overlay_plan)
+_overlay_plan_cache = {}
+
+# Compiled Template.json (see get_metadata_template)
+_metadata_template_cache = {}
+
+# Rasterized glyphs for the per-token text (see get_glyph_atlas)
+_glyph_atlas_cache = {}
+
+def _file_signature(path):
+    """Cheap change detector for a file: (mtime, size)"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def render_overlay(border_path, font_path, texts):
+    """Render the border with all card texts already drawn on it"""
+    border_img = Image.open(border_path)
+    
+    # RGBA borders are pasted through their own alpha, anything else is pasted as-is
+    use_mask = border_img.mode == 'RGBA'
+    overlay = border_img.convert('RGBA')
+    
+    draw = ImageDraw.Draw(overlay)
+    text_color = 'white'
+    
+    for text, (font_size, center_y) in zip(texts, TEXT_LAYOUT):
+        font = ImageFont.truetype(font_path, font_size)
+        text_bbox = draw.textbbox((0, 0), text, font=font)
+        text_width = text_bbox[2] - text_bbox[0]
+        text_height = text_bbox[3] - text_bbox[1]
+        text_x = (CANVAS_SIZE - text_width) // 2
+        text_y = center_y - text_height // 2
+        draw.text((text_x, text_y), text, font=font, fill=text_color)
+    
+    return overlay, use_mask
+
+def get_rarity_overlay(border_path, font_path, texts):
+    """Return the cached overlay for a rarity, rebuilding it when any input changed"""
+    key = (border_path, _file_signature(border_path), font_path, _file_signature(font_path),
+           TEXT_LAYOUT, tuple(texts))
+    
+    with _overlay_lock:
+        overlay = _overlay_cache.get(key)
+        if overlay is None:
+            # Drop stale layers for this border so edited inputs don't pile up
+            for stale_key in [k for k in _overlay_cache if k[0] == border_path]:
+                del _overlay_cache[stale_key]
+            overlay = _overlay_cache[key] = render_overlay(border_path, font_path, texts)
+    
+    return overlay
+
+def fast_downscale(img, size):
+    """LANCZOS resize preceded by a cheap integer reduce() when the image is much larger than size"""
+    # Palette and bilevel images are resized with NEAREST anyway
+    if img.mode in ('1', 'P'):
+        return img.resize(size, Image.Resampling.LANCZOS)
+    
+    # Work on premultiplied alpha like resize() does, so transparent pixels don't bleed into the edges
+    # (resize() itself drops reducing_gap for RGBA, hence the explicit reduce())
+    premultiplied = {'RGBA': 'RGBa', 'LA': 'La'}.get(img.mode)
+    if premultiplied:
+        img = img.convert(premultiplied)
+    
+    factor = int(min(img.width / size[0], img.height / size[1]) / REDUCING_GAP)
+    if factor > 1:
+        img = img.reduce(factor)
+    img = img.resize(size, Image.Resampling.LANCZOS)
+    
+    return img.convert({'RGBa': 'RGBA', 'La': 'LA'}[premultiplied]) if premultiplied else img
+
+def get_glyph_atlas(font_path, font_size):
+    """Return the cached glyph atlas for a font size, rebuilding it when the font changed"""
+    key = (font_path, _file_signature(font_path), font_size)
+    
+    atlas = _glyph_atlas_cache.get(key)
+    if atlas is None:
+        for stale_key in [k for k in _glyph_atlas_cache if k[0] == font_path and k[2] == font_size]:
+            del _glyph_atlas_cache[stale_key]
+        atlas = _glyph_atlas_cache[key] = GlyphAtlas(font_path, font_size)
+    
+    return atlas
+
+def draw_token_text(card, font_path, token_text):
+    """Stamp the per-token line onto a finished card, centered like the rarity texts"""
+    font_size, center_y = TOKEN_TEXT_LAYOUT
+    atlas = get_glyph_atlas(font_path, font_size)
+    _, (left, top, right, bottom) = atlas.layout(token_text)
+    text_x = (CANVAS_SIZE - (right - left)) // 2
+    text_y = center_y - (bottom - top) // 2
+    atlas.draw(card, (text_x, text_y), token_text)
+
+def load_token_names(csv_path):
+    """Read optional token_id,name rows, returns {token_id: name}"""
+    if not os.path.exists(csv_path):
+        return {}
+    
+    names = {}
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            # Skips a header row and blank lines
+            if len(row) >= 2 and row[0].strip().isdigit():
+                names[int(row[0])] = row[1].strip()
+    return names
+
+def get_token_text(token_id, token_names):
+    """The per-token line for a card, None if cards have no per-token text"""
+    if TOKEN_TEXT is None:
+        return None
+    name = token_names.get(token_id)
+    if name:
+        return TOKEN_TEXT_WITH_NAME.format(name=name, token_id=token_id)
+    return TOKEN_TEXT.format(token_id=token_id)
+
+def load_character(character_path, stages, fast_resize=False):
+    """Decode a character image and resize it to CHARACTER_SIZE, timing both into stages
+
+    With fast_resize, oversized art is shrunk while decoding (JPEG draft
+    mode) and by integer reduce() steps before the final LANCZOS pass.
+    The result is visually the same but not byte-identical.
+    """
+    start = time.perf_counter()
+    character_img = Image.open(character_path)
+    if fast_resize and character_img.format == 'JPEG':
+        character_img.draft('RGB', (CHARACTER_SIZE * DRAFT_MARGIN, CHARACTER_SIZE * DRAFT_MARGIN))
+    character_img.load()
+    stages['decode'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    if fast_resize:
+        character_resized = fast_downscale(character_img, (CHARACTER_SIZE, CHARACTER_SIZE))
+    else:
+        character_resized = character_img.resize((CHARACTER_SIZE, CHARACTER_SIZE), Image.Resampling.LANCZOS)
+    stages['resize'] = time.perf_counter() - start
+    
+    return character_resized
+
+def get_overlay_plan(overlay, use_mask):
+    """Return the cached OverlayPlan of a rarity overlay"""
+    with _overlay_lock:
+        entry = _overlay_plan_cache.get(id(overlay))
+        if entry is None:
+            # Keep the overlay alive with its plan so its id() can't be reused
+            if len(_overlay_plan_cache) >= 16:
+                _overlay_plan_cache.clear()
+            entry = _overlay_plan_cache[id(overlay)] = (overlay, OverlayPlan(overlay, use_mask, CANVAS_SIZE, CHARACTER_SIZE))
+    return entry[1]
+
+def compose_card(character_resized, overlay, use_mask):
+    """Layer the resized character and the rarity overlay on a transparent canvas
+
+    Same pixels as pasting both onto a new canvas, but only the parts of the
+    overlay over the character are pasted per card (see tile_composite.py).
+    """
+    return get_overlay_plan(overlay, use_mask).compose(character_resized)
+
+def combine_single_image(character_path, border_path, output_path, font_path, texts,
+                         png_profile=DEFAULT_PNG_PROFILE, quantize=False, stats=None, fast_resize=False,
+                         token_text=None, rendition_paths=None):
+    """Combine a single character image with border and text, plus the per-token line if given
+
+    rendition_paths ({name: output path}) writes extra downscaled versions
+    of the same in-memory card. If a stats dict is given, the bytes written,
+    encode time, source size and per-stage seconds ('stages') are stored in it.
+    """
     try:
+        stages = {}
+        
         # Step 1: Load and resize character image to 850x850
-        character_img = Image.open(character_path)
-        character_resized = character_img.resize((850, 850), Image.Resampling.LANCZOS)
+        character_resized = load_character(character_path, stages, fast_resize)
         
-        # Step 2: Load border image
-        border_img = Image.open(border_path)
+        # Step 2: Get the border with the texts already drawn (built once per rarity)
+        start = time.perf_counter()
+        overlay, use_mask = get_rarity_overlay(border_path, font_path, texts)
         
         # Step 3: Create final image with proper layering
-        canvas_size = 1024
-        character_size = 850
-        offset = (canvas_size - character_size) // 2  # 87px offset
-        
-        # Create transparent canvas
-        final_img = Image.new('RGBA', (canvas_size, canvas_size), (0, 0, 0, 0))
-        
-        # Paste character in center
-        final_img.paste(character_resized, (offset, offset), character_resized if character_resized.mode == 'RGBA' else None)
-        
-        # Paste border on top
-        final_img.paste(border_img, (0, 0), border_img if border_img.mode == 'RGBA' else None)
-        
-        # Step 4: Add text overlays
-        draw = ImageDraw.Draw(final_img)
-        text_color = 'white'
-        
-        # Text 1: "HERO OF AFRICA" - 34px, y=97
-        font1 = ImageFont.truetype(font_path, 34)
-        text1_bbox = draw.textbbox((0, 0), texts[0], font=font1)
-        text1_width = text1_bbox[2] - text1_bbox[0]
-        text1_height = text1_bbox[3] - text1_bbox[1]
-        text1_x = (canvas_size - text1_width) // 2
-        text1_y = 97 - text1_height // 2
-        draw.text((text1_x, text1_y), texts[0], font=font1, fill=text_color)
-        
-        # Text 2: "TURRET" - 17px, y=857
-        font2 = ImageFont.truetype(font_path, 17)
-        text2_bbox = draw.textbbox((0, 0), texts[1], font=font2)
-        text2_width = text2_bbox[2] - text2_bbox[0]
-        text2_height = text2_bbox[3] - text2_bbox[1]
-        text2_x = (canvas_size - text2_width) // 2
-        text2_y = 857 - text2_height // 2
-        draw.text((text2_x, text2_y), texts[1], font=font2, fill=text_color)
-        
-        # Text 3: "MACHINE-GUNNER" - 25px, y=915
-        font3 = ImageFont.truetype(font_path, 25)
-        text3_bbox = draw.textbbox((0, 0), texts[2], font=font3)
-        text3_width = text3_bbox[2] - text3_bbox[0]
-        text3_height = text3_bbox[3] - text3_bbox[1]
-        text3_x = (canvas_size - text3_width) // 2
-        text3_y = 915 - text3_height // 2
-        draw.text((text3_x, text3_y), texts[2], font=font3, fill=text_color)
+        final_img = compose_card(character_resized, overlay, use_mask)
+        stages['composite'] = time.perf_counter() - start
+        
+        # Step 4: Stamp the token's own text from the cached glyphs
+        if token_text:
+            start = time.perf_counter()
+            draw_token_text(final_img, font_path, token_text)
+            stages['token_text'] = time.perf_counter() - start
         
         # Step 5: Save the final image
-        final_img.save(output_path, 'PNG')
+        start = time.perf_counter()
+        bytes_written, encode_seconds = save_png(final_img, output_path, png_profile, quantize)
+        stages['encode'] = encode_seconds
+        stages['write'] = time.perf_counter() - start - encode_seconds
+        
+        # Step 6: Smaller versions from the card still in memory
+        if rendition_paths:
+            start = time.perf_counter()
+            bytes_written += save_renditions(final_img, rendition_paths)
+            stages['renditions'] = time.perf_counter() - start
+        
+        if stats is not None:
+            stats['bytes'] = bytes_written
+            stats['encode_seconds'] = encode_seconds
+            stats['bytes_read'] = os.path.getsize(character_path)
+            stats['stages'] = stages
         return True
         
     except Exception as e:
         print(f'❌ Error processing {os.path.basename(character_path)}: {e}')
         return False
 
+def compile_metadata_template(template_path, renditions=()):
+    """Serialize Template.json once, leaving format slots for the per-token values
+
+    Every rendition adds its URL field (e.g. "preview") at the end.
+    """
+    with open(template_path, 'r') as f:
+        template = json.load(f)
+    
+    # Put unique placeholders where the per-token values go
+    placeholders = {slot: f'\x00{slot}\x00' for slot in ('name', 'image', 'rarity') + tuple(renditions)}
+    template['name'] = placeholders['name']
+    template['image'] = placeholders['image']
+    template['properties']['RARITY'] = placeholders['rarity']
+    
+    for attr in template['attributes']:
+        if attr['trait_type'] == 'RARITY':
+            attr['value'] = placeholders['rarity']
+    
+    for name in renditions:
+        template[RENDITIONS[name]['field']] = placeholders[name]
+    
+    # Serialize exactly like json.dump(indent=4) does, then turn the
+    # (JSON encoded) placeholders into str.format fields
+    serialized = json.dumps(template, indent=4).replace('{', '{{').replace('}', '}}')
+    for slot, placeholder in placeholders.items():
+        serialized = serialized.replace(json.dumps(placeholder), '{' + slot + '}')
+    
+    return serialized
+
+def get_metadata_template(template_path, renditions=()):
+    """Return the compiled template, recompiling it when Template.json changed"""
+    key = (template_path, _file_signature(template_path), tuple(renditions))
+    
+    compiled = _metadata_template_cache.get(key)
+    if compiled is None:
+        for stale_key in [k for k in _metadata_template_cache if k[0] == template_path and k[1] != key[1]]:
+            del _metadata_template_cache[stale_key]
+        compiled = _metadata_template_cache[key] = compile_metadata_template(template_path, renditions)
+    
+    return compiled
+
+def render_metadata(compiled_template, token_id, rarity, renditions=()):
+    """Fill a compiled template in, returns the same text json.dump(indent=4) would write"""
+    return compiled_template.format(
+        name=json.dumps(METADATA_NAME.format(token_id=token_id)),
+        image=json.dumps(METADATA_IMAGE_URL.format(token_id=token_id)),
+        rarity=json.dumps(rarity),
+        **{name: json.dumps(rendition_url(name, token_id)) for name in renditions}
+    )
+
 def generate_metadata(template_path, token_id, rarity, metadata_output_path):
     """Generate metadata JSON file based on template"""
     try:
-        # Load template
-        with open(template_path, 'r') as f:
-            template = json.load(f)
-        
-        # Update template with specific values
-        template['name'] = f"HERO OF AFRICA #{token_id}"
-        template['image'] = f"https://ipfs.io/ipfs/bafybeiehwh5dv3wnrn3te7h4sx7gmuzymsi5pzhmfapovyxb2laj2qxche/{token_id}.png"
-        template['properties']['RARITY'] = rarity
-        
-        # Update attributes rarity
-        for attr in template['attributes']:
-            if attr['trait_type'] == 'RARITY':
-                attr['value'] = rarity
+        metadata = render_metadata(get_metadata_template(template_path), token_id, rarity)
         
         # Save metadata file
-        with open(metadata_output_path, 'w') as f:
-            json.dump(template, f, indent=4)
+        write_file_atomic(metadata_output_path, metadata)
         
         return True
         
@@ -129,110 +365,687 @@ def generate_metadata(template_path, token_id, rarity, metadata_output_path):
         print(f'❌ Error generating metadata: {e}')
         return False
 
-def batch_combine_images():
-    """Process all images in IMAGES folders with corresponding borders"""
+def generate_metadata_batch(template_path, tokens, stats=None, renditions=(), bundle=None):
+    """Generate metadata for many (token_id, rarity, output_path) at once, returns the IDs that succeeded
+
+    If a StageStats is given, the time and bytes written are added to it.
+    With a metadata bundle (see metadata_bundle.py) the output paths are
+    ignored and the bundle is replaced by these tokens in one bulk write.
+    """
+    try:
+        compiled_template = get_metadata_template(template_path, renditions)
+    except Exception as e:
+        print(f'❌ Error loading metadata template: {e}')
+        return set()
+    
+    written = set()
+    bytes_written = 0
+    start = time.perf_counter()
+    rows = []
+    for token_id, rarity, metadata_output_path in tokens:
+        try:
+            metadata = render_metadata(compiled_template, token_id, rarity, renditions)
+            if bundle is not None:
+                rows.append((token_id, metadata))
+            else:
+                write_file_atomic(metadata_output_path, metadata)
+            written.add(token_id)
+            bytes_written += len(metadata)
+        except Exception as e:
+            print(f'❌ Error generating metadata for {token_id}: {e}')
+    
+    if bundle is not None:
+        try:
+            bundle.replace_all(rows)
+        except Exception as e:
+            print(f'❌ Error writing metadata bundle {bundle.path}: {e}')
+            written = set()
+    
+    if stats is not None:
+        stats.record('metadata', time.perf_counter() - start, len(written))
+        stats.bytes_written += bytes_written
+    
+    return written
+
+def process_token(job):
+    """Render the image for one planned token (runs inside a worker process)"""
+    stats = {'bytes': 0, 'encode_seconds': 0.0, 'bytes_read': 0, 'stages': {}}
+    image_success = combine_single_image(job['character_path'], job['border_file'], job['image_output_path'],
+                                         job['font_path'], job['texts'], job['png_profile'], job['quantize'], stats,
+                                         job.get('fast_resize', False), job.get('token_text'), job.get('rendition_paths'))
+    return job['rarity_level'], job['token_id'], image_success, stats
+
+def _hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's bytes, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def compute_build_key(job, shared_hashes):
+    """Hash every input that affects a token's image and metadata"""
+    # Border, font and template are shared by many tokens, hash them once per run
+    for path in (job['border_file'], job['font_path'], job['template_path']):
+        if path not in shared_hashes:
+            shared_hashes[path] = _hash_file(path)
+    
+    inputs = [
+        _hash_file(job['character_path']),
+        shared_hashes[job['border_file']],
+        shared_hashes[job['font_path']],
+        shared_hashes[job['template_path']],
+        list(job['texts']),
+        [CANVAS_SIZE, CHARACTER_SIZE, TEXT_LAYOUT, TOKEN_TEXT_LAYOUT],
+        [METADATA_NAME, METADATA_IMAGE_URL],
+        [job['png_profile'], job['quantize']],
+        job['token_id'],
+        job['rarity_name']
+    ]
+    if job.get('token_text'):
+        inputs.append(job['token_text'])
+    # Rendered straight to a shuffled ID (--shuffle), a new permutation moves every file
+    if job.get('output_id', job['token_id']) != job['token_id']:
+        inputs.append(['output_id', job['output_id']])
+    # The whole spec, so a new preview size or quality re-renders the renditions
+    if job.get('rendition_paths'):
+        inputs.append([RENDITION_URL, {name: RENDITIONS[name] for name in sorted(job['rendition_paths'])}])
+    # Only added when on, so manifests from before the option still match
+    if job.get('fast_resize'):
+        inputs.append('fast_resize')
+    return hashlib.sha256(json.dumps(inputs).encode('utf-8')).hexdigest()
+
+def load_build_manifest(manifest_path):
+    """Load the token ID → input hash map written by the previous run"""
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'⚠️ Ignoring unreadable build manifest {manifest_path}: {e}')
+        return {}
+
+def save_build_manifest(manifest_path, manifest):
+    """Write the build manifest, replacing the old one in a single step"""
+    write_file_atomic(manifest_path, json.dumps(manifest, indent=4, sort_keys=True))
+
+def load_render_journal(journal_path):
+    """Load the token ID → input hash entries appended by an interrupted run"""
+    entries = {}
+    if not os.path.exists(journal_path):
+        return entries
+    
+    with open(journal_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            # The last line may be cut short if the run was killed mid-write
+            if len(parts) == 2 and line.endswith('\n'):
+                entries[parts[0]] = parts[1]
+    
+    return entries
+
+def outputs_intact(job):
+    """Check a token's files on disk: the PNG ends with its IEND chunk and the metadata parses"""
+    try:
+        with open(job['image_output_path'], 'rb') as f:
+            f.seek(-12, os.SEEK_END)
+            if f.read(12) != PNG_IEND_CHUNK:
+                return False
+        # Metadata written to a bundle is regenerated on every run
+        if job['metadata_output_path'] is not None:
+            with open(job['metadata_output_path'], 'r') as f:
+                json.load(f)
+        return True
+    except (OSError, ValueError):
+        return False
+
+def remove_temp_files(folder):
+    """Delete temp files left behind by writes that were interrupted"""
+    for temp_path in glob.glob(os.path.join(folder, '*.tmp')):
+        try:
+            os.remove(temp_path)
+        except OSError as e:
+            print(f'⚠️ Could not remove {temp_path}: {e}')
+
+def iter_source_files(folder, all_formats=False):
+    """Yield the character art paths in a folder one by one, in directory order (the order glob lists them)
+
+    Only names ending in .png, like glob('*.png'), unless all_formats.
+    """
+    with os.scandir(folder) as it:
+        for entry in it:
+            # glob skips hidden files
+            if entry.name.startswith('.'):
+                continue
+            if entry.name.endswith('.png') or (all_formats and
+                                               os.path.splitext(entry.name)[1].lower() in SOURCE_EXTENSIONS):
+                yield entry.path
+
+def iter_batch_jobs(images_folder, border_folder, output_images_folder, output_metadata_folder, font_path, template_path,
+                    token_names=None, output_ids=None, all_formats=False, stamp_token_text=False):
+    """Scan the rarity folders lazily, yielding one job per source file with its token ID
+
+    output_ids (a list indexed by token ID) writes every token's files under
+    another ID, its shuffled one, which is then also the number stamped on
+    the card (stamp_token_text) and looked up in token_names.
+    """
+    folder_mapping = get_folder_mapping()
+    if token_names is None:
+        token_names = {}
+    
+    global_counter = 0  # Global counter for sequential naming
+    
+    for rarity_level, config in folder_mapping.items():
+        print(f'\n📁 Scanning {rarity_level}...')
+        
+        # Define paths for this rarity level
+        character_folder = os.path.join(images_folder, rarity_level)
+        border_file = os.path.join(border_folder, config['border'])
+        rarity_name = config['rarity']
+        
+        # Check if folders exist
+        if not os.path.exists(character_folder):
+            print(f'⚠️ Character folder not found: {character_folder}')
+            continue
+            
+        if not os.path.exists(border_file):
+            print(f'⚠️ Border file not found: {border_file}')
+            continue
+        
+        # Get texts for this rarity level
+        texts = get_rarity_text(rarity_level)
+        rarity_start = global_counter
+        
+        for character_path in iter_source_files(character_folder, all_formats):
+            # Create sequential filename: 0.png, 1.png, 2.png, etc. (or the shuffled ID)
+            output_id = output_ids[global_counter] if output_ids is not None else global_counter
+            yield {
+                'token_id': global_counter,
+                'output_id': output_id,
+                'rarity_level': rarity_level,
+                'rarity_name': rarity_name,
+                'character_path': character_path,
+                'border_file': border_file,
+                'font_path': font_path,
+                'texts': texts,
+                'token_text': get_token_text(output_id, token_names) if stamp_token_text else None,
+                'template_path': template_path,
+                'image_output_path': os.path.join(output_images_folder, f'{output_id}.png'),
+                'metadata_output_path': os.path.join(output_metadata_folder, f'{output_id}.json')
+            }
+            global_counter += 1  # Increment counter for next file
+        
+        if global_counter == rarity_start:
+            print(f'⚠️ No character images found in {character_folder}')
+
+def plan_batch(images_folder, border_folder, output_images_folder, output_metadata_folder, font_path, template_path,
+               token_names=None, output_ids=None, all_formats=False, stamp_token_text=False):
+    """Scan the rarity folders and assign every source file its token ID up front"""
+    jobs = list(iter_batch_jobs(images_folder, border_folder, output_images_folder, output_metadata_folder,
+                                font_path, template_path, token_names, output_ids, all_formats, stamp_token_text))
+    rarity_totals = Counter(job['rarity_level'] for job in jobs)
+    
+    for rarity_level, total in rarity_totals.items():
+        print(f'Found {total} images to process in {rarity_level}')
+    
+    return jobs, rarity_totals
+
+def count_source_files(images_folder, border_folder, all_formats=False):
+    """How many tokens iter_batch_jobs will yield, without building the jobs"""
+    total = 0
+    for rarity_level, config in get_folder_mapping().items():
+        character_folder = os.path.join(images_folder, rarity_level)
+        if os.path.exists(character_folder) and os.path.exists(os.path.join(border_folder, config['border'])):
+            total += sum(1 for _ in iter_source_files(character_folder, all_formats))
+    return total
+
+def plan_permutation(permutation_path, count, seed=None):
+    """Shuffled ID of every token ID (a list) for rendering straight into Shuffled, saved before any file is written
+
+    Uses the same order OrderShuffle.py would for the seed. A permutation
+    already saved for this many tokens (and this seed, if one is given) is
+    kept, so re-runs stay incremental instead of moving every token.
+    """
+    try:
+        with open(permutation_path, 'r') as f:
+            saved_seed = json.load(f).get('seed')
+        mapping = load_permutation(permutation_path)
+        if (seed is None or saved_seed == seed) and sorted(mapping, key=int) == [str(i) for i in range(count)]:
+            print(f'🔒 Keeping the permutation in {permutation_path}')
+            return [mapping[str(i)] for i in range(count)]
+    except (OSError, ValueError, KeyError):
+        pass
+    
+    new_order = shuffled_order(count, seed)
+    commitment = save_permutation(permutation_path, {str(i): new_order[i] for i in range(count)}, seed)
+    print(f'🔒 Permutation saved to {permutation_path} (sha256: {commitment})')
+    return new_order
+
+def is_up_to_date(job, build_key, previous_manifest, resume):
+    """A token is skipped if its inputs match the manifest and its files are still there"""
+    return (previous_manifest.get(str(job['token_id'])) == build_key
+            and os.path.exists(job['image_output_path'])
+            and (job['metadata_output_path'] is None or os.path.exists(job['metadata_output_path']))
+            and all(os.path.exists(path) for path in job.get('rendition_paths', {}).values())
+            and (not resume or outputs_intact(job)))
+
+def stream_check(job, previous_manifest, resume, shared_hashes):
+    """Streaming stage: hash the token's inputs and mark it cached if nothing changed"""
+    start = time.perf_counter()
+    job['build_key'] = compute_build_key(job, shared_hashes)
+    job['cached'] = is_up_to_date(job, job['build_key'], previous_manifest, resume)
+    job['stages'] = {'build_cache_check': time.perf_counter() - start}
+    return job
+
+def stream_decode(job):
+    """Streaming stage: decode and resize the character"""
+    if not job['cached']:
+        job['image'] = load_character(job['character_path'], job['stages'], job['fast_resize'])
+        job['bytes_read'] = os.path.getsize(job['character_path'])
+    return job
+
+def stream_composite(job):
+    """Streaming stage: put the rarity overlay on top of the character"""
+    if not job['cached']:
+        start = time.perf_counter()
+        overlay, use_mask = get_rarity_overlay(job['border_file'], job['font_path'], job['texts'])
+        job['image'] = compose_card(job['image'], overlay, use_mask)
+        job['stages']['composite'] = time.perf_counter() - start
+        if job['token_text']:
+            start = time.perf_counter()
+            draw_token_text(job['image'], job['font_path'], job['token_text'])
+            job['stages']['token_text'] = time.perf_counter() - start
+    return job
+
+def stream_write(job, compiled_template, png_profile, quantize, renditions):
+    """Streaming stage: write the metadata, then encode and write the PNG and its renditions"""
+    if not job['cached']:
+        # With a metadata bundle the metadata is written once at the end of the run
+        metadata = ''
+        if job['metadata_output_path'] is not None:
+            start = time.perf_counter()
+            metadata = render_metadata(compiled_template, job['output_id'], job['rarity_name'], renditions)
+            write_file_atomic(job['metadata_output_path'], metadata)
+            job['stages']['metadata'] = time.perf_counter() - start
+        
+        # Drop the image as soon as it is written so finished items hold no pixels
+        start = time.perf_counter()
+        image, job['image'] = job['image'], None
+        job['bytes'], encode_seconds = save_png(image, job['image_output_path'], png_profile, quantize)
+        job['bytes_written'] = job['bytes'] + len(metadata)
+        job['stages']['encode'] = encode_seconds
+        job['stages']['write'] = time.perf_counter() - start - encode_seconds
+        if job['rendition_paths']:
+            start = time.perf_counter()
+            job['bytes_written'] += save_renditions(image, job['rendition_paths'])
+            job['stages']['renditions'] = time.perf_counter() - start
+    return job
+
+def batch_combine_images(workers=None, force=False, png_profile=DEFAULT_PNG_PROFILE, quantize=False, optimize=False,
+                         resume=False, trace_path=None, streaming=False, fast_resize=False,
+                         renditions=(), metadata_bundle=None, shuffle=False, seed=None, all_formats=False,
+                         token_text=False):
+    """Process all images in IMAGES folders with corresponding borders
+
+    Finished tokens are appended to Final/.render-journal as they complete.
+    With resume=True, journal entries from an interrupted run are checked
+    against the files on disk and only the remaining tokens are rendered.
+    Per-stage timings are printed at the end and written to trace_path
+    (JSON, or CSV for a .csv path) if given.
+
+    With streaming=True the source folders are scanned lazily and every
+    token flows through check → decode → composite → write thread pools
+    joined by bounded queues, instead of planning the whole batch first and
+    rendering it in worker processes.
+
+    fast_resize trades byte-identical output for much cheaper downscaling
+    of oversized art (see load_character).
+
+    renditions (names from renditions.RENDITIONS, e.g. ('preview',
+    'thumbnail')) are written from the same in-memory card into their own
+    Final/ folders, and their URLs are added to the metadata.
+
+    metadata_bundle ('sqlite' or 'jsonl') writes the metadata of the whole
+    collection to Final/metadata.<format> in one transaction instead of a
+    file per token. OrderShuffle.py, IPFS_FIX.py and FinalizeMetadata.py
+    pick the bundle up from there, and per-token files are only written
+    when exporting (JsonRemover.py / metadata_bundle.py export).
+
+    token_text=True stamps the token number (TOKEN_TEXT) on every card. It
+    is off by default because OrderShuffle.py renumbers the cards afterwards,
+    and always on with shuffle, where the renderer knows the final number.
+
+    shuffle=True renders straight into Shuffled/ instead of Final/: the
+    permutation is drawn (from seed, like OrderShuffle.py) as soon as the
+    folders are scanned and saved to Shuffled/permutation.json, then every
+    card is written under its shuffled ID. The metadata and the placement
+    are what OrderShuffle.py would produce from Final/, without the copy;
+    unlike a card shuffled from Final/, the card shows its shuffled number.
+    """
     try:
         # Define paths
+        output_root = './Shuffled' if shuffle else './Final'
         images_folder = './IMAGES'
         border_folder = './BORDER'
-        output_images_folder = './Final/Images'
-        output_metadata_folder = './Final/Metadata'
+        output_images_folder = f'{output_root}/Images'
+        output_metadata_folder = f'{output_root}/Metadata'
         font_path = './FONT/Generis.otf'
         template_path = './Template.json'
+        manifest_path = f'{output_root}/.build-manifest'
+        journal_path = f'{output_root}/.render-journal'
+        permutation_path = './Shuffled/permutation.json'
+        bundle_path = f'{output_root}/metadata.{metadata_bundle}' if metadata_bundle else None
+        
+        if workers is None:
+            workers = os.cpu_count() or 1
         
         print('🚀 Starting batch image processing...')
         print(f'Images source: {images_folder}')
         print(f'Borders source: {border_folder}')
         print(f'Output images: {output_images_folder}')
-        print(f'Output metadata: {output_metadata_folder}')
+        print(f'Output metadata: {bundle_path or output_metadata_folder}')
+        print(f'Workers: {workers}{" threads per stage (streaming)" if streaming else ""}')
+        print(f'PNG profile: {png_profile}{" + lossless palette" if quantize else ""}')
+        if fast_resize:
+            print('Resize: fast (draft decode + reduce)')
+        if renditions:
+            print(f'Renditions: {", ".join(renditions)}')
+        if shuffle:
+            print(f'Shuffle: straight to shuffled IDs{f" (seed {seed})" if seed is not None else ""}')
+        
+        # A plain run would start a new journal over the finished work of the killed one
+        if os.path.exists(journal_path) and not (resume or force):
+            print(f'❌ Found {journal_path} from an interrupted run: use --resume to keep its work, '
+                  f'or --force to render everything again')
+            return
         
         # Create output folders if they don't exist
         os.makedirs(output_images_folder, exist_ok=True)
-        os.makedirs(output_metadata_folder, exist_ok=True)
+        if not bundle_path:
+            os.makedirs(output_metadata_folder, exist_ok=True)
+        for name in renditions:
+            os.makedirs(rendition_folder(name, output_root), exist_ok=True)
+        
+        # Only one place may hold the metadata, the next steps look for a bundle first
+        for stale_bundle in remove_other_bundles(output_root, keep=bundle_path):
+            print(f'🗑️ Removed {stale_bundle}, metadata now goes to {bundle_path or output_metadata_folder}')
         
         # Check if font exists
         if not os.path.exists(font_path):
             raise FileNotFoundError(f"Font file not found: {font_path}")
         
-        # Get folder mapping
-        folder_mapping = get_folder_mapping()
+        # The shuffled number is the published one, so it can go on the card
+        token_text = token_text or shuffle
+        token_names = load_token_names(TOKEN_NAMES_CSV) if token_text else {}
+        if token_names:
+            print(f'Token names: {len(token_names)} from {TOKEN_NAMES_CSV}')
+        
+        # The token count is all the permutation needs, one directory listing per rarity
+        output_ids = None
+        if shuffle:
+            token_count = count_source_files(images_folder, border_folder, all_formats)
+            if not token_count:
+                print('⚠️ No images to process')
+                return
+            output_ids = plan_permutation(permutation_path, token_count, seed)
+        
+        if streaming:
+            # Token IDs are still assigned in scan order, the jobs just aren't all held at once
+            jobs = iter_batch_jobs(images_folder, border_folder, output_images_folder,
+                                   output_metadata_folder, font_path, template_path, token_names, output_ids,
+                                   all_formats, token_text)
+            rarity_totals = Counter()
+        else:
+            # Assign every token ID before any rendering starts so the output
+            # is the same no matter which worker finishes first
+            jobs, rarity_totals = plan_batch(images_folder, border_folder, output_images_folder,
+                                             output_metadata_folder, font_path, template_path, token_names, output_ids,
+                                             all_formats, token_text)
+            
+            if not jobs:
+                print('⚠️ No images to process')
+                return
+        
+        rarity_success = Counter()
+        rarity_failed = Counter()
+        instrumentation = StageStats('batch_combine_images')
         
-        total_processed = 0
-        total_success = 0
-        global_counter = 0  # Global counter for sequential naming
+        # Skip tokens whose inputs are unchanged since the last run
+        previous_manifest = {} if force else load_build_manifest(manifest_path)
         
-        # Process each rarity level
-        for rarity_level, config in folder_mapping.items():
-            print(f'\n📁 Processing {rarity_level}...')
+        if resume:
+            journal = load_render_journal(journal_path)
+            print(f'\n♻️ Resuming: {len(journal)} tokens in the journal of the interrupted run')
+            previous_manifest.update(journal)
+            remove_temp_files(output_images_folder)
+            remove_temp_files(output_metadata_folder)
+            # Complete lines only, so this run's entries append cleanly after them
+            write_file_atomic(journal_path, ''.join(f'{token_id} {key}\n' for token_id, key in journal.items()))
+        
+        manifest = {}
+        shared_hashes = {}
+        pending_jobs = []
+        cache_hits = 0
+        rendered = 0
+        encoded_bytes = 0
+        encode_seconds = 0.0
+        
+        if streaming:
+            # Up-to-date tokens are only known once they stream past, so they
+            # go into the journal too and the manifest on disk stays the
+            # previous one until the run ends
+            compiled_template = get_metadata_template(template_path, renditions)
             
-            # Define paths for this rarity level
-            character_folder = os.path.join(images_folder, rarity_level)
-            border_file = os.path.join(border_folder, config['border'])
-            rarity_name = config['rarity']
+            stages = [
+                ('check', lambda job: stream_check(job, previous_manifest, resume, shared_hashes), workers),
+                ('decode', stream_decode, workers),
+                ('composite', stream_composite, workers),
+                ('write', lambda job: stream_write(job, compiled_template, png_profile, quantize, renditions), workers)
+            ]
+            jobs = (dict(job, png_profile=png_profile, quantize=quantize, fast_resize=fast_resize,
+                         rendition_paths={name: rendition_path(name, output_root, job['output_id']) for name in renditions},
+                         metadata_output_path=None if bundle_path else job['metadata_output_path'])
+                    for job in jobs)
+            bundle_tokens = []
             
-            # Check if folders exist
-            if not os.path.exists(character_folder):
-                print(f'⚠️ Character folder not found: {character_folder}')
-                continue
+            print(f'\n⚙️ Streaming tokens...')
+            results = run_stages(jobs, stages, queue_size=2 * workers)
+        else:
+            for job in jobs:
+                job['png_profile'] = png_profile
+                job['quantize'] = quantize
+                job['fast_resize'] = fast_resize
+                job['rendition_paths'] = {name: rendition_path(name, output_root, job['output_id']) for name in renditions}
+                if bundle_path:
+                    job['metadata_output_path'] = None
+                with instrumentation.stage('build_cache_check'):
+                    build_key = compute_build_key(job, shared_hashes)
                 
-            if not os.path.exists(border_file):
-                print(f'⚠️ Border file not found: {border_file}')
-                continue
+                if is_up_to_date(job, build_key, previous_manifest, resume):
+                    manifest[str(job['token_id'])] = build_key
+                    rarity_success[job['rarity_level']] += 1
+                    cache_hits += 1
+                else:
+                    job['build_key'] = build_key
+                    pending_jobs.append(job)
             
-            # Get all PNG files in character folder
-            character_files = glob.glob(os.path.join(character_folder, '*.png'))
+            print(f'\n💾 Build cache: {cache_hits} up to date, {len(pending_jobs)} to render')
             
-            if not character_files:
-                print(f'⚠️ No PNG files found in {character_folder}')
-                continue
+            # Everything kept so far is safe in the manifest, the journal only
+            # has to record what this run finishes
+            save_build_manifest(manifest_path, manifest)
             
-            print(f'Found {len(character_files)} images to process')
+            # Metadata is cheap once the template is compiled, write it all in one go
+            if bundle_path:
+                # The bundle always gets the whole collection, in one transaction
+                with open_bundle(bundle_path) as bundle:
+                    metadata_written = generate_metadata_batch(
+                        template_path, ((job['output_id'], job['rarity_name'], None) for job in jobs),
+                        instrumentation, renditions, bundle
+                    )
+            else:
+                metadata_written = generate_metadata_batch(
+                    template_path,
+                    ((job['output_id'], job['rarity_name'], job['metadata_output_path']) for job in pending_jobs),
+                    instrumentation,
+                    renditions
+                )
             
-            # Get texts for this rarity level
-            texts = get_rarity_text(rarity_level)
+            print(f'\n⚙️ Rendering {len(pending_jobs)} tokens...')
             
-            # Process each character image
-            success_count = 0
-            for character_path in character_files:
-                character_filename = os.path.basename(character_path)
-                
-                # Create sequential filename: 0.png, 1.png, 2.png, etc.
-                image_filename = f'{global_counter}.png'
-                metadata_filename = f'{global_counter}.json'
-                
-                image_output_path = os.path.join(output_images_folder, image_filename)
-                metadata_output_path = os.path.join(output_metadata_folder, metadata_filename)
-                
-                print(f'Processing: {character_filename} → {global_counter} ({rarity_name})', end=' ... ')
-                
-                # Generate image
-                image_success = combine_single_image(character_path, border_file, image_output_path, font_path, texts)
-                
-                # Generate metadata
-                metadata_success = generate_metadata(template_path, global_counter, rarity_name, metadata_output_path)
-                
-                if image_success and metadata_success:
-                    print('✅')
-                    success_count += 1
-                elif image_success and not metadata_success:
-                    print('⚠️ (image ok, metadata failed)')
-                    success_count += 1
-                else:
-                    print('❌')
+            if workers > 1 and len(pending_jobs) > 1:
+                executor = ProcessPoolExecutor(max_workers=workers)
+                results = executor.map(process_token, pending_jobs, chunksize=max(1, len(pending_jobs) // (workers * 8)))
+            else:
+                executor = None
+                results = map(process_token, pending_jobs)
+        
+        progress = ProgressLine('Streaming' if streaming else 'Rendering', None if streaming else len(pending_jobs))
+        # Resumed runs keep the entries they started from until the manifest has them
+        journal_file = open(journal_path, 'a' if resume else 'w')
+        try:
+            if streaming:
+                for job in results:
+                    rarity_level = job['rarity_level']
+                    rarity_totals[rarity_level] += 1
+                    instrumentation.merge(job.get('stages', {}), job.get('bytes_read', 0), job.get('bytes_written', 0))
+                    
+                    if 'error' in job:
+                        print(f'\n❌ {os.path.basename(job["character_path"])} → {job["token_id"]} '
+                              f'({job["rarity_name"]}): {job["error"]}')
+                        rarity_failed[rarity_level] += 1
+                    else:
+                        rarity_success[rarity_level] += 1
+                        if job['cached']:
+                            cache_hits += 1
+                        else:
+                            rendered += 1
+                            encoded_bytes += job['bytes']
+                            encode_seconds += job['stages']['encode']
+                        manifest[str(job['token_id'])] = job['build_key']
+                        journal_file.write(f'{job["token_id"]} {job["build_key"]}\n')
+                        journal_file.flush()
+                        if bundle_path:
+                            bundle_tokens.append((job['output_id'], job['rarity_name'], None))
+                    progress.advance()
                 
-                global_counter += 1  # Increment counter for next file
-                total_processed += 1
-            
-            total_success += success_count
-            print(f'✅ {rarity_level}: {success_count}/{len(character_files)} images processed successfully')
+                if bundle_path:
+                    bundle_tokens.sort(key=lambda token: token[0])
+                    with open_bundle(bundle_path) as bundle:
+                        generate_metadata_batch(template_path, bundle_tokens, instrumentation, renditions, bundle)
+            else:
+                for job, (rarity_level, token_id, image_success, stats) in zip(pending_jobs, results):
+                    metadata_success = job['output_id'] in metadata_written
+                    encoded_bytes += stats['bytes']
+                    encode_seconds += stats['encode_seconds']
+                    instrumentation.merge(stats['stages'], stats['bytes_read'], stats['bytes'])
+                    character_filename = os.path.basename(job['character_path'])
+                    
+                    # Only problems get a line of their own, progress is aggregated
+                    if image_success and metadata_success:
+                        rarity_success[rarity_level] += 1
+                        manifest[str(token_id)] = job['build_key']
+                        journal_file.write(f'{token_id} {job["build_key"]}\n')
+                        journal_file.flush()
+                    elif image_success and not metadata_success:
+                        print(f'\n⚠️ {character_filename} → {token_id} ({job["rarity_name"]}): image ok, metadata failed')
+                        rarity_success[rarity_level] += 1
+                    else:
+                        print(f'\n❌ {character_filename} → {token_id} ({job["rarity_name"]}): image failed')
+                        rarity_failed[rarity_level] += 1
+                    progress.advance()
+                rendered = len(pending_jobs)
+            progress.close()
+        finally:
+            if streaming:
+                results.close()
+            elif executor is not None:
+                executor.shutdown()
+            save_build_manifest(manifest_path, manifest)
+            # The manifest now holds every journal entry
+            journal_file.close()
+            os.remove(journal_path)
+        
+        total_processed = sum(rarity_totals.values())
+        total_success = sum(rarity_success.values())
+        
+        if total_processed == 0:
+            print('⚠️ No images to process')
+            return
+        
+        print(f'\n📊 Per-rarity summary:')
+        for rarity_level, total in rarity_totals.items():
+            print(f'   {rarity_level}: {rarity_success[rarity_level]}/{total} succeeded, {rarity_failed[rarity_level]} failed')
         
         print(f'\n🎉 Batch processing complete!')
         print(f'Total images processed: {total_processed}')
         print(f'Successfully processed: {total_success}')
         print(f'Failed: {total_processed - total_success}')
+        print(f'Build cache hits: {cache_hits}, misses: {total_processed - cache_hits}')
+        if rendered:
+            print(f'PNG encode ({png_profile}): {encoded_bytes:,} bytes, {encode_seconds:.2f}s total, '
+                  f'{encode_seconds * 1000 / rendered:.1f}ms per image')
+        
+        instrumentation.print_summary()
+        if trace_path:
+            instrumentation.write_trace(trace_path)
+        
+        if optimize:
+            print()
+            optimize_images(output_images_folder, workers)
         
     except Exception as error:
         print(f'❌ Batch processing error: {error}')
 
 if __name__ == '__main__':
-    batch_combine_images()
+    parser = argparse.ArgumentParser(description='Combine character images with rarity borders and generate metadata')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes (default: CPU count, 1 = serial)')
+    parser.add_argument('--force', action='store_true',
+                        help='ignore Final/.build-manifest and re-render every token')
+    parser.add_argument('--png-profile', choices=sorted(PNG_PROFILES), default=DEFAULT_PNG_PROFILE,
+                        help=f'PNG encoding profile (default: {DEFAULT_PNG_PROFILE})')
+    parser.add_argument('--quantize', action='store_true',
+                        help='with the small profile, save as a palette PNG when that is lossless')
+    parser.add_argument('--optimize', action='store_true',
+                        help='losslessly recompress Final/Images after rendering')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted run, keeping the tokens in Final/.render-journal')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='write per-stage timings, bytes and peak memory to a .json or .csv file')
+    parser.add_argument('--stream', action='store_true',
+                        help='scan lazily and overlap decode/composite/encode on bounded thread pools (flat memory)')
+    parser.add_argument('--fast-resize', action='store_true',
+                        help='shrink oversized art while decoding and with reduce() first (visually equal, much faster)')
+    parser.add_argument('--renditions', type=parse_renditions, default=(), metavar='NAMES',
+                        help=f'also write these smaller versions from the same card, comma separated ({", ".join(RENDITIONS)})')
+    parser.add_argument('--metadata-bundle', choices=('sqlite', 'jsonl'),
+                        help='write all metadata to one Final/metadata.sqlite or .jsonl file instead of a file per token')
+    parser.add_argument('--all-formats', action='store_true',
+                        help=f'also pick up {", ".join(SOURCE_EXTENSIONS[1:])} art and upper-case extensions '
+                             '(renumbers the tokens of a collection that has such files)')
+    parser.add_argument('--token-text', action='store_true',
+                        help='stamp "#<token>" on every card (TOKEN_TEXT), only for collections that are not shuffled '
+                             'afterwards, OrderShuffle.py would give the cards other numbers (always on with --shuffle)')
+    parser.add_argument('--shuffle', action='store_true',
+                        help='render straight into Shuffled/ under shuffled IDs, no Final/ and no OrderShuffle.py copy')
+    parser.add_argument('--seed', help='with --shuffle, the same seed always gives the same order (like OrderShuffle.py)')
+    parser.add_argument('--check-duplicates', action='store_true',
+                        help='run DuplicateCheck.py first and stop before rendering if near-identical characters are found')
+    args = parser.parse_args()
+    if args.seed is not None and not args.shuffle:
+        parser.error('--seed only applies with --shuffle')
+    
+    if args.check_duplicates:
+        from DuplicateCheck import check_duplicates
+        if check_duplicates(workers=max(1, args.workers), all_formats=args.all_formats):
+            print('\n❌ Fix the near-duplicates above (or run without --check-duplicates) before rendering.')
+            raise SystemExit(1)
+        print()
+    
+    batch_combine_images(workers=max(1, args.workers), force=args.force, png_profile=args.png_profile,
+                         quantize=args.quantize, optimize=args.optimize, resume=args.resume, trace_path=args.trace,
+                         streaming=args.stream, fast_resize=args.fast_resize,
+                         renditions=args.renditions, metadata_bundle=args.metadata_bundle, shuffle=args.shuffle,
+                         seed=args.seed, all_formats=args.all_formats, token_text=args.token_text)
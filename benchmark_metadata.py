@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+
+from batch_combine_images import METADATA_NAME, METADATA_IMAGE_URL, get_metadata_template, render_metadata, generate_metadata_batch
+
+RARITIES = ['COMMON', 'RARE', 'LEGENDARY', 'EXOTIC', 'ULTRA-EXOTIC']
+
+def legacy_render_metadata(template_path, token_id, rarity):
+    """The original per-token path: load Template.json, patch it, json.dump it"""
+    with open(template_path, 'r') as f:
+        template = json.load(f)
+
+    template['name'] = METADATA_NAME.format(token_id=token_id)
+    template['image'] = METADATA_IMAGE_URL.format(token_id=token_id)
+    template['properties']['RARITY'] = rarity
+
+    for attr in template['attributes']:
+        if attr['trait_type'] == 'RARITY':
+            attr['value'] = rarity
+
+    return json.dumps(template, indent=4)
+
+def report(label, count, seconds):
+    print(f'{label:<28} {count:>8} tokens  {seconds:8.3f}s  {count / seconds:>12,.0f} tokens/sec')
+
+def benchmark_metadata(template_path, token_count):
+    """Compare the legacy and compiled metadata generators"""
+    print('⏱️ Metadata generation benchmark')
+    print(f'Template: {template_path}')
+    print(f'Tokens: {token_count}\n')
+
+    tokens = [(token_id, RARITIES[token_id % len(RARITIES)]) for token_id in range(token_count)]
+
+    # Byte-identical check before timing anything
+    compiled_template = get_metadata_template(template_path)
+    for token_id, rarity in tokens[:1000]:
+        if render_metadata(compiled_template, token_id, rarity) != legacy_render_metadata(template_path, token_id, rarity):
+            print(f'❌ Compiled output differs from json.dump for token {token_id}')
+            return
+    print('✅ Compiled output matches json.dump (first 1000 tokens)\n')
+
+    # In-memory rendering only
+    start = time.perf_counter()
+    for token_id, rarity in tokens:
+        legacy_render_metadata(template_path, token_id, rarity)
+    report('legacy render (memory)', token_count, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    compiled_template = get_metadata_template(template_path)
+    for token_id, rarity in tokens:
+        render_metadata(compiled_template, token_id, rarity)
+    report('compiled render (memory)', token_count, time.perf_counter() - start)
+
+    # Rendering plus writing the files
+    with tempfile.TemporaryDirectory() as output_folder:
+        start = time.perf_counter()
+        for token_id, rarity in tokens:
+            with open(os.path.join(output_folder, f'{token_id}.json'), 'w') as f:
+                f.write(legacy_render_metadata(template_path, token_id, rarity))
+        report('legacy render + write', token_count, time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        start = time.perf_counter()
+        written = generate_metadata_batch(
+            template_path,
+            ((token_id, rarity, os.path.join(output_folder, f'{token_id}.json')) for token_id, rarity in tokens)
+        )
+        report('compiled batch + write', len(written), time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark metadata generation')
+    parser.add_argument('--tokens', type=int, default=100000, help='number of tokens to generate (default: 100000)')
+    parser.add_argument('--template', default='./Template.json', help='template to use (default: ./Template.json)')
+    args = parser.parse_args()
+
+    benchmark_metadata(args.template, args.tokens)
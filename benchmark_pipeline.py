@@ -0,0 +1,228 @@
+from PIL import Image, ImageDraw, ImageFont, __version__ as pillow_version
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+
+import batch_combine_images
+import OrderShuffle
+import IPFS_FIX
+import JsonRemover
+from png_encoding import DEFAULT_PNG_PROFILE, encode_png
+
+REPO_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+def stage_result(latencies=None, items=0, total_seconds=None):
+    """Throughput and latency summary of one stage (latencies in seconds)"""
+    if latencies is not None:
+        latencies = sorted(latencies)
+        items = len(latencies)
+        total_seconds = sum(latencies)
+
+    result = {
+        'items': items,
+        'total_seconds': round(total_seconds, 6),
+        'items_per_sec': round(items / total_seconds, 2) if total_seconds else None,
+        'p50_ms': None,
+        'p95_ms': None
+    }
+    if latencies:
+        result['p50_ms'] = round(percentile(latencies, 0.50) * 1000, 3)
+        result['p95_ms'] = round(percentile(latencies, 0.95) * 1000, 3)
+    return result
+
+def make_synthetic_collection(root, count, size, mode, seed=0):
+    """Fill root/IMAGES/<rarity> with count synthetic character images and copy BORDER, FONT and Template.json"""
+    rng = random.Random(seed)
+    rarity_levels = list(batch_combine_images.get_folder_mapping())
+
+    for rarity_level in rarity_levels:
+        os.makedirs(os.path.join(root, 'IMAGES', rarity_level), exist_ok=True)
+
+    for index in range(count):
+        img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+        # A few soft shapes plus noise, so PNG sizes look like real art rather than flat color
+        for _ in range(12):
+            x0, y0 = rng.randrange(size), rng.randrange(size)
+            x1, y1 = x0 + rng.randrange(size // 4, size // 2), y0 + rng.randrange(size // 4, size // 2)
+            draw.ellipse([x0, y0, x1, y1], fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256), 255))
+        noise = Image.frombytes('L', (size, size), rng.randbytes(size * size))
+        img = Image.composite(img, Image.merge('RGBA', (noise, noise, noise, Image.new('L', (size, size), 0))),
+                              noise.point(lambda value: 255 if value > 24 else 0))
+        if mode != 'RGBA':
+            img = img.convert(mode)
+
+        rarity_level = rarity_levels[index % len(rarity_levels)]
+        img.save(os.path.join(root, 'IMAGES', rarity_level, f'character_{index}.png'))
+
+    shutil.copytree(os.path.join(REPO_FOLDER, 'BORDER'), os.path.join(root, 'BORDER'))
+    shutil.copy(os.path.join(REPO_FOLDER, 'Template.json'), os.path.join(root, 'Template.json'))
+
+    # The scripts look for ./FONT, the repository ships it as Font/
+    os.makedirs(os.path.join(root, 'FONT'))
+    for font_folder in ('FONT', 'Font'):
+        font_path = os.path.join(REPO_FOLDER, font_folder, 'Generis.otf')
+        if os.path.exists(font_path):
+            shutil.copy(font_path, os.path.join(root, 'FONT', 'Generis.otf'))
+            break
+
+    for folder in ('Final/Images', 'Final/Metadata', 'Shuffled/Images', 'Shuffled/Metadata', 'Shuffled/NoJson'):
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+def benchmark_image_stages(jobs):
+    """Time decode, resize, overlay composite, text drawing and PNG encode per card"""
+    latencies = {'decode': [], 'resize': [], 'overlay_composite': [], 'text_draw': [], 'token_text': [], 'png_encode': []}
+    fonts = {}
+
+    for job in jobs:
+        start = time.perf_counter()
+        character_img = Image.open(job['character_path'])
+        character_img.load()
+        latencies['decode'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        character_resized = character_img.resize((batch_combine_images.CHARACTER_SIZE, batch_combine_images.CHARACTER_SIZE),
+                                                 Image.Resampling.LANCZOS)
+        latencies['resize'].append(time.perf_counter() - start)
+
+        # Composite against the cached overlay, the way combine_single_image does it
+        overlay, use_mask = batch_combine_images.get_rarity_overlay(job['border_file'], job['font_path'], job['texts'])
+        start = time.perf_counter()
+        final_img = batch_combine_images.compose_card(character_resized, overlay, use_mask)
+        latencies['overlay_composite'].append(time.perf_counter() - start)
+
+        # Drawing the three texts on a card, what the overlay cache saves per card
+        text_img = final_img.copy()
+        start = time.perf_counter()
+        draw = ImageDraw.Draw(text_img)
+        for text, (font_size, center_y) in zip(job['texts'], batch_combine_images.TEXT_LAYOUT):
+            font = fonts.get(font_size)
+            if font is None:
+                font = fonts[font_size] = ImageFont.truetype(job['font_path'], font_size)
+            text_bbox = draw.textbbox((0, 0), text, font=font)
+            draw.text(((batch_combine_images.CANVAS_SIZE - (text_bbox[2] - text_bbox[0])) // 2,
+                       center_y - (text_bbox[3] - text_bbox[1]) // 2), text, font=font, fill='white')
+        latencies['text_draw'].append(time.perf_counter() - start)
+
+        # The per-token line stamped from the glyph atlas, the only text left per card
+        start = time.perf_counter()
+        batch_combine_images.draw_token_text(final_img, job['font_path'], f'#{job["token_id"]}')
+        latencies['token_text'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        data = encode_png(final_img, DEFAULT_PNG_PROFILE)
+        latencies['png_encode'].append(time.perf_counter() - start)
+
+        with open(job['image_output_path'], 'wb') as f:
+            f.write(data)
+
+    return {stage: stage_result(values) for stage, values in latencies.items()}
+
+def timed_script_stage(function, items):
+    """Time one whole-folder script function with its console output discarded"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+    return stage_result(items=items, total_seconds=time.perf_counter() - start)
+
+def run_benchmark(count, size, mode, seed=0):
+    """Build a synthetic collection in a temp folder and time every pipeline stage"""
+    original_folder = os.getcwd()
+    report = {
+        'config': {'count': count, 'size': size, 'mode': mode, 'seed': seed},
+        'environment': {
+            'python': platform.python_version(),
+            'pillow': pillow_version,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'stages': {}
+    }
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f'🧪 Generating {count} synthetic {size}x{size} {mode} characters...')
+        make_synthetic_collection(root, count, size, mode, seed)
+        os.chdir(root)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                jobs, _ = batch_combine_images.plan_batch('./IMAGES', './BORDER', './Final/Images', './Final/Metadata',
+                                                          './FONT/Generis.otf', './Template.json')
+
+            print('⏱️ Image stages...')
+            report['stages'].update(benchmark_image_stages(jobs))
+
+            print('⏱️ Metadata stages...')
+            latencies = []
+            for job in jobs:
+                start = time.perf_counter()
+                batch_combine_images.generate_metadata(job['template_path'], job['token_id'], job['rarity_name'],
+                                                       job['metadata_output_path'])
+                latencies.append(time.perf_counter() - start)
+            report['stages']['generate_metadata'] = stage_result(latencies)
+
+            report['stages']['shuffle_files'] = timed_script_stage(lambda: OrderShuffle.shuffle_files(seed=seed), len(jobs))
+            report['stages']['update_ipfs_cid'] = timed_script_stage(IPFS_FIX.update_ipfs_cid, len(jobs))
+            report['stages']['remove_json_extensions'] = timed_script_stage(JsonRemover.remove_json_extensions, len(jobs))
+        finally:
+            os.chdir(original_folder)
+
+    return report
+
+def print_report(report, baseline=None):
+    """Print the stage table, with the change in throughput against a baseline report if given"""
+    print(f'\n📊 {report["config"]["count"]} tokens, {report["config"]["size"]}px {report["config"]["mode"]} sources')
+    header = f'{"stage":<24} {"items/sec":>12} {"p50 ms":>10} {"p95 ms":>10}'
+    if baseline:
+        header += f' {"vs baseline":>12}'
+    print(header)
+
+    for stage, result in report['stages'].items():
+        p50 = f'{result["p50_ms"]:.2f}' if result['p50_ms'] is not None else '-'
+        p95 = f'{result["p95_ms"]:.2f}' if result['p95_ms'] is not None else '-'
+        line = f'{stage:<24} {result["items_per_sec"] or 0:>12,.1f} {p50:>10} {p95:>10}'
+
+        old = (baseline or {}).get('stages', {}).get(stage)
+        if old and old.get('items_per_sec') and result['items_per_sec']:
+            line += f' {result["items_per_sec"] / old["items_per_sec"]:>11.2f}x'
+        print(line)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage on a synthetic collection')
+    parser.add_argument('--count', type=int, default=100, help='number of synthetic characters (default: 100)')
+    parser.add_argument('--size', type=int, default=1024, help='width and height of the characters (default: 1024)')
+    parser.add_argument('--mode', choices=['RGBA', 'RGB', 'P'], default='RGBA', help='image mode of the characters (default: RGBA)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the synthetic images and the shuffle (default: 0)')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--compare', help='JSON report of an earlier run to compare against')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.count, args.size, args.mode, args.seed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f'\n💾 Report saved to {args.output}')
+    else:
+        json.dump(report, sys.stdout, indent=4)
+        print()
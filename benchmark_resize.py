@@ -0,0 +1,94 @@
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+import os
+import math
+import time
+import random
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_combine_images import load_character
+from instrumentation import peak_rss_bytes
+
+# Above this PSNR (dB) against the current path the fast path counts as visually equivalent
+SIMILARITY_THRESHOLD_DB = 40.0
+
+def psnr(first, second):
+    """Peak signal-to-noise ratio of two same-size images, inf if identical
+
+    Compared with premultiplied alpha, i.e. as they look, so the arbitrary
+    colors of (nearly) transparent pixels don't count.
+    """
+    difference = ImageChops.difference(first.convert('RGBA').convert('RGBa'), second.convert('RGBA').convert('RGBa'))
+    mean_square = sum(ImageStat.Stat(difference).sum2) / (first.width * first.height * 4)
+    if mean_square == 0:
+        return math.inf
+    return 10 * math.log10(255 ** 2 / mean_square)
+
+def make_source_art(path, size, seed=0):
+    """Write large synthetic character art: soft shapes, fine lines and a transparent background"""
+    rng = random.Random(seed)
+    img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        x1, y1 = x0 + rng.randrange(size // 8, size // 2), y0 + rng.randrange(size // 8, size // 2)
+        draw.ellipse([x0, y0, x1, y1], fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256), 255))
+    for _ in range(200):
+        draw.line([rng.randrange(size), rng.randrange(size), rng.randrange(size), rng.randrange(size)],
+                  fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256), 255), width=max(1, size // 1024))
+
+    if path.lower().endswith(('.jpg', '.jpeg')):
+        img.convert('RGB').save(path, quality=92)
+    else:
+        img.save(path)
+
+def resize_once(path, fast_resize, repeat):
+    """Run load_character repeat times in this (fresh) process, returns (seconds per image, peak RSS, last result)"""
+    stages = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = load_character(path, stages, fast_resize)
+    elapsed = (time.perf_counter() - start) / repeat
+    return elapsed, peak_rss_bytes(), result.tobytes(), result.mode, result.size
+
+def measure(path, fast_resize, repeat):
+    # A new worker process per measurement so peak RSS belongs to this path only
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        elapsed, rss, data, mode, size = executor.submit(resize_once, path, fast_resize, repeat).result()
+    return elapsed, rss, Image.frombytes(mode, size, data)
+
+def run_benchmark(sizes, formats, repeat):
+    print(f'{"source":<16} {"path":<8} {"ms/image":>10} {"peak RSS MB":>12} {"speedup":>8} {"PSNR dB":>9}')
+    all_equivalent = True
+
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            for image_format in formats:
+                path = os.path.join(folder, f'art_{size}.{image_format}')
+                make_source_art(path, size)
+
+                current_seconds, current_rss, current = measure(path, False, repeat)
+                fast_seconds, fast_rss, fast = measure(path, True, repeat)
+                similarity = psnr(current, fast)
+                equivalent = similarity >= SIMILARITY_THRESHOLD_DB
+                all_equivalent = all_equivalent and equivalent
+
+                label = f'{size}px {image_format}'
+                rss = lambda value: f'{value / 1e6:.0f}' if value is not None else '-'
+                print(f'{label:<16} {"current":<8} {current_seconds * 1000:>10.1f} {rss(current_rss):>12}')
+                print(f'{"":<16} {"fast":<8} {fast_seconds * 1000:>10.1f} {rss(fast_rss):>12} '
+                      f'{current_seconds / fast_seconds:>7.1f}x {similarity:>9.1f} {"✅" if equivalent else "❌"}')
+
+    print(f'\n{"✅" if all_equivalent else "❌"} Fast path {"within" if all_equivalent else "outside"} '
+          f'{SIMILARITY_THRESHOLD_DB:.0f} dB PSNR of the current path on every source')
+    return all_equivalent
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the current character resize with the draft/reduce fast path')
+    parser.add_argument('--sizes', default='2048,4096,8192', help='comma separated source widths (default: 2048,4096,8192)')
+    parser.add_argument('--formats', default='png,jpg', help='comma separated source formats (default: png,jpg)')
+    parser.add_argument('--repeat', type=int, default=3, help='resizes per measurement (default: 3)')
+    args = parser.parse_args()
+
+    run_benchmark([int(size) for size in args.sizes.split(',')], args.formats.split(','), max(1, args.repeat))
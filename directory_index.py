@@ -0,0 +1,124 @@
+import os
+
+# Indexes built this run, reused while the folder's mtime stays the same (see index_folder)
+_index_cache = {}
+
+def number_sort_key(number):
+    """Sort token numbers numerically ("2" before "10"), anything else after them"""
+    return (0, int(number), '') if number.isdigit() else (1, 0, number)
+
+def format_ranges(tokens, limit=20):
+    """Collapse token numbers into "0-99, 105, 200-210" for bulk reports, at most limit parts"""
+    numbers = sorted(int(token) for token in tokens if token.isdigit())
+    parts = []
+    start = previous = None
+    for number in numbers + [None]:
+        if number is not None and previous is not None and number == previous + 1:
+            previous = number
+            continue
+        if start is not None:
+            parts.append(str(start) if start == previous else f'{start}-{previous}')
+        start = previous = number
+    parts += sorted((token for token in tokens if not token.isdigit()), key=number_sort_key)
+
+    if len(parts) > limit:
+        return ', '.join(parts[:limit]) + f', ... ({len(parts) - limit} more)'
+    return ', '.join(parts)
+
+class DirectoryIndex:
+    """The token files of one folder, listed with a single os.scandir pass
+
+    files maps token number → file name for names ending in extension
+    (extension '' means names without any extension, like Shuffled/NoJson).
+    Hidden files are ignored, everything else lands in other.
+    """
+
+    def __init__(self, folder, extension):
+        self.folder = folder
+        self.extension = extension
+        self.files = {}
+        self.other = []
+        self.exists = os.path.isdir(folder)
+
+        if self.exists:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    name = entry.name
+                    if name.startswith('.') or entry.is_dir():
+                        continue
+                    if extension and name.endswith(extension):
+                        self.files[name[:-len(extension)]] = name
+                    elif not extension and '.' not in name:
+                        self.files[name] = name
+                    else:
+                        self.other.append(name)
+
+        self.tokens = sorted(self.files, key=number_sort_key)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, token):
+        return token in self.files
+
+    def path(self, token):
+        return os.path.join(self.folder, self.files[token])
+
+    def paths(self):
+        """Token file paths in numeric order"""
+        return [self.path(token) for token in self.tokens]
+
+    def all_paths(self):
+        """Every non-hidden file, token or not"""
+        return self.paths() + [os.path.join(self.folder, name) for name in sorted(self.other)]
+
+    def missing_from(self, other):
+        """Tokens of this folder that the other index (or metadata bundle) doesn't have, in numeric order"""
+        present = set(other.tokens)
+        return [token for token in self.tokens if token not in present]
+
+    def gaps(self):
+        """Numbers missing from 0 to the highest token number"""
+        numbers = {int(token) for token in self.files if token.isdigit()}
+        if not numbers:
+            return []
+        return [str(number) for number in range(max(numbers) + 1) if number not in numbers]
+
+def index_folder(folder, extension):
+    """DirectoryIndex of a folder, shared by every caller in this run until the folder changes
+
+    Adding, removing or renaming files updates a folder's mtime, so one
+    stat tells whether the cached listing is still good. Code that writes
+    into a folder can also drop its listing with forget().
+    """
+    key = (os.path.abspath(folder), extension)
+    try:
+        mtime = os.stat(folder).st_mtime_ns
+    except OSError:
+        _index_cache.pop(key, None)
+        return DirectoryIndex(folder, extension)
+
+    cached = _index_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    index = DirectoryIndex(folder, extension)
+    _index_cache[key] = (mtime, index)
+    return index
+
+def forget(folder):
+    """Drop the cached listings of a folder after writing into it"""
+    folder = os.path.abspath(folder)
+    for key in [key for key in _index_cache if key[0] == folder]:
+        del _index_cache[key]
+
+def report_unpaired(first, second, first_label, second_label, limit=20):
+    """Print the tokens only one of two indexes (or metadata bundles) has, in bulk, returns how many there were"""
+    first_tokens, second_tokens = first.tokens, second.tokens
+    first_set, second_set = set(first_tokens), set(second_tokens)
+    only_first = [token for token in first_tokens if token not in second_set]
+    only_second = [token for token in second_tokens if token not in first_set]
+    if only_first:
+        print(f'⚠️ {len(only_first)} {first_label} without {second_label}: {format_ranges(only_first, limit)}')
+    if only_second:
+        print(f'⚠️ {len(only_second)} {second_label} without {first_label}: {format_ranges(only_second, limit)}')
+    return len(only_first) + len(only_second)
@@ -0,0 +1,18 @@
+import os
+
+def write_file_atomic(path, data):
+    """Write str or bytes to path through a temp file and a rename, so a crash never leaves a partial file"""
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    mode = 'wb' if isinstance(data, (bytes, bytearray)) else 'w'
+    
+    try:
+        with open(temp_path, mode) as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        # Don't leave the temp file behind on errors (or Ctrl+C)
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
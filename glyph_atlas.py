@@ -0,0 +1,72 @@
+from PIL import Image, ImageDraw, ImageFont
+
+class GlyphAtlas:
+    """Glyphs of one font at one size, rasterized once and stamped onto cards as needed
+
+    Strings are laid out from the cached advance widths plus pair kerning,
+    so per-card text costs a few small mask pastes instead of a FreeType
+    render of the whole string.
+    """
+
+    def __init__(self, font_path, font_size):
+        self.font = ImageFont.truetype(font_path, font_size)
+        self.glyphs = {}   # character → (mask, bbox relative to the pen position, advance)
+        self.kerning = {}  # (previous character, character) → extra advance
+
+    def glyph(self, char):
+        entry = self.glyphs.get(char)
+        if entry is None:
+            bbox = self.font.getbbox(char)
+            mask = Image.new('L', (max(1, bbox[2] - bbox[0]), max(1, bbox[3] - bbox[1])), 0)
+            ImageDraw.Draw(mask).text((-bbox[0], -bbox[1]), char, font=self.font, fill=255)
+            entry = self.glyphs[char] = (mask, bbox, self.font.getlength(char))
+        return entry
+
+    def kern(self, previous, char):
+        pair = (previous, char)
+        value = self.kerning.get(pair)
+        if value is None:
+            value = self.kerning[pair] = (self.font.getlength(previous + char)
+                                          - self.font.getlength(previous) - self.font.getlength(char))
+        return value
+
+    def layout(self, text):
+        """Place every glyph, returns ([(mask, x, y)], bbox) relative to the text origin like textbbox()"""
+        placed = []
+        left = top = None
+        right = bottom = 0
+        pen = 0.0
+        previous = None
+
+        for char in text:
+            if previous is not None:
+                pen += self.kern(previous, char)
+            mask, bbox, advance = self.glyph(char)
+            x = round(pen) + bbox[0]
+            # Like textbbox(): every glyph box counts across, only inked ones up and down
+            left = x if left is None else min(left, x)
+            right = max(right, round(pen) + bbox[2])
+            if bbox[2] > bbox[0] and bbox[3] > bbox[1]:  # spaces only move the pen
+                placed.append((mask, x, bbox[1]))
+                top = bbox[1] if top is None else min(top, bbox[1])
+                bottom = max(bottom, bbox[3])
+            pen += advance
+            previous = char
+
+        return placed, (left or 0, top or 0, right, bottom)
+
+    def draw(self, img, origin, text, fill='white'):
+        """Stamp text onto img with its origin at (x, y), the way ImageDraw.text would place it"""
+        placed, (left, top, right, bottom) = self.layout(text)
+        if not placed:
+            return
+
+        # Overlapping glyph edges are blended over each other (a + b - a * b / 255), as Pillow's render does
+        left = min(x for _, x, _ in placed)
+        right = max(x + mask.width for mask, x, _ in placed)
+        text_mask = Image.new('L', (right - left, bottom - top), 0)
+        for mask, x, y in placed:
+            box = (x - left, y - top, x - left + mask.width, y - top + mask.height)
+            text_mask.paste(255, box, mask)
+
+        img.paste(fill, (origin[0] + left, origin[1] + top), text_mask)
@@ -0,0 +1,144 @@
+import sys
+import csv
+import json
+import time
+from contextlib import contextmanager
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+def peak_rss_bytes(children=False):
+    """Peak resident memory of this process (or of its finished child processes), None if unknown"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # Linux reports KB, macOS reports bytes
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+class StageStats:
+    """Per-stage timers plus bytes read and written, cheap enough to call per file"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def record(self, stage, seconds, count=1):
+        totals = self.stages.setdefault(stage, [0, 0.0])
+        totals[0] += count
+        totals[1] += seconds
+
+    @contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def merge(self, stage_seconds, bytes_read=0, bytes_written=0):
+        """Add {stage: seconds} measured elsewhere, e.g. in a worker process, as one item each"""
+        for stage, seconds in stage_seconds.items():
+            self.record(stage, seconds)
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+
+    def rows(self):
+        return [
+            {'stage': stage, 'items': count, 'seconds': round(seconds, 6),
+             'ms_per_item': round(seconds * 1000 / count, 3) if count else None}
+            for stage, (count, seconds) in self.stages.items()
+        ]
+
+    def summary(self):
+        return {
+            'name': self.name,
+            'wall_seconds': round(time.perf_counter() - self.started, 6),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'peak_rss_children_bytes': peak_rss_bytes(children=True),
+            'stages': self.rows()
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f'\n⏱️ {self.name}: {summary["wall_seconds"]:.2f}s wall, '
+              f'{summary["bytes_read"] / 1e6:.1f} MB read, {summary["bytes_written"] / 1e6:.1f} MB written')
+        for row in summary['stages']:
+            print(f'   {row["stage"]:<20} {row["items"]:>8} items {row["seconds"]:>10.2f}s {row["ms_per_item"] or 0:>10.2f} ms/item')
+        if summary['peak_rss_bytes'] is not None:
+            rss = f'   peak RSS: {summary["peak_rss_bytes"] / 1e6:.0f} MB'
+            if summary['peak_rss_children_bytes']:
+                rss += f' (worker processes: {summary["peak_rss_children_bytes"] / 1e6:.0f} MB)'
+            print(rss)
+
+    def write_trace(self, trace_path):
+        """Write the summary as JSON, or one row per stage as CSV if the path ends in .csv"""
+        summary = self.summary()
+        if trace_path.lower().endswith('.csv'):
+            with open(trace_path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=['name', 'stage', 'items', 'seconds', 'ms_per_item',
+                                                       'bytes_read', 'bytes_written', 'peak_rss_bytes'])
+                writer.writeheader()
+                for row in summary['stages']:
+                    writer.writerow(dict(row, name=self.name, bytes_read=summary['bytes_read'],
+                                         bytes_written=summary['bytes_written'],
+                                         peak_rss_bytes=summary['peak_rss_bytes']))
+        else:
+            with open(trace_path, 'w') as f:
+                json.dump(summary, f, indent=4)
+        print(f'📝 Trace written to {trace_path}')
+
+class ProgressLine:
+    """One progress line (done/total, items/sec, ETA), redrawn at most every interval seconds"""
+
+    def __init__(self, label, total, interval=0.5):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.started = time.perf_counter()
+        self.last_draw = 0.0
+        self.interactive = sys.stdout.isatty()
+
+    def advance(self, count=1):
+        self.done += count
+        now = time.perf_counter()
+        if now - self.last_draw >= self.interval:
+            self.last_draw = now
+            self._draw(now)
+
+    def _draw(self, now, final=False):
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        # total is None when the items are counted as they stream in
+        line = f'{self.label}: {self.done}' + (f'/{self.total}' if self.total is not None else '')
+        if self.total:
+            line += f' ({self.done / self.total:.0%})'
+        line += f' {rate:,.1f} items/s'
+        if not final and rate > 0 and self.total:
+            line += f' ETA {(self.total - self.done) / rate:,.0f}s'
+        elif final:
+            line += f' in {elapsed:.1f}s'
+
+        # Redraw in place on a terminal, plain lines when piped to a file
+        if self.interactive:
+            print(f'\r{line:<79}', end='' if not final else '\n', flush=True)
+        else:
+            print(line, flush=True)
+
+    def close(self):
+        self._draw(time.perf_counter(), final=True)
+
+def trace_path_from_argv():
+    """Read an optional "--trace <file>" from the command line of the menu-driven scripts"""
+    if '--trace' in sys.argv:
+        index = sys.argv.index('--trace')
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return None
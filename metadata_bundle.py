@@ -0,0 +1,271 @@
+import os
+import json
+import sqlite3
+import argparse
+
+from directory_index import number_sort_key, index_folder, forget
+
+# A bundle is one file holding the metadata of every token, named after its format
+BUNDLE_NAMES = ('metadata.sqlite', 'metadata.jsonl')
+
+def _to_text(metadata):
+    """Bundles store JSON text, dicts are stored compactly and text as given"""
+    return metadata if isinstance(metadata, str) else json.dumps(metadata, separators=(',', ':'))
+
+class SqliteBundle:
+    """Metadata in one SQLite table keyed by token ID, every bulk write is a single transaction"""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS metadata '
+                                '(token_id TEXT PRIMARY KEY, number INTEGER, data TEXT NOT NULL)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+
+    def __contains__(self, token_id):
+        return self.connection.execute('SELECT 1 FROM metadata WHERE token_id = ?', (str(token_id),)).fetchone() is not None
+
+    @property
+    def tokens(self):
+        return [row[0] for row in self.connection.execute(
+            'SELECT token_id FROM metadata ORDER BY number IS NULL, number, token_id')]
+
+    def get(self, token_id):
+        row = self.connection.execute('SELECT data FROM metadata WHERE token_id = ?', (str(token_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def texts(self):
+        """(token ID, JSON text) of every token in numeric order, without parsing"""
+        return self.connection.execute('SELECT token_id, data FROM metadata ORDER BY number IS NULL, number, token_id')
+
+    def items(self):
+        for token_id, data in self.texts():
+            yield token_id, json.loads(data)
+
+    def _rows(self, items):
+        for token_id, metadata in items:
+            token_id = str(token_id)
+            yield token_id, int(token_id) if token_id.isdigit() else None, _to_text(metadata)
+
+    def put_many(self, items):
+        """Add or replace (token ID, metadata dict or JSON text) pairs"""
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO metadata VALUES (?, ?, ?)', self._rows(items))
+
+    def replace_all(self, items):
+        """Make the bundle hold exactly these tokens"""
+        with self.connection:
+            self.connection.execute('DELETE FROM metadata')
+            self.connection.executemany('INSERT INTO metadata VALUES (?, ?, ?)', self._rows(items))
+
+class JsonlBundle:
+    """Metadata as one {"token_id", "metadata"} JSON object per line
+
+    Writes are appended and the last line of a token wins, so patching a
+    few tokens never rewrites the file. replace_all() writes a new,
+    compacted file and swaps it in.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.complete_size = 0  # bytes up to the end of the last complete line
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    # The last line may be cut short if a write was killed
+                    if not line.endswith(b'\n'):
+                        break
+                    entry = json.loads(line)
+                    self.entries[entry['token_id']] = entry['metadata']
+                    self.complete_size += len(line)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, token_id):
+        return str(token_id) in self.entries
+
+    @property
+    def tokens(self):
+        return sorted(self.entries, key=number_sort_key)
+
+    def get(self, token_id):
+        return self.entries.get(str(token_id))
+
+    def texts(self):
+        for token_id in self.tokens:
+            yield token_id, json.dumps(self.entries[token_id])
+
+    def items(self):
+        for token_id in self.tokens:
+            yield token_id, self.entries[token_id]
+
+    def _lines(self, items, entries):
+        for token_id, metadata in items:
+            token_id = str(token_id)
+            metadata = json.loads(metadata) if isinstance(metadata, str) else metadata
+            entries[token_id] = metadata
+            yield json.dumps({'token_id': token_id, 'metadata': metadata}, separators=(',', ':')) + '\n'
+
+    def put_many(self, items):
+        """Add or replace (token ID, metadata dict or JSON text) pairs"""
+        # A line cut short by a killed write would swallow the first new one
+        if os.path.exists(self.path) and os.path.getsize(self.path) != self.complete_size:
+            os.truncate(self.path, self.complete_size)
+        with open(self.path, 'a') as f:
+            f.writelines(self._lines(items, self.entries))
+        self.complete_size = os.path.getsize(self.path)
+
+    def replace_all(self, items):
+        """Make the bundle hold exactly these tokens"""
+        entries = {}
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                f.writelines(self._lines(items, entries))
+            os.replace(temp_path, self.path)
+            self.entries = entries
+            self.complete_size = os.path.getsize(self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+def open_bundle(path):
+    """Open a .sqlite/.db or .jsonl metadata bundle, creating it if needed"""
+    if path.endswith('.jsonl'):
+        return JsonlBundle(path)
+    if path.endswith(('.sqlite', '.db')):
+        return SqliteBundle(path)
+    raise ValueError(f'Unknown bundle format "{path}", use a .sqlite or .jsonl file')
+
+def find_bundle(folder):
+    """Path of the metadata bundle in a folder (Final or Shuffled), None if the metadata are separate files"""
+    for name in BUNDLE_NAMES:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+def remove_other_bundles(folder, keep=None):
+    """Delete the bundles in a folder other than keep, so only one place holds its metadata, returns their paths"""
+    removed = []
+    for name in BUNDLE_NAMES:
+        path = os.path.join(folder, name)
+        if os.path.exists(path) and (keep is None or os.path.normpath(path) != os.path.normpath(keep)):
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+def export_bundle(bundle, metadata_folder=None, nojson_folder=None, token_ids=None):
+    """Write per-token files from a bundle, the same bytes the file-based steps write, returns how many tokens"""
+    for folder in (metadata_folder, nojson_folder):
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    count = 0
+    selected = set(map(str, token_ids)) if token_ids is not None else None
+    for token_id, data in bundle.texts():
+        if selected is not None and token_id not in selected:
+            continue
+        text = json.dumps(json.loads(data), indent=4)
+        if metadata_folder:
+            with open(os.path.join(metadata_folder, f'{token_id}.json'), 'w') as f:
+                f.write(text)
+        if nojson_folder:
+            with open(os.path.join(nojson_folder, token_id), 'w') as f:
+                f.write(text)
+        count += 1
+
+    for folder in (metadata_folder, nojson_folder):
+        if folder:
+            forget(folder)
+    return count
+
+def import_folder(bundle, metadata_folder):
+    """Load every <token>.json of a folder into a bundle, replacing what it held, returns how many"""
+    index = index_folder(metadata_folder, '.json')
+
+    def read():
+        for token_id in index.tokens:
+            with open(index.path(token_id), 'r') as f:
+                yield token_id, json.load(f)
+
+    bundle.replace_all(read())
+    return len(index)
+
+def set_field(bundle, field, value, token_ids=None):
+    """Set a top-level field of every (or the given) token in one bulk write, returns how many changed"""
+    selected = set(map(str, token_ids)) if token_ids is not None else None
+    changed = []
+    for token_id, metadata in bundle.items():
+        if (selected is None or token_id in selected) and metadata.get(field) != value:
+            metadata[field] = value
+            changed.append((token_id, metadata))
+    bundle.put_many(changed)
+    return len(changed)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query, patch, import and export a metadata bundle (.sqlite or .jsonl)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='write per-token .json and/or extensionless files')
+    export_parser.add_argument('bundle')
+    export_parser.add_argument('--metadata', help='folder for <token>.json files')
+    export_parser.add_argument('--nojson', help='folder for extensionless <token> files')
+
+    import_parser = subparsers.add_parser('import', help='build a bundle from a folder of <token>.json files')
+    import_parser.add_argument('folder')
+    import_parser.add_argument('bundle')
+
+    get_parser = subparsers.add_parser('get', help='print the metadata of one token')
+    get_parser.add_argument('bundle')
+    get_parser.add_argument('token_id')
+
+    set_parser = subparsers.add_parser('set', help='set a top-level field on every token (or --tokens)')
+    set_parser.add_argument('bundle')
+    set_parser.add_argument('field')
+    set_parser.add_argument('value', help='JSON value, e.g. \'"text"\' or 5')
+    set_parser.add_argument('--tokens', help='only these token IDs, e.g. 1,5,10-20')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        with open_bundle(args.bundle) as bundle:
+            print(f'📦 Imported {import_folder(bundle, args.folder)} tokens from {args.folder} into {args.bundle}')
+    elif not os.path.exists(args.bundle):
+        print(f'❌ Bundle not found: {args.bundle}')
+    else:
+        with open_bundle(args.bundle) as bundle:
+            if args.command == 'export':
+                if not args.metadata and not args.nojson:
+                    print('❌ Give --metadata and/or --nojson')
+                else:
+                    print(f'✅ Exported {export_bundle(bundle, args.metadata, args.nojson)} tokens')
+            elif args.command == 'get':
+                metadata = bundle.get(args.token_id)
+                print(json.dumps(metadata, indent=4) if metadata is not None else f'❌ No token {args.token_id}')
+            elif args.command == 'set':
+                from IPFS_FIX import parse_token_ids
+                token_ids = parse_token_ids(args.tokens) if args.tokens else None
+                print(f'✅ {set_field(bundle, args.field, json.loads(args.value), token_ids)} tokens changed')
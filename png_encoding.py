@@ -0,0 +1,158 @@
+from PIL import Image
+import os
+import io
+import time
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from file_io import write_file_atomic
+
+# Pillow save options for each encoding profile
+# 'balanced' is Pillow's default PNG encoder setting
+PNG_PROFILES = {
+    'fast': {'compress_level': 1},
+    'balanced': {'compress_level': 6},
+    'small': {'compress_level': 9, 'optimize': True}
+}
+
+DEFAULT_PNG_PROFILE = 'balanced'
+
+def to_lossless_palette(img):
+    """Return a palette copy of img if it has <= 256 colors and converts back exactly, else None"""
+    if img.mode not in ('RGB', 'RGBA') or img.getcolors(256) is None:
+        return None
+
+    palette_img = img.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+    if palette_img.convert(img.mode).tobytes() != img.tobytes():
+        return None
+
+    return palette_img
+
+def encode_png(img, profile=DEFAULT_PNG_PROFILE, quantize=False):
+    """Encode an image to PNG bytes with the given profile"""
+    options = PNG_PROFILES[profile]
+
+    # Palette images are only used when no pixel changes
+    if quantize and profile == 'small':
+        img = to_lossless_palette(img) or img
+
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG', **options)
+    return buffer.getvalue()
+
+def save_png(img, output_path, profile=DEFAULT_PNG_PROFILE, quantize=False):
+    """Save an image as PNG with the given profile, returns (bytes written, encode seconds)"""
+    start = time.perf_counter()
+    data = encode_png(img, profile, quantize)
+    encode_seconds = time.perf_counter() - start
+
+    write_file_atomic(output_path, data)
+
+    return len(data), encode_seconds
+
+def optimize_png(path, profile='small', quantize=True):
+    """Losslessly re-encode one PNG in place if that makes it smaller, returns (old size, new size)"""
+    try:
+        with open(path, 'rb') as f:
+            original = f.read()
+
+        with Image.open(io.BytesIO(original)) as img:
+            img.load()
+            data = encode_png(img, profile, quantize)
+
+        if len(data) >= len(original):
+            return len(original), len(original)
+
+        write_file_atomic(path, data)
+
+        return len(original), len(data)
+
+    except Exception as e:
+        print(f'❌ Error optimizing {os.path.basename(path)}: {e}')
+        return None
+
+def optimize_images(images_folder='./Final/Images', workers=None, profile='small', quantize=True):
+    """Recompress every PNG in a folder losslessly across a process pool"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    image_files = glob.glob(os.path.join(images_folder, '*.png'))
+
+    print(f'🗜️ Optimizing PNGs in {images_folder} ({profile} profile, {workers} workers)...')
+
+    if not image_files:
+        print(f'⚠️ No PNG files found in {images_folder}')
+        return
+
+    start = time.perf_counter()
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(optimize_png, image_files, [profile] * len(image_files),
+                                        [quantize] * len(image_files),
+                                        chunksize=max(1, len(image_files) // (workers * 8))))
+    else:
+        results = [optimize_png(path, profile, quantize) for path in image_files]
+
+    elapsed = time.perf_counter() - start
+
+    sizes = [result for result in results if result is not None]
+    bytes_before = sum(old for old, new in sizes)
+    bytes_after = sum(new for old, new in sizes)
+    improved = sum(1 for old, new in sizes if new < old)
+
+    print(f'\n🎉 PNG optimization complete!')
+    print(f'Files optimized: {improved}/{len(image_files)}')
+    print(f'Errors: {len(image_files) - len(sizes)}')
+    print(f'Bytes before: {bytes_before:,}')
+    print(f'Bytes after: {bytes_after:,}')
+    if bytes_before:
+        print(f'Bytes saved: {bytes_before - bytes_after:,} ({(bytes_before - bytes_after) / bytes_before:.1%})')
+    print(f'Time: {elapsed:.2f}s')
+
+def compare_profiles(images_folder='./Final/Images', sample_size=20):
+    """Encode a sample of images with every profile and report size and encode time"""
+    image_files = sorted(glob.glob(os.path.join(images_folder, '*.png')))[:sample_size]
+
+    if not image_files:
+        print(f'⚠️ No PNG files found in {images_folder}')
+        return
+
+    images = []
+    for path in image_files:
+        with Image.open(path) as img:
+            img.load()
+            images.append(img.copy())
+
+    print(f'📏 Comparing PNG profiles on {len(images)} images from {images_folder}')
+    print(f'{"profile":<18} {"total bytes":>14} {"avg bytes":>12} {"encode ms/img":>14}')
+
+    variants = [(profile, False) for profile in PNG_PROFILES] + [('small', True)]
+    for profile, quantize in variants:
+        total_bytes = 0
+        start = time.perf_counter()
+        for img in images:
+            total_bytes += len(encode_png(img, profile, quantize))
+        elapsed = time.perf_counter() - start
+
+        label = f'{profile}+palette' if quantize else profile
+        print(f'{label:<18} {total_bytes:>14,} {total_bytes // len(images):>12,} {elapsed * 1000 / len(images):>14.1f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Losslessly recompress rendered PNGs')
+    parser.add_argument('--folder', default='./Final/Images', help='folder with PNGs (default: ./Final/Images)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes (default: CPU count)')
+    parser.add_argument('--profile', choices=sorted(PNG_PROFILES), default='small',
+                        help='profile used for re-encoding (default: small)')
+    parser.add_argument('--no-quantize', action='store_true',
+                        help='never convert to a palette, even when it would be lossless')
+    parser.add_argument('--compare', action='store_true',
+                        help='only report size and encode time of every profile on a sample')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_profiles(args.folder)
+    else:
+        optimize_images(args.folder, max(1, args.workers), args.profile, not args.no_quantize)
@@ -0,0 +1,70 @@
+from PIL import Image
+import io
+import os
+
+from file_io import write_file_atomic
+
+# Extra versions of every card, written by batch_combine_images from the
+# card it already has in memory. Each one gets its own folder under Final/
+# and Shuffled/ and its own metadata field pointing at it.
+RENDITIONS = {
+    'preview': {
+        'size': 512,
+        'format': 'WEBP',
+        'extension': '.webp',
+        'options': {'quality': 85, 'method': 4},
+        'folder': 'Previews',
+        'field': 'preview'
+    },
+    'thumbnail': {
+        'size': 256,
+        'format': 'PNG',
+        'extension': '.png',
+        'options': {'compress_level': 6},
+        'folder': 'Thumbnails',
+        'field': 'thumbnail'
+    }
+}
+
+# Rendition URLs in Final/Metadata point at this until the folder is uploaded
+# and FinalizeMetadata.py / IPFS_FIX.py put the real CID in
+PENDING_CID = 'PENDING_CID'
+RENDITION_URL = 'https://ipfs.io/ipfs/{cid}/{token_id}{extension}'
+
+def parse_renditions(value):
+    """Turn "preview,thumbnail" into a tuple of known rendition names"""
+    names = tuple(name.strip() for name in value.split(',') if name.strip())
+    for name in names:
+        if name not in RENDITIONS:
+            raise ValueError(f'Unknown rendition "{name}", choose from: {", ".join(RENDITIONS)}')
+    return names
+
+def rendition_folder(name, root):
+    return os.path.join(root, RENDITIONS[name]['folder'])
+
+def rendition_path(name, root, token_id):
+    return os.path.join(rendition_folder(name, root), f'{token_id}{RENDITIONS[name]["extension"]}')
+
+def rendition_url(name, token_id, cid=PENDING_CID):
+    return RENDITION_URL.format(cid=cid, token_id=token_id, extension=RENDITIONS[name]['extension'])
+
+def encode_rendition(card, name):
+    """Downscale the full card and encode it in the rendition's format"""
+    spec = RENDITIONS[name]
+    img = card.resize((spec['size'], spec['size']), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, spec['format'], **spec['options'])
+    return buffer.getvalue()
+
+def save_renditions(card, paths):
+    """Write every {name: output path} rendition of a card, returns the bytes written"""
+    bytes_written = 0
+    for name, path in paths.items():
+        data = encode_rendition(card, name)
+        write_file_atomic(path, data)
+        bytes_written += len(data)
+    return bytes_written
+
+def rendition_fields(metadata):
+    """(name, field) of every rendition referenced by a token's metadata"""
+    return [(name, spec['field']) for name, spec in RENDITIONS.items() if spec['field'] in metadata]
@@ -0,0 +1,93 @@
+import queue
+import threading
+
+# Marks the end of the items flowing into a stage
+_DONE = object()
+
+def _put(q, item, stop):
+    """Put an item on a bounded queue, giving up if the pipeline was stopped while it is full"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _stage_worker(name, function, inbox, outbox, state, lock, stop):
+    while True:
+        try:
+            item = inbox.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+
+        if item is _DONE:
+            # Hand the marker on to the other threads of this stage, the last one closes the next stage
+            _put(inbox, _DONE, stop)
+            with lock:
+                state[name] -= 1
+                last = state[name] == 0
+            if last:
+                _put(outbox, _DONE, stop)
+            return
+
+        if 'error' not in item:
+            try:
+                item = function(item)
+            except Exception as e:
+                item['error'] = f'{name}: {e}'
+
+        if not _put(outbox, item, stop):
+            return
+
+def run_stages(items, stages, queue_size=8):
+    """Stream dict items through (name, function, threads) stages, yields them as they finish
+
+    Stages are connected by queues holding at most queue_size items, so a
+    slow stage holds the ones before it back and memory stays flat however
+    many items there are. Each function gets an item and returns it for the
+    next stage. If it raises, the error is stored in item['error'] and the
+    item skips the remaining stages. Items come out in completion order.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    stop = threading.Event()
+    lock = threading.Lock()
+    state = {name: threads for name, _, threads in stages}
+    feed_errors = []
+
+    def feed():
+        try:
+            for item in items:
+                if not _put(queues[0], item, stop):
+                    return
+        except Exception as e:
+            feed_errors.append(e)
+        _put(queues[0], _DONE, stop)
+
+    threads = [threading.Thread(target=feed, name='feed', daemon=True)]
+    for index, (name, function, thread_count) in enumerate(stages):
+        for number in range(thread_count):
+            threads.append(threading.Thread(
+                target=_stage_worker, name=f'{name}-{number}', daemon=True,
+                args=(name, function, queues[index], queues[index + 1], state, lock, stop)
+            ))
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            yield item
+
+        if feed_errors:
+            raise feed_errors[0]
+    finally:
+        # Also reached when the caller stops early, lets every thread exit
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,100 @@
+from PIL import Image
+import time
+import argparse
+
+# Side of the squares the character area is split into when planning an overlay
+TILE_SIZE = 64
+
+class OverlayPlan:
+    """Everything about one rarity overlay that is the same for every card
+
+    A card is a transparent canvas with the character pasted in the middle
+    and the overlay pasted over the whole canvas. Outside the character area
+    that is always the same image (base), and inside it the overlay is
+    mostly fully transparent, so only the tiles where it has any ink are
+    pasted again per card. Pasting through a fully transparent pixel leaves
+    it as it was, so the cards match the full paste byte for byte.
+    """
+
+    def __init__(self, overlay, use_mask, canvas_size, character_size, tile_size=TILE_SIZE):
+        self.offset = (canvas_size - character_size) // 2
+        self.use_mask = use_mask
+
+        # Pasting without a mask replaces the whole canvas, the character never shows
+        if not use_mask:
+            self.base = overlay.copy()
+            self.tiles = []
+            return
+
+        self.base = Image.new('RGBA', (canvas_size, canvas_size), (0, 0, 0, 0))
+        self.base.paste(overlay, (0, 0), overlay)
+        end = self.offset + character_size
+        self.base.paste((0, 0, 0, 0), (self.offset, self.offset, end, end))
+
+        # (position, tile, mask): opaque tiles are copied, partly transparent ones blended
+        alpha = overlay.getchannel('A')
+        self.tiles = []
+        for top in range(self.offset, end, tile_size):
+            for left in range(self.offset, end, tile_size):
+                box = (left, top, min(left + tile_size, end), min(top + tile_size, end))
+                low, high = alpha.crop(box).getextrema()
+                if high == 0:
+                    continue
+                tile = overlay.crop(box)
+                self.tiles.append(((left, top), tile, None if low == 255 else tile))
+
+    def compose(self, character_resized):
+        """The card for one resized character, same pixels as pasting it and the overlay on a new canvas"""
+        card = self.base.copy()
+        if not self.use_mask:
+            return card
+        card.paste(character_resized, (self.offset, self.offset),
+                   character_resized if character_resized.mode == 'RGBA' else None)
+        for position, tile, mask in self.tiles:
+            card.paste(tile, position, mask)
+        return card
+
+def paste_card(character_resized, overlay, use_mask, canvas_size, character_size):
+    """The plain Image.new + paste + paste sequence, the reference for OverlayPlan"""
+    offset = (canvas_size - character_size) // 2
+    card = Image.new('RGBA', (canvas_size, canvas_size), (0, 0, 0, 0))
+    card.paste(character_resized, (offset, offset), character_resized if character_resized.mode == 'RGBA' else None)
+    card.paste(overlay, (0, 0), overlay if use_mask else None)
+    return card
+
+def benchmark_compositing(border_path, font_path, texts, canvas_size, character_size, count=64):
+    """Time the full paste against OverlayPlan.compose() on noise characters and check they match"""
+    from batch_combine_images import render_overlay
+
+    overlay, use_mask = render_overlay(border_path, font_path, texts)
+    characters = [Image.effect_noise((character_size, character_size), 64 + 16 * index).convert('RGBA')
+                  for index in range(4)]
+    for character in characters[::2]:
+        character.putalpha(Image.effect_noise((character_size, character_size), 96).convert('L'))
+    characters += [character.convert(mode) for character, mode in zip(characters, ('RGB', 'L', 'LA', 'P'))]
+
+    start = time.perf_counter()
+    plan = OverlayPlan(overlay, use_mask, canvas_size, character_size)
+    print(f'{"plan":<16} {(time.perf_counter() - start) * 1000:>8.2f} ms once per rarity, {len(plan.tiles)} tiles')
+
+    for name, compose in (('full paste', lambda c: paste_card(c, overlay, use_mask, canvas_size, character_size)),
+                          ('overlay plan', plan.compose)):
+        start = time.perf_counter()
+        for index in range(count):
+            compose(characters[index % len(characters)])
+        print(f'{name:<16} {(time.perf_counter() - start) * 1000 / count:>8.2f} ms/card')
+
+    differing = [character.mode for character in characters
+                 if plan.compose(character).tobytes()
+                 != paste_card(character, overlay, use_mask, canvas_size, character_size).tobytes()]
+    print('❌ Differs for ' + ', '.join(differing) + ' characters' if differing else
+          f'✅ Identical pixels for {", ".join(sorted({c.mode for c in characters}))} characters')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the full card paste with the per-rarity overlay plan')
+    parser.add_argument('--border', default='./BORDER/1_common.png', help='border to composite under (default: ./BORDER/1_common.png)')
+    parser.add_argument('--font', default='./FONT/Generis.otf', help='card font (default: ./FONT/Generis.otf)')
+    args = parser.parse_args()
+
+    from batch_combine_images import CANVAS_SIZE, CHARACTER_SIZE, get_rarity_text
+    benchmark_compositing(args.border, args.font, get_rarity_text('1_COMMON'), CANVAS_SIZE, CHARACTER_SIZE)